@@ -1,79 +1,56 @@
 import asyncio
+import datetime
+import functools
+import os
 
 import bleak
 
+import Capture
+import Reconnection
+import Scan_registry
+
 
 class BLE_connector:
     def __init__(self, address="", to_connect=True):
+        """Does not talk to the device, so it can be called from callbacks without blocking the event loop.
+        Pairing and connection are done by keep_connections_to_device(), disconnect with disconnect()
+
+        :param address: address of the device
+        :param to_connect: False if instance is used only for scanning
+        """
         self.address = address
         self.to_connect = to_connect
-        try:
-            asyncio.get_running_loop().run_until_complete(self.client.disconnect())
-        except Exception as e:
-            # print(e)
-            pass
-        try:
-            del self.client
-        except Exception as e:
-            # print(e)
-            pass
+        self.backoff = Reconnection.Backoff()
+        self.metrics = Reconnection.ReconnectionMetrics()
         if self.to_connect:
             self.client = bleak.BleakClient(address)
-            asyncio.get_running_loop().run_until_complete(self.client.pair(2))
+
+    def is_connected(self):
+        return self.to_connect and self.client.is_connected
+
+    async def switch(self, address):
+        """Disconnects current device and prepares connection to another one,
+        keep_connections_to_device() has to be restarted afterwards"""
+        await self.disconnect()
+        self.__init__(address)
+
+    async def pair(self, protection_level=2):
+        try:
+            await self.client.pair(protection_level)
+        except Exception as e:
+            print(e)
 
     async def keep_connections_to_device(self, uuids, callbacks):
-        while True:
-            try:
-                if self.to_connect:
-                    # workaround, without this line it sometimes cannot reconnect or takes a lot of time to reconnect
-                    # self.__init__(self.address, self.to_connect)
-                    await self.client.connect(timeout=32)  # timeout should be the same as in firmware
-                    if self.client.is_connected:
-                        print("Connected to Device")
-
-                        def on_disconnect(client):
-                            print("Client with address {} got disconnected!".format(client.address))
-
-                        self.client.set_disconnected_callback(on_disconnect)
-                        for uuid, callback in zip(uuids, callbacks):
-                            await self.client.start_notify(uuid, callback)
-                        while True:
-                            if not self.client.is_connected:
-                                print("Lost connection, reconnecting...")
-                                await self.client.disconnect()
-                                break
-                            # print("Here")
-                            # try:
-                            #     a = await self.client.get_services()  #
-                            #     # print(a)
-                            #     for c in a.characteristics.values():
-                            #         # print(c.uuid, c.__dict__)
-                            #         #
-                            #         try:
-                            #             # self.client.p
-                            #             # await self.client.pair(1)
-                            #             print(await self.client.write_gatt_char(c, B"123ABC"))  # TODO
-                            #             print(await self.client.read_gatt_char(c))
-                            #             # bytearray(b'\x02\x03\x05\x07')
-                            #             # print(b)
-                            #         #
-                            #         except Exception as e:
-                            #             print("Test error 2:", e)
-                            #             if "Access Denied" not in str(e):
-                            #                 print("Have a look!", e)
-                            #         await asyncio.sleep(0.1)
-                            #     # '330a1b80-cf4b-11e1-ac36-0002a5d5c51b'
-                            #     # print(a.characteristics[20])
-                            # except Exception as e:
-                            #     print("Test error:", e)
-                            await asyncio.sleep(1)
-                    else:
-                        print(f"Not connected to Device, reconnecting...")
-            except Exception as e:
-                print(e)
-                print("Connection error, reconnecting...")
-                await self.client.disconnect()  # accelerates reconnection
+        """Keeps device connected, reconnection starts as soon as Bleak reports a disconnect
+
+        :param uuids: characteristics to subscribe to
+        :param callbacks: one per uuid
+        """
+        while not self.to_connect:  # instance is used only for scanning
             await asyncio.sleep(1)
+        await self.pair()
+        await Reconnection.keep_connection(self.client, uuids, callbacks, backoff=self.backoff, metrics=self.metrics,
+                                           connect_timeout=32)  # timeout should be the same as in firmware
 
     # async def scan(self):
     #    try:
@@ -99,19 +76,34 @@ class BLE_connector:
     # def detection_callback(device, advertisement_data):
     #    print(device.address, "RSSI:", device.rssi, advertisement_data)
 
-    async def start_scanning(self):
-        try:
-            dict_of_devices = {}
+    def create_scanner(self, registry):
+        """Passive scanner which fills registry, it is not started
+
+        :param registry: Scan_registry.ScanRegistry
+        :return: bleak.BleakScanner
+        """
+
+        def detection_callback(device, advertisement_data):
+            # print(device.address, "RSSI:", device.rssi, advertisement_data)
+            registry.update(device, getattr(advertisement_data, 'rssi', None) or device.rssi)
+
+        scanner = bleak.BleakScanner(scanning_mode="passive")
+        scanner.register_detection_callback(detection_callback)
+        return scanner
 
-            def detection_callback(device, advertisement_data):
-                # print(device.address, "RSSI:", device.rssi, advertisement_data)
-                dict_of_devices[device.address] = device  # overwrites device object
+    async def start_scanning(self, registry=None):
+        """Starts passive scanning in background
 
-            scanner = bleak.BleakScanner(scanning_mode="passive")
-            scanner.register_detection_callback(detection_callback)
+        :param registry: Scan_registry.ScanRegistry to fill, new one is created if None
+        :return: (coroutine function which stops scanning, registry)
+        """
+        try:
+            if registry is None:
+                registry = Scan_registry.ScanRegistry()
+            scanner = self.create_scanner(registry)
             await scanner.start()
 
-            return scanner.stop, dict_of_devices
+            return scanner.stop, registry
 
         except Exception as e:
             print(e)
@@ -126,10 +118,96 @@ class BLE_connector:
 
     async def disconnect(self):
         try:
-            if self.client.is_connected:
+            if self.to_connect and self.client.is_connected:
                 print("Disconnecting...")
                 # del self.client
                 await self.client.disconnect()
                 print("Disconnected")
         except Exception as e:
             pass
+
+
+class BLE_connection_manager:
+    """Keeps connections to several devices at the same time, one BLE_connector and one
+    keep_connections_to_device() task per device. Notifications of all devices are handled on the same event loop,
+    so callbacks do not need locks."""
+
+    def __init__(self, max_devices=8, disconnect_timeout=5, connector_class=BLE_connector, capture_directory=None,
+                 **connector_parameters):
+        """
+
+        :param max_devices: maximum number of devices connected at the same time
+        :param disconnect_timeout: seconds, device is forgotten after that even if it did not confirm disconnect
+        :param connector_class: BLE_connector, or Dummy_connector.Simulated_connector for tests without hardware
+        :param capture_directory: raw notifications of every device are written there by Capture.Capturing_connector,
+            None to disable
+        :param connector_parameters: passed to connector_class together with address
+        """
+        self.max_devices = max_devices
+        self.capture_directory = capture_directory
+        self.connector_class = connector_class
+        self.connector_parameters = connector_parameters
+        self.disconnect_timeout = disconnect_timeout
+        self.connectors = {}  # address -> BLE_connector
+        self.tasks = {}  # address -> task running keep_connections_to_device()
+
+    def __len__(self):
+        return len(self.connectors)
+
+    def __contains__(self, address):
+        return address in self.connectors
+
+    def connect(self, address, uuids, callbacks):
+        """Starts keeping connection to the device, does nothing if it is already connected.
+        Returns immediately, connection is made by a task which is cancelled by disconnect()
+
+        :param address: address of the device
+        :param uuids: characteristics to subscribe to
+        :param callbacks: one per uuid, called as callback(address, sender, data), so devices can be told apart
+        :return: BLE_connector of the device
+        """
+        if address in self.connectors:
+            return self.connectors[address]
+        if len(self.connectors) >= self.max_devices:
+            raise RuntimeError("Maximum number of devices is connected: {}".format(self.max_devices))
+        connector = self.connector_class(address, **self.connector_parameters)
+        if self.capture_directory is not None:
+            connector = Capture.Capturing_connector(connector, os.path.join(
+                self.capture_directory,
+                datetime.datetime.now().strftime('capture_%Y-%m-%d_%H-%M-%S_') + address.replace(':', '') + '.rkpcap'))
+        self.connectors[address] = connector
+        self.tasks[address] = asyncio.get_running_loop().create_task(
+            connector.keep_connections_to_device(uuids=uuids,
+                                                 callbacks=[functools.partial(callback, address)
+                                                            for callback in callbacks]))
+        return connector
+
+    async def disconnect(self, address):
+        """Stops reconnecting to the device and disconnects it"""
+        task = self.tasks.pop(address, None)
+        connector = self.connectors.pop(address, None)
+        if task is not None:
+            task.cancel()
+        if connector is not None:
+            try:
+                await asyncio.wait_for(connector.disconnect(), timeout=self.disconnect_timeout)
+            except asyncio.TimeoutError:
+                print("Device did not confirm disconnect:", address)
+
+    async def switch(self, old_address, address, uuids, callbacks):
+        """Replaces one device with another, other devices stay connected. Parameters are the same as in connect()"""
+        await self.disconnect(old_address)
+        return self.connect(address, uuids, callbacks)
+
+    def is_streaming(self):
+        """True while at least one device is connected"""
+        for connector in self.connectors.values():
+            try:
+                if connector.is_connected():
+                    return True
+            except Exception as e:
+                pass
+        return False
+
+    async def disconnect_all(self):
+        await asyncio.gather(*[self.disconnect(address) for address in list(self.connectors)])
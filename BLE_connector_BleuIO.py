@@ -1,79 +1,208 @@
-from bleuio_lib.bleuio_funcs import BleuIo
 import asyncio
-import hjson
-import pprint
-from collections import OrderedDict
+import collections
 import datetime
+import threading
+
+import hjson
+import serial
 
+notification_handle = '0015'  # characteristic carrying data packets, notifications of other handles are ignored
 
-async def create_BLE_connector():
-    instance = BLE_connector()
+
+async def create_BLE_connector(port="COM4", baud=921600):
+    instance = BLE_connector(port, baud)
     await instance.async_init()
     return instance
 
 
-async def my_command(my_dongle, command='AT', wait=1):
-    my_dongle.send_command(command)
+async def my_command(transport, command='AT', wait=1):
+    transport.send_command(command)
     await asyncio.sleep(wait)
-    print(my_dongle.rx_response)
+    print(transport.take_responses())
+
+
+def parse_notification(line, handle=notification_handle):
+    """Fast path for notification lines (key '777'), takes hex digits without parsing the whole line
+
+    :param line: one line of dongle output in verbose mode
+    :param handle: only notifications of this characteristic are taken
+    :return: hex digits of notification without '0x', None if line is not a notification of `handle`
+        or has unexpected layout
+    """
+    if '"777"' not in line:
+        return None
+    start = line.find('"{}"'.format(handle))
+    if start < 0:
+        return None
+    start = line.find('"hex"', start)
+    if start < 0:
+        return None
+    start = line.find('"', start + 5) + 1  # opening quote of the value
+    end = line.find('"', start)
+    if start == 0 or end < 0 or not line.startswith('0x', start):
+        return None
+    return line[start + 2:end]
+
+
+class SerialTransport:
+    """Reads lines from the dongle in a background thread and passes them to the event loop through a deque.
+
+    The thread blocks in serial.read(), so nothing spins while the dongle is silent. When consumer falls behind and
+    `max_lines` lines are waiting, the thread stops reading and the serial driver buffers data instead."""
+
+    def __init__(self, port="COM4", baud=921600, max_lines=100000):
+        """
+
+        :param port: serial port of the dongle
+        :param baud: baud rate
+        :param max_lines: lines waiting for consumer, after that reading is paused
+        """
+        self.serial = serial.Serial(port=port, baudrate=baud, timeout=0.1)
+        self.max_lines = max_lines
+        self.lines = collections.deque()  # (time received, line)
+        self.responses = collections.deque(maxlen=100)  # parsed lines which are not notifications
+        self.space_available = threading.Event()
+        self.space_available.set()
+        self.running = False
+        self.thread = None
+        self.loop = None
+        self.data_available = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.data_available = asyncio.Event()
+        self.running = True
+        self.thread = threading.Thread(target=self.read_lines, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        self.space_available.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.serial.close()
+
+    def send_command(self, command):
+        self.serial.write(command.encode() + b'\r')
+
+    def read_lines(self):
+        """Runs in the background thread"""
+        remainder = b''
+        while self.running:
+            data = self.serial.read(max(self.serial.in_waiting, 1))
+            if not data:
+                continue
+            time_received = datetime.datetime.utcnow().timestamp()
+            *complete, remainder = (remainder + data).split(b'\n')
+            if not complete:
+                continue
+            for line in complete:
+                self.lines.append((time_received, line.decode(errors='replace').strip()))
+            self.loop.call_soon_threadsafe(self.data_available.set)
+            if len(self.lines) >= self.max_lines:  # backpressure
+                self.space_available.clear()
+                self.space_available.wait()
+
+    async def get_lines(self):
+        """Waits until lines are available and returns all of them
+
+        :return: list of (time received, line)
+        """
+        while not self.lines:
+            self.data_available.clear()
+            if self.lines:  # line could arrive between the check and clear()
+                break
+            await self.data_available.wait()
+        lines = []
+        popleft = self.lines.popleft
+        for _ in range(len(self.lines)):
+            lines.append(popleft())
+        self.space_available.set()
+        return lines
+
+    def get_responses(self):
+        responses = list(self.responses)
+        self.responses.clear()
+        return responses
+
+    def take_responses(self):
+        """Replies to commands which were not read by get_more_data() yet, e.g. while connecting.
+        Queued lines which are not notifications are taken, notifications stay in the queue for get_more_data().
+
+        :return: list of parsed responses collected by get_more_data(), followed by lines taken from the queue
+        """
+        responses = self.get_responses()
+        notifications = []
+        for _ in range(len(self.lines)):  # the reader thread may append meanwhile, those lines are not touched
+            time_received, line = self.lines.popleft()
+            if parse_notification(line) is not None:
+                notifications.append((time_received, line))
+            elif line:
+                responses.append(line)
+        self.lines.extendleft(reversed(notifications))  # back in front of lines which arrived meanwhile
+        self.space_available.set()
+        return responses
 
 
 class BLE_connector:
     # https://stackoverflow.com/questions/33128325/how-to-set-class-attribute-with-await-in-init
 
-    def __init__(self):
-        pass
-
+    def __init__(self, port="COM4", baud=921600):
+        self.port = port
+        self.baud = baud
 
     async def async_init(self):
-        self.my_dongle = BleuIo(port="COM4", baud=921600)
-        self.my_dongle.start_daemon()
+        self.my_dongle = SerialTransport(port=self.port, baud=self.baud)
+        self.my_dongle.start()
         await asyncio.sleep(1)
-        print(self.my_dongle.rx_response)
 
         await my_command(self.my_dongle, 'ATV1', 1)
         await my_command(self.my_dongle, 'ATA0', 1)
         await my_command(self.my_dongle, 'AT+CENTRAL', 1)
         await my_command(self.my_dongle, 'AT+GAPCONNECT=[1]C3:D8:3C:EB:54:65', 5)
-        await my_command(self.my_dongle, 'AT+SETNOTI=0015', 1)
+        await my_command(self.my_dongle, 'AT+SETNOTI=' + notification_handle, 1)
 
         print()
 
         await asyncio.sleep(1)
 
     async def get_more_data(self, interval=0):
+        """Yields notifications
+
+        :param interval: seconds to wait after every batch, so more lines are collected per wakeup, 0 to react at once
+        """
         N = 0
         while 1:
-            try:
-                # print(self.my_dongle.rx_response)
-                lines = self.my_dongle.rx_response.pop(0)  # FIFO
-                for line in lines.split("\n"):
-                    parsed = hjson.loads(line)
-                    if isinstance(parsed, OrderedDict):
-                        if '777' in parsed.keys():  # '777' means notification
-                            digits_only = parsed['0015']['hex'][2:]
-                            response = {
-                                'Hex': digits_only,
-                                'Time': datetime.datetime.utcnow().timestamp(),
-                                'N': N
-                            }
-                            N += 1
-                            # print('---')
-                            #print('yield')
-                            yield response
-                        else:
-                            # print(parsed)
-                            pass
-            except Exception as e:
-                # print(e)
-                pass
-
-            while not self.my_dongle.rx_response:
-                #print('_________empty')
+            for time_received, line in await self.my_dongle.get_lines():
+                if not line:
+                    continue
+                digits_only = parse_notification(line)
+                if digits_only is None:
+                    # other responses are rare, so full parsing is affordable
+                    try:
+                        parsed = hjson.loads(line)
+                    except Exception as e:
+                        # print(e)
+                        continue
+                    if isinstance(parsed, dict) and '777' in parsed.keys():  # '777' means notification
+                        if notification_handle not in parsed.keys():
+                            continue  # notification of another characteristic
+                        digits_only = parsed[notification_handle]['hex'][2:]
+                    else:
+                        self.my_dongle.responses.append(parsed)
+                        continue
+                response = {
+                    'Hex': digits_only,
+                    'Time': time_received,
+                    'N': N
+                }
+                N += 1
+                yield response
+            if interval:
                 await asyncio.sleep(interval)
 
     def __del__(self):
-        self.my_dongle.stop_daemon()
+        self.my_dongle.stop()
         print('BLE_connector instance destroyed successfully')
 
 
@@ -0,0 +1,195 @@
+"""End-to-end benchmark of the ingestion pipeline: decode -> reassemble -> store -> save.
+
+Synthetic notifications are produced by Dummy_connector.Device_simulator, so no hardware is needed.
+Every case runs in a separate process, so peak RSS of one case is not hidden by a previous one.
+
+Offline cases push a whole session through one stage as fast as possible and report notifications per second.
+Real-time cases deliver notifications on the event loop at a given rate, either straight to
+SessionRecorder.add_packet() ('direct', the path before Notification_queue) or through
+Notification_queue.NotificationQueue and SessionRecorder.add_packets() ('queued', the path of the App), and report
+latency from the actual delivery of the last packet of a transaction until the transaction is reassembled and stored.
+
+Run from the root of the repository:
+> $ python Benchmarks/benchmark_pipeline.py
+> $ python Benchmarks/benchmark_pipeline.py --quick
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import Dummy_connector
+import Notification_queue
+import Packet_decoder
+import Session_log
+import Session_recorder
+import Transaction_reassembly
+
+packets_per_transaction = 9
+session_lengths = [1000, 10000, 100000]  # transactions
+stages = ['decode', 'decode batched', 'reassemble', 'record', 'record batched', 'save']
+rates = [50, 500, 5000]  # transactions per second
+paths = ['direct', 'queued']
+real_time_duration = 5  # seconds per real-time case
+batch_size = 256  # notifications per call of Packet_decoder.decode_packets() and SessionRecorder.add_packets()
+
+
+def get_peak_rss():
+    """Peak resident set size of this process in MB, None if it can not be measured"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        return round(psutil.Process().memory_info().peak_wset / (1024 * 1024), 1)  # Windows
+    except (ImportError, AttributeError):
+        return None
+
+
+def make_session(length, rate=100.0):
+    """:return: (notifications, times of delivery)"""
+    simulator = Dummy_connector.Device_simulator(packets_per_transaction=packets_per_transaction,
+                                                 transaction_rate=rate, seed=0)
+    datas = []
+    for _ in range(length):
+        datas.extend(simulator.make_transaction())
+    times = [i / (rate * packets_per_transaction) for i in range(len(datas))]
+    return datas, times
+
+
+def percentile(values, fraction):
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+def run_offline(stage, length):
+    datas, times = make_session(length)
+    time_start = time.perf_counter()
+    if stage == 'decode':
+        for data, time_delivered in zip(datas, times):
+            Packet_decoder.Packet(data, time_delivered)
+    elif stage == 'decode batched':
+        for i in range(0, len(datas), batch_size):
+            Packet_decoder.decode_packets(datas[i:i + batch_size], times[i:i + batch_size])
+    elif stage == 'reassemble':
+        buffer = Transaction_reassembly.ReassemblyBuffer(size=packets_per_transaction)
+        for data, time_delivered in zip(datas, times):
+            buffer.add_packet(data, time_delivered)
+    elif stage == 'record':
+        recorder = Session_recorder.SessionRecorder(packets_per_transaction=packets_per_transaction)
+        for data, time_delivered in zip(datas, times):
+            recorder.add_packet(0x10, data, time_delivered)
+    elif stage == 'record batched':
+        # what Notification_queue.NotificationQueue does with notifications of one sender
+        recorder = Session_recorder.SessionRecorder(packets_per_transaction=packets_per_transaction)
+        for i in range(0, len(datas), batch_size):
+            recorder.add_packets(0x10, datas[i:i + batch_size], times[i:i + batch_size])
+    elif stage == 'save':
+        recorder = Session_recorder.SessionRecorder(packets_per_transaction=packets_per_transaction)
+        for data, time_delivered in zip(datas, times):
+            recorder.add_packet(0x10, data, time_delivered)
+        time_start = time.perf_counter()  # only saving is measured
+        with tempfile.TemporaryDirectory() as directory:
+            writer = Session_log.SessionWriter(os.path.join(directory, 'session.rkplog'))
+            writer.write_new_rows(recorder.stores)
+            writer.close()
+            for convert, name in ((Session_log.convert_to_json, 'session.json'),
+                                  (Session_log.convert_to_csv, 'session.csv')):
+                with open(os.path.join(directory, name), 'x', newline='') as f:
+                    convert(writer.path, f)
+    elapsed = time.perf_counter() - time_start
+    return {'stage': stage,
+            'transactions': length,
+            'notifications per second': round(len(datas) / elapsed),
+            'seconds': round(elapsed, 3),
+            }
+
+
+async def run_real_time(path, rate, duration):
+    loop = asyncio.get_running_loop()
+    length = int(rate * duration)
+    datas, _ = make_session(length, rate)  # no loss and no reordering, so every 9th packet completes a transaction
+    recorder = Session_recorder.SessionRecorder(packets_per_transaction=packets_per_transaction)
+    interval = 1 / (rate * packets_per_transaction)
+    times_delivered = []  # loop.time() when each notification was actually delivered
+    latencies = []
+
+    def on_stored():
+        # transaction k is complete when its last packet, number k * packets_per_transaction - 1, was delivered
+        now = loop.time()
+        for k in range(len(latencies) + 1, recorder.reassembly_buffer.statistics['Completed transactions'] + 1):
+            latencies.append(now - times_delivered[k * packets_per_transaction - 1])
+
+    def process(key, batch, batch_times_delivered):
+        recorder.add_packets(key, batch, batch_times_delivered)
+        on_stored()
+
+    queue = Notification_queue.NotificationQueue(process)
+    consumer = loop.create_task(queue.run()) if path == 'queued' else None
+
+    time_start = loop.time()
+    for i, data in enumerate(datas):
+        delay = time_start + i * interval - loop.time()
+        if delay > 0.001:
+            await asyncio.sleep(delay)
+        times_delivered.append(loop.time())
+        if path == 'queued':
+            queue.put(0x10, data, time.time())
+        else:
+            recorder.add_packet(0x10, data, time.time())
+            on_stored()
+    while queue:  # the consumer may still be processing the last notifications
+        await asyncio.sleep(0.001)
+    elapsed = loop.time() - time_start
+    if consumer is not None:
+        consumer.cancel()
+
+    stored = len(recorder.stores[0x10]) if 0x10 in recorder.stores else 0
+    latencies.sort()
+    result = {'path': path,
+              'rate, transactions per second': rate,
+              'notifications per second': round(len(datas) / elapsed),
+              'transactions stored': stored,
+              }
+    if latencies:
+        result['latency p50, ms'] = round(1000 * percentile(latencies, 0.5), 3)
+        result['latency p99, ms'] = round(1000 * percentile(latencies, 0.99), 3)
+        result['latency max, ms'] = round(1000 * latencies[-1], 3)
+    return result
+
+
+def run_case(arguments):
+    if arguments[0] == 'offline':
+        result = run_offline(arguments[1], int(arguments[2]))
+    else:
+        result = asyncio.run(run_real_time(arguments[1], float(arguments[2]), float(arguments[3])))
+    result['peak RSS, MB'] = get_peak_rss()
+    print(json.dumps(result))
+
+
+def main(quick=False):
+    lengths = session_lengths[:2] if quick else session_lengths
+    cases = [['offline', stage, str(length)] for length in lengths for stage in stages]
+    cases += [['real-time', path, str(rate), str(1 if quick else real_time_duration)] for rate in rates for path in paths]
+    for case in cases:
+        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--case'] + case,
+                                   capture_output=True, text=True)
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            print({'case': case, 'error': completed.stderr.strip().splitlines()[-1:]})
+        else:
+            print(json.loads(lines[-1]))  # the pipeline may print to the console too
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--case':
+        run_case(sys.argv[2:])
+    else:
+        main(quick='--quick' in sys.argv)
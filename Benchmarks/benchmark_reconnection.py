@@ -0,0 +1,126 @@
+"""Compares 1 s polling of is_connected (keep_connections_to_device before Reconnection was introduced) with
+Reconnection.keep_connection, which reacts to the disconnected callback.
+
+A simulated client streams notifications and drops connection at random moments, the gap in notifications around
+every disconnect is measured. Does not need Bluetooth hardware. Run from the root of the repository:
+> $ python Benchmarks/benchmark_reconnection.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import Reconnection
+
+duration = 8  # seconds of simulated streaming per measurement
+notification_rate = 100  # notifications per second while connected
+mean_uptime = 2.0  # seconds, average time between disconnects
+connect_latency = 0.1  # seconds which connect() takes
+uuid = '340a1b80-cf4b-11e1-ac36-0002a5d5c51b'
+
+
+class SimulatedClient:
+    """Same interface as bleak.BleakClient, streams notifications and drops connection at random moments"""
+
+    def __init__(self, address="SIMULATED"):
+        self.address = address
+        self.is_connected = False
+        self.callbacks = []
+        self.disconnected_callback = None
+        self.stream_task = None
+
+    def set_disconnected_callback(self, callback):
+        self.disconnected_callback = callback
+
+    async def connect(self, timeout=32):
+        await asyncio.sleep(connect_latency)
+        self.is_connected = True
+        self.stream_task = asyncio.ensure_future(self.stream())
+        return True
+
+    async def start_notify(self, uuid, callback):
+        self.callbacks.append(callback)
+
+    async def disconnect(self):
+        if self.stream_task is not None:
+            self.stream_task.cancel()
+        self.is_connected = False
+        self.callbacks = []
+
+    async def stream(self):
+        loop = asyncio.get_running_loop()
+        time_drop = loop.time() + random.expovariate(1 / mean_uptime)
+        while loop.time() < time_drop:
+            await asyncio.sleep(1 / notification_rate)
+            for callback in self.callbacks:
+                callback(0x10, bytearray(20))
+        # link lost, the device side does not know about subscriptions anymore
+        self.is_connected = False
+        self.callbacks = []
+        if self.disconnected_callback is not None:
+            self.disconnected_callback(self)
+
+
+async def polling_keep_connection(client, uuids, callbacks):
+    """Same as BLE_connector.keep_connections_to_device before Reconnection was introduced"""
+    while True:
+        try:
+            await client.connect(timeout=32)
+            if client.is_connected:
+                for uuid, callback in zip(uuids, callbacks):
+                    await client.start_notify(uuid, callback)
+                while True:
+                    if not client.is_connected:
+                        await client.disconnect()
+                        break
+                    await asyncio.sleep(1)
+        except Exception as e:
+            print(e)
+            await client.disconnect()
+        await asyncio.sleep(1)
+
+
+async def measure(mode):
+    random.seed(1)
+    loop = asyncio.get_running_loop()
+    client = SimulatedClient()
+    client.set_disconnected_callback(lambda client: None)
+    times = []
+    metrics = Reconnection.ReconnectionMetrics()
+
+    def on_notification(sender, data):
+        times.append(loop.time())
+
+    if mode == 'polling':
+        task = asyncio.ensure_future(polling_keep_connection(client, [uuid], [on_notification]))
+    else:
+        task = asyncio.ensure_future(Reconnection.keep_connection(client, [uuid], [on_notification], metrics=metrics))
+    await asyncio.sleep(duration)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    await client.disconnect()
+
+    # gaps much longer than the notification interval are caused by disconnects
+    gaps = [b - a for a, b in zip(times, times[1:]) if b - a > 5 / notification_rate]
+    result = {'mode': mode,
+              'notifications received': len(times),
+              'disconnects': len(gaps),
+              }
+    if gaps:
+        result['gap per disconnect median, ms'] = round(1000 * statistics.median(gaps), 1)
+        result['gap per disconnect max, ms'] = round(1000 * max(gaps), 1)
+    if mode != 'polling':
+        result.update(metrics.summary())
+    return result
+
+
+async def main():
+    for mode in ('polling', 'event-driven'):
+        print(await measure(mode))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+"""Measures how scanning affects notification throughput of a connected device.
+
+Connects to a real device and counts notifications while scanning is off, runs continuously (as before
+Scan_scheduler was introduced), or runs with a background duty cycle. Needs Bluetooth hardware and a streaming
+device. Run from the root of the repository:
+> $ python Benchmarks/benchmark_scan_duty_cycle.py FE:B7:22:CC:BA:8D
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import BLE_connector_Bleak
+import Scan_registry
+import Scan_scheduler
+
+duration = 60  # seconds per measurement
+warmup = 10  # seconds to connect before measurement starts
+uuid = '340a1b80-cf4b-11e1-ac36-0002a5d5c51b'
+modes = {'no scanning': None,
+         'continuous scanning': 1.0,
+         'duty cycle 10%': 0.1,
+         }
+
+
+async def measure(address, mode, duty_cycle):
+    connector = BLE_connector_Bleak.BLE_connector(address)
+    counter = [0]
+
+    def on_notification(sender, data):
+        counter[0] += 1
+
+    connection_task = asyncio.ensure_future(connector.keep_connections_to_device(uuids=[uuid],
+                                                                                 callbacks=[on_notification]))
+    await asyncio.sleep(warmup)
+
+    scheduler = None
+    if duty_cycle is not None:
+        scheduler = Scan_scheduler.ScanScheduler(connector.create_scanner(Scan_registry.ScanRegistry()),
+                                                 is_streaming=connector.is_connected,
+                                                 duty_cycle=duty_cycle, period=10.0)
+        asyncio.ensure_future(scheduler.run())
+    counter[0] = 0
+    await asyncio.sleep(duration)
+    notifications = counter[0]
+
+    result = {'mode': mode,
+              'notifications per second': round(notifications / duration, 1),
+              'reconnects': connector.metrics.disconnects,
+              }
+    if scheduler is not None:
+        result['scanning, % of time'] = round(100 * scheduler.get_scanning_fraction(), 1)
+        await scheduler.close()
+    connection_task.cancel()
+    await connector.disconnect()
+    return result
+
+
+async def main(address):
+    for mode, duty_cycle in modes.items():
+        print(await measure(address, mode, duty_cycle))
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1] if len(sys.argv) > 1 else 'FE:B7:22:CC:BA:8D'))
@@ -0,0 +1,88 @@
+"""Compares fixed 60 Hz polling of Tk.update() with Tk_bridge.TkEventPump.
+
+Measures CPU time used by an idle window, and latency from a simulated notification to the moment Tk processed
+the resulting redraw. Run from the root of the repository:
+> $ python Benchmarks/benchmark_ui_loop.py
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+import tkinter as tk
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import Tk_bridge
+
+duration = 10  # seconds per measurement
+notification_interval = 0.05  # seconds between simulated notifications
+
+
+async def polling_ui(root, interval):
+    """Same as update_ui_loop before Tk_bridge was introduced"""
+    while True:
+        await asyncio.sleep(interval)
+        root.update()
+
+
+async def event_driven_ui(root, pump):
+    while True:
+        await pump.wait()
+        pump.process_pending()
+
+
+async def notifications(root, label, pump, latencies):
+    n = 0
+    while True:
+        await asyncio.sleep(notification_interval)
+        n += 1
+        t_notified = time.perf_counter()
+        label['text'] = str(n)
+        root.after_idle(lambda t=t_notified: latencies.append(time.perf_counter() - t))
+        if pump is not None:
+            pump.request_update()
+
+
+async def measure(mode, with_notifications):
+    root = tk.Tk()
+    label = tk.Label(master=root, text="0")
+    label.pack()
+    root.update()
+
+    pump = Tk_bridge.TkEventPump(root) if mode == 'event-driven' else None
+    latencies = []
+    tasks = [asyncio.ensure_future(polling_ui(root, 1 / 60) if pump is None else event_driven_ui(root, pump))]
+    if with_notifications:
+        tasks.append(asyncio.ensure_future(notifications(root, label, pump, latencies)))
+
+    cpu_start = time.process_time()
+    await asyncio.sleep(duration)
+    cpu = time.process_time() - cpu_start
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    root.destroy()
+
+    result = {'mode': mode,
+              'notifications': with_notifications,
+              'CPU, % of one core': round(100 * cpu / duration, 2),
+              }
+    if pump is not None:
+        result['wakeups per second'] = round(pump.wakeups / duration, 1)
+    if latencies:
+        latencies.sort()
+        result['latency median, ms'] = round(1000 * statistics.median(latencies), 2)
+        result['latency p99, ms'] = round(1000 * latencies[int(0.99 * (len(latencies) - 1))], 2)
+    return result
+
+
+async def main():
+    for with_notifications in (False, True):
+        for mode in ('polling', 'event-driven'):
+            print(await measure(mode, with_notifications))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,220 @@
+import asyncio
+import datetime
+import inspect
+import os
+import struct
+import sys
+import time
+
+import Dummy_connector
+
+# Capture file holds raw notifications exactly as they were delivered, so a session can be fed through decoding,
+# reassembly and storage again.
+#
+# File starts with `file_magic`, then records follow one after another:
+#   header  struct `record_header` = time of delivery (timestamp), sender handle, length of notification
+#   data    notification
+# Reading stops at the first incomplete record, which is what a crash in the middle of writing leaves.
+
+file_magic = b'RKPCAP\x00\x01'
+record_header = struct.Struct('<dHH')
+
+
+class CaptureWriter:
+    """Appends notifications to a capture file"""
+
+    def __init__(self, path, flush_interval=1.0):
+        """
+
+        :param path: file to create, existing files are never overwritten
+        :param flush_interval: seconds, buffered records are written to the file at least that often
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'xb')
+        self.file.write(file_magic)
+        self.flush_interval = flush_interval
+        self.time_flushed = time.monotonic()
+        self.records_written = 0
+
+    def write(self, sender, data, time_delivered):
+        if self.file.closed:  # notification delivered while device was disconnecting
+            return
+        self.file.write(record_header.pack(time_delivered, sender, len(data)) + data)
+        self.records_written += 1
+        if time.monotonic() - self.time_flushed > self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered records to the disk, like Session_log.SessionWriter does after every autosave"""
+        if self.file.closed:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.time_flushed = time.monotonic()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+
+
+def iterate_capture(path, chunk_size=1 << 20):
+    """Reads complete records of a capture file, chunk by chunk, so long captures do not have to fit in memory
+
+    :param chunk_size: bytes read at once
+    :return: generator of (time delivered, sender, notification)
+    """
+    with open(path, 'rb') as f:
+        if f.read(len(file_magic)) != file_magic:
+            raise ValueError("Not a capture file: {}".format(path))
+        buffer = b''
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return  # an incomplete record at the end is dropped
+            buffer += chunk
+            offset = 0
+            while offset + record_header.size <= len(buffer):
+                time_delivered, sender, length = record_header.unpack_from(buffer, offset)
+                start = offset + record_header.size
+                if start + length > len(buffer):
+                    break
+                yield time_delivered, sender, bytearray(buffer[start:start + length])
+                offset = start + length
+            buffer = buffer[offset:]  # beginning of a record which continues in the next chunk
+
+
+def read_capture(path):
+    """Reads all complete records of a capture file
+
+    :return: list of (time delivered, sender, notification)
+    """
+    return list(iterate_capture(path))
+
+
+class Capturing_connector:
+    """Wraps a connector, every notification is written to a capture file before it is passed to callbacks.
+    Other attributes are taken from the wrapped connector."""
+
+    def __init__(self, connector, path):
+        """
+
+        :param connector: BLE_connector_Bleak.BLE_connector or any other connector
+        :param path: capture file to create
+        """
+        self.connector = connector
+        self.capture = CaptureWriter(path)
+
+    def __getattr__(self, name):
+        return getattr(self.connector, name)
+
+    async def keep_connections_to_device(self, uuids, callbacks):
+        def wrap(callback):
+            # Bleak awaits a callback only if it is a coroutine function, so the wrapper has to be one too
+            if inspect.iscoroutinefunction(callback):
+                async def capturing_callback(sender, data):
+                    self.capture.write(getattr(sender, 'handle', sender), data, datetime.datetime.utcnow().timestamp())
+                    return await callback(sender, data)
+            else:
+                def capturing_callback(sender, data):
+                    self.capture.write(getattr(sender, 'handle', sender), data, datetime.datetime.utcnow().timestamp())
+                    return callback(sender, data)
+
+            return capturing_callback
+
+        try:
+            await self.connector.keep_connections_to_device(uuids, [wrap(callback) for callback in callbacks])
+        finally:
+            self.capture.flush()
+
+    async def disconnect(self):
+        try:
+            await self.connector.disconnect()
+        finally:  # also when disconnect times out and is cancelled
+            self.capture.close()
+
+
+class Replay_connector(Dummy_connector.Dummy_connector):
+    """Delivers notifications of a capture file to callbacks, keeping intervals between them"""
+
+    def __init__(self, address, path, speed=1.0, tick=0.01):
+        """
+
+        :param address: name of the replayed device
+        :param path: capture file
+        :param speed: 1 for real time, N for N times faster, None for as fast as callbacks accept notifications
+        :param tick: seconds, notifications which are due are delivered in batches at this interval
+        """
+        super().__init__(address)
+        self.address = address
+        self.path = path
+        with open(path, 'rb') as f:  # fails here and not in the replay task
+            if f.read(len(file_magic)) != file_magic:
+                raise ValueError("Not a capture file: {}".format(path))
+        self.speed = speed
+        self.tick = tick
+        self.streaming = False
+
+    def is_connected(self):
+        return self.streaming
+
+    async def keep_connections_to_device(self, uuids, callbacks):
+        """Callbacks receive notifications of the first uuid, replay stops at the end of the capture"""
+        loop = asyncio.get_running_loop()
+        callback = callbacks[0]
+        self.streaming = True
+        try:
+            time_start = loop.time()
+            first_time_delivered = None
+            for i, (time_delivered, sender, data) in enumerate(iterate_capture(self.path)):
+                if first_time_delivered is None:
+                    first_time_delivered = time_delivered
+                if self.speed:
+                    delay = (time_delivered - first_time_delivered) / self.speed - (loop.time() - time_start)
+                    if delay > self.tick:
+                        await asyncio.sleep(delay)
+                elif i % 1000 == 0:
+                    await asyncio.sleep(0)  # lets other tasks run
+                result = callback(sender, data)
+                if inspect.isawaitable(result):
+                    await result
+        finally:
+            self.streaming = False
+
+    async def disconnect(self):
+        self.streaming = False
+
+
+def replay_to_recorder(path, recorder):
+    """Feeds a capture through decoding, reassembly and storage as fast as possible, with captured times of
+    delivery, so the result is the same on every run
+
+    :param recorder: Session_recorder.SessionRecorder
+    :return: number of notifications
+    """
+    count = 0
+    for time_delivered, sender, data in iterate_capture(path):
+        recorder.add_packet(sender, data, time_delivered)
+        count += 1
+    return count
+
+
+if __name__ == "__main__":
+    # deterministic replay: python Capture.py capture.rkpcap replayed.rkplog
+    import Session_log
+    import Session_recorder
+
+    recorder = Session_recorder.SessionRecorder()
+    writer = Session_log.SessionWriter(sys.argv[2])
+    time_start = time.perf_counter()
+    notifications = replay_to_recorder(sys.argv[1], recorder)
+    rows = writer.write_new_rows(recorder.stores)
+    elapsed = time.perf_counter() - time_start
+    writer.close()
+    print('Notifications:', notifications, 'transactions stored:', rows,
+          'notifications per second:', round(notifications / elapsed))
+    print(recorder.reassembly_buffer.statistics)
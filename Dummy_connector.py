@@ -1,4 +1,11 @@
 import asyncio
+import datetime
+import inspect
+
+import numpy as np
+
+import Packet_decoder
+import Scan_registry
 
 
 class Dummy_connector:
@@ -13,14 +20,18 @@ class Dummy_connector:
                     callback(99, bytearray(b'\x02\x03\x05\x07'))
             await asyncio.sleep(10)
 
-    async def start_scanning(self):
+    def create_scanner(self, registry):
+        return Dummy_scanner()
+
+    async def start_scanning(self, registry=None):
         print("Dummy scanning started")
-        dict_of_devices = {}
+        if registry is None:
+            registry = Scan_registry.ScanRegistry()
 
         async def stop_handle():
             print("Stopping not implemented")
 
-        return stop_handle, dict_of_devices
+        return stop_handle, registry
 
     async def get_battery_voltage(self):
         return "3.7"
@@ -30,3 +41,156 @@ class Dummy_connector:
 
     async def disconnect(self):
         print("Dummy disconnecting...")
+
+
+class Dummy_scanner:
+    async def start(self):
+        print("Dummy scanning started")
+
+    async def stop(self):
+        print("Dummy scanning stopped")
+
+
+def encode_time_of_day(seconds_of_day):
+    """Inverse of Packet_decoder.decode_time_created(), fraction of a second is rounded to 1/255 s
+
+    :param seconds_of_day: seconds since midnight, 0 <= seconds_of_day < 24 hours
+    :return: 4 bytes: fraction, second, minute, hour
+    """
+    whole = int(seconds_of_day)
+    fraction = min(256 - round((seconds_of_day - whole) * 255), 255)
+    return bytes((fraction, whole % 60, whole // 60 % 60, whole // 3600 % 24))
+
+
+def encode_packet(transaction_number, packet_number, seconds_of_day, datapoints):
+    """Builds notification in the format read by Packet_decoder.Packet
+
+    :param datapoints: array of Packet_decoder.Packet.datapoint_dtype
+    """
+    return bytearray(bytes((transaction_number % 256, packet_number)) + encode_time_of_day(seconds_of_day) +
+                     np.asarray(datapoints, dtype=Packet_decoder.Packet.datapoint_dtype).tobytes())
+
+
+class Device_simulator:
+    """Produces transactions of a device as notifications, with configurable imperfections of the radio link"""
+
+    def __init__(self, packets_per_transaction=9, datapoints_per_packet=7, transaction_rate=5.0, loss=0.0,
+                 reorder=0.0, duplicates=0.0, clock_reset_interval=None, seed=None):
+        """
+
+        :param packets_per_transaction: number of packets in transaction
+        :param datapoints_per_packet: 7 fits into a 20 byte notification, up to 119 with a larger MTU
+        :param transaction_rate: transactions per second
+        :param loss: probability that a packet is lost
+        :param reorder: probability that a packet is swapped with the next one
+        :param duplicates: probability that a packet is delivered twice
+        :param clock_reset_interval: seconds of device time between reboots of the chip, which reset its clock
+            and transaction numbers, None for no reboots
+        :param seed: of random generator, for reproducible streams
+        """
+        self.packets_per_transaction = packets_per_transaction
+        self.datapoints_per_packet = datapoints_per_packet
+        self.transaction_rate = transaction_rate
+        self.loss = loss
+        self.reorder = reorder
+        self.duplicates = duplicates
+        self.clock_reset_interval = clock_reset_interval
+        self.random = np.random.default_rng(seed)
+
+        now = datetime.datetime.now()
+        self.device_time = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+        self.time_since_reset = 0.0
+        self.transaction_number = 0
+        self.phase = 0.0
+        self.statistics = {'Transactions': 0,
+                           'Packets': 0,
+                           'Lost packets': 0,
+                           'Duplicate packets': 0,
+                           'Reordered packets': 0,
+                           'Clock resets': 0,
+                           }
+
+    def make_datapoints(self):
+        """Sine wave with noise, so plots show something"""
+        n = self.packets_per_transaction * self.datapoints_per_packet
+        t = self.phase + np.arange(n) * (2 * np.pi / n)
+        self.phase += 0.1
+        values = 32768 + 8000 * np.sin(t) + self.random.normal(0, 200, n)
+        return values.astype(Packet_decoder.Packet.datapoint_dtype)
+
+    def make_transaction(self):
+        """Next transaction as list of notifications in order of delivery, device clock is advanced"""
+        datapoints = self.make_datapoints().reshape(self.packets_per_transaction, self.datapoints_per_packet)
+        packets = [encode_packet(self.transaction_number, packet_number, self.device_time, datapoints[packet_number])
+                   for packet_number in range(self.packets_per_transaction)]
+        self.statistics['Transactions'] += 1
+
+        delivered = []
+        for packet in packets:
+            if self.random.random() < self.loss:
+                self.statistics['Lost packets'] += 1
+                continue
+            delivered.append(packet)
+            if self.random.random() < self.duplicates:
+                self.statistics['Duplicate packets'] += 1
+                delivered.append(packet)
+        for i in range(len(delivered) - 1):
+            if self.random.random() < self.reorder:
+                self.statistics['Reordered packets'] += 1
+                delivered[i], delivered[i + 1] = delivered[i + 1], delivered[i]
+        self.statistics['Packets'] += len(delivered)
+
+        self.transaction_number = (self.transaction_number + 1) % 256
+        interval = 1 / self.transaction_rate
+        self.device_time = (self.device_time + interval) % Packet_decoder.seconds_per_day
+        self.time_since_reset += interval
+        if self.clock_reset_interval is not None and self.time_since_reset >= self.clock_reset_interval:
+            self.statistics['Clock resets'] += 1
+            self.device_time = 0.0
+            self.time_since_reset = 0.0
+            self.transaction_number = 0
+        return delivered
+
+
+class Simulated_connector(Dummy_connector):
+    """Streams transactions of Device_simulator at its real time rate, can replace BLE_connector_Bleak.BLE_connector
+    for stress tests without hardware"""
+
+    def __init__(self, address, handle=0x10, tick=0.01, **simulator_parameters):
+        """
+
+        :param address: name of the simulated device
+        :param handle: passed to callbacks as sender
+        :param tick: seconds, notifications which are due are delivered in batches at this interval
+        :param simulator_parameters: passed to Device_simulator
+        """
+        super().__init__(address)
+        self.address = address
+        self.handle = handle
+        self.tick = tick
+        self.simulator = Device_simulator(**simulator_parameters)
+        self.streaming = False
+
+    def is_connected(self):
+        return self.streaming
+
+    async def keep_connections_to_device(self, uuids, callbacks):
+        loop = asyncio.get_running_loop()
+        interval = 1 / self.simulator.transaction_rate
+        time_next = loop.time()
+        self.streaming = True
+        try:
+            while True:
+                while time_next <= loop.time():
+                    for data in self.simulator.make_transaction():
+                        for callback in callbacks[:1]:  # only the first uuid carries transactions
+                            result = callback(self.handle, data)
+                            if inspect.isawaitable(result):
+                                await result
+                    time_next += interval
+                await asyncio.sleep(max(time_next - loop.time(), self.tick))
+        finally:
+            self.streaming = False
+
+    async def disconnect(self):
+        self.streaming = False
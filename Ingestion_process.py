@@ -0,0 +1,195 @@
+import asyncio
+import datetime
+import multiprocessing
+import multiprocessing.shared_memory
+
+import numpy as np
+
+import Packet_decoder
+import Transaction_reassembly
+
+# Counters and positions shared by both processes, positions only grow, slot is position % capacity.
+# `connected` is 1 while the ingestion process is connected to the device, so the main process knows when to scan.
+header_dtype = np.dtype([('write', '<u8'), ('read', '<u8'), ('dropped', '<u8'), ('lost', '<u8'), ('connected', '<u8')])
+status_interval = 0.5  # seconds between updates of `connected`
+
+
+def record_dtype(max_datapoints):
+    """One decoded transaction in the ring buffer"""
+    return np.dtype([('sender', '<i8'),
+                     ('transaction_number', '<i8'),
+                     ('time_created', '<f8'),
+                     ('time_delivered', '<f8'),
+                     ('count', '<i8'),  # number of valid datapoints
+                     ('data', Packet_decoder.Packet.datapoint_dtype, (max_datapoints,)),
+                     ])
+
+
+class SharedRingBuffer:
+    """Ring buffer of decoded transactions in multiprocessing.shared_memory, with one writer and one reader.
+
+    Writer fills a slot and only then moves `write` position, reader processes slots and only then moves `read`
+    position, so neither process waits for a lock. When the buffer is full, new transactions are dropped and
+    counted, the writer never blocks."""
+
+    def __init__(self, name=None, capacity=1024, max_datapoints=2048):
+        """
+
+        :param name: name of existing shared memory to attach to, new one is created if None
+        :param capacity: number of transactions
+        :param max_datapoints: maximum number of datapoints in one transaction
+        """
+        self.capacity = capacity
+        self.dtype = record_dtype(max_datapoints)
+        size = header_dtype.itemsize + capacity * self.dtype.itemsize
+        self.owner = name is None
+        if self.owner:
+            self.shared_memory = multiprocessing.shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shared_memory = multiprocessing.shared_memory.SharedMemory(name=name)
+        self.name = self.shared_memory.name
+        self.header = np.ndarray((), dtype=header_dtype, buffer=self.shared_memory.buf)
+        self.records = np.ndarray(capacity, dtype=self.dtype, buffer=self.shared_memory.buf,
+                                  offset=header_dtype.itemsize)
+        if self.owner:
+            self.header[()] = (0, 0, 0, 0, 0)
+
+    def push(self, sender, transaction):
+        """Called by writer
+
+        :param sender: handle of characteristic
+        :param transaction: finalized Transaction_reassembly.Transaction
+        :return: False if buffer is full and transaction was dropped
+        """
+        write = int(self.header['write'])
+        if write - int(self.header['read']) >= self.capacity:
+            self.header['dropped'] += 1
+            return False
+        data = transaction.get_joined_data()
+        record = self.records[write % self.capacity]
+        record['sender'] = sender
+        record['transaction_number'] = transaction.transaction_number
+        record['time_created'] = transaction.get_min_time_of_transaction_creation()
+        record['time_delivered'] = transaction.get_min_time_of_transaction_delivery()
+        record['count'] = len(data)
+        record['data'][:len(data)] = data
+        self.header['write'] = write + 1  # publishes the slot
+        return True
+
+    def peek(self):
+        """Called by reader, returns views of slots which are ready, at most 2 arrays because buffer wraps around.
+        Slots stay valid until release() is called."""
+        read = int(self.header['read'])
+        count = int(self.header['write']) - read
+        start = read % self.capacity
+        if start + count <= self.capacity:
+            return [self.records[start:start + count]]
+        return [self.records[start:], self.records[:start + count - self.capacity]]
+
+    def release(self, count):
+        """Called by reader, gives `count` processed slots back to the writer"""
+        self.header['read'] += count
+
+    def close(self):
+        del self.header, self.records  # views have to be released before shared memory is closed
+        self.shared_memory.close()
+        if self.owner:
+            self.shared_memory.unlink()
+
+
+def to_transactions(records):
+    """Converts records returned by SharedRingBuffer.peek() to (sender, DecodedTransaction) pairs,
+    datapoints are views of shared memory"""
+    return [(int(record['sender']),
+             Transaction_reassembly.DecodedTransaction(int(record['transaction_number']),
+                                                       float(record['time_created']),
+                                                       float(record['time_delivered']),
+                                                       record['data'][:record['count']]))
+            for record in records]
+
+
+class IngestionProcess:
+    """Runs BLE connection, packet decoding and reassembly in a separate process, so UI work in the main process
+    can not delay notifications. Decoded transactions are passed back through SharedRingBuffer."""
+
+    def __init__(self, uuids, capacity=1024, max_datapoints=2048, **reassembly_parameters):
+        """
+
+        :param uuids: characteristics to subscribe to
+        :param capacity: size of the ring buffer in transactions
+        :param max_datapoints: maximum number of datapoints in one transaction
+        :param reassembly_parameters: passed to Transaction_reassembly.ReassemblyBuffer
+        """
+        self.ring = SharedRingBuffer(capacity=capacity, max_datapoints=max_datapoints)
+        self.commands = multiprocessing.Queue()
+        self.process = multiprocessing.Process(target=ingestion_main,
+                                               args=(self.ring.name, capacity, max_datapoints, uuids, self.commands,
+                                                     reassembly_parameters),
+                                               daemon=True)
+        self.process.start()
+
+    def connect(self, address):
+        self.commands.put(('connect', address))
+
+    def is_streaming(self):
+        """True while the ingestion process is connected to the device, updated every `status_interval` seconds"""
+        return bool(self.ring.header['connected'])
+
+    def stop(self, timeout=5):
+        self.commands.put(('stop',))
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.ring.close()
+
+
+def ingestion_main(ring_name, capacity, max_datapoints, uuids, commands, reassembly_parameters):
+    """Entry point of the ingestion process"""
+    asyncio.run(ingest(ring_name, capacity, max_datapoints, uuids, commands, reassembly_parameters))
+
+
+async def ingest(ring_name, capacity, max_datapoints, uuids, commands, reassembly_parameters):
+    import BLE_connector_Bleak  # imported here, so the main process does not need Bleak to create the ring buffer
+
+    loop = asyncio.get_running_loop()
+    ring = SharedRingBuffer(name=ring_name, capacity=capacity, max_datapoints=max_datapoints)
+    reassembly_buffer = Transaction_reassembly.ReassemblyBuffer(
+        time_unwrapper=Packet_decoder.TimeOfDayUnwrapper(), **reassembly_parameters)
+    connector = BLE_connector_Bleak.BLE_connector(to_connect=False)
+
+    def on_new_data(sender, data: bytearray):
+        try:
+            time_delivered = datetime.datetime.utcnow().timestamp()
+            completed, lost = reassembly_buffer.add_packet(data=data, time_delivered=time_delivered)
+            ring.header['lost'] += len(lost)
+            for transaction in completed:
+                ring.push(getattr(sender, 'handle', sender), transaction)
+        except Exception as e:
+            print(e)
+
+    async def report_status():
+        while True:
+            try:
+                ring.header['connected'] = int(bool(connector.is_connected()))
+            except Exception as e:  # client is being replaced by switch()
+                ring.header['connected'] = 0
+            await asyncio.sleep(status_interval)
+
+    connection_task = loop.create_task(connector.keep_connections_to_device(uuids=uuids, callbacks=[on_new_data]))
+    status_task = loop.create_task(report_status())
+    try:
+        while True:
+            command = await loop.run_in_executor(None, commands.get)
+            if command[0] == 'connect':
+                connection_task.cancel()  # the task keeps reconnecting to the client it was started with
+                await connector.switch(command[1])
+                connection_task = loop.create_task(connector.keep_connections_to_device(uuids=uuids,
+                                                                                        callbacks=[on_new_data]))
+            elif command[0] == 'stop':
+                break
+    finally:
+        status_task.cancel()
+        connection_task.cancel()
+        await connector.disconnect()
+        ring.header['connected'] = 0
+        ring.close()
@@ -0,0 +1,93 @@
+import sys
+
+# Counters and duration histograms of the hot path, shared by the whole process.
+#
+# Instrumented code checks `Instrumentation.enabled` before doing anything else, so when it is disabled the cost is
+# one attribute lookup per call site. Everything runs on the event loop thread, so no locks are needed.
+
+enabled = False
+counters = {}  # name -> int
+histograms = {}  # name -> Histogram
+
+
+class Histogram:
+    """Durations in buckets growing by powers of 2, from 1 us to about 1 min. Adding a value costs O(1)
+    and memory does not grow with the number of values, percentiles are upper bounds of buckets."""
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    number_of_buckets = 27  # bucket k holds durations below 2 ** k microseconds
+
+    def __init__(self):
+        self.buckets = [0] * self.number_of_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[min(int(seconds * 1e6).bit_length(), self.number_of_buckets - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of values, in seconds"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        running = 0
+        for k, count in enumerate(self.buckets):
+            running += count
+            if running >= target:
+                return min((2 ** k) / 1e6, self.max)
+        return self.max
+
+    def get_summary(self):
+        return {'count': self.count,
+                'mean, ms': round(1000 * self.total / self.count, 3) if self.count else 0,
+                'p50, ms': round(1000 * self.percentile(0.5), 3),
+                'p99, ms': round(1000 * self.percentile(0.99), 3),
+                'max, ms': round(1000 * self.max, 3),
+                }
+
+
+def enable(state=True):
+    global enabled
+    enabled = state
+
+
+def reset():
+    counters.clear()
+    histograms.clear()
+
+
+def count(name, n=1):
+    """Should be called only if `enabled`"""
+    counters[name] = counters.get(name, 0) + n
+
+
+def observe(name, seconds):
+    """Adds duration to histogram, should be called only if `enabled`"""
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms[name] = Histogram()
+    histogram.add(seconds)
+
+
+def get_snapshot():
+    return {'counters': dict(counters),
+            'histograms': {name: histogram.get_summary() for name, histogram in histograms.items()}}
+
+
+def format_report():
+    """Counters and histograms as text, one per line"""
+    lines = ["{}: {}".format(name, value) for name, value in sorted(counters.items())]
+    for name, histogram in sorted(histograms.items()):
+        summary = histogram.get_summary()
+        lines.append("{}: n={} p50={}ms p99={}ms max={}ms".format(name, summary['count'], summary['p50, ms'],
+                                                                  summary['p99, ms'], summary['max, ms']))
+    return "\n".join(lines)
+
+
+def dump(file=sys.stdout):
+    print(format_report(), file=file)
@@ -0,0 +1,139 @@
+import numpy as np
+
+import Plot_decimation
+
+
+class LivePlot:
+    """Plots data of all senders on a matplotlib figure embedded into Tk.
+
+    Series are kept in Plot_decimation.MinMaxDecimator caches, which are updated only with new rows of stores,
+    so a redraw costs O(width of plot in pixels). Lines are animated artists which are blitted on top of a cached
+    background, full canvas.draw() is done only when axis limits or size of the window change."""
+
+    def __init__(self, figure, canvas):
+        """
+
+        :param figure: matplotlib.figure.Figure
+        :param canvas: FigureCanvasTkAgg of the figure
+        """
+        self.figure = figure
+        self.canvas = canvas
+
+        self.subplots = {}
+        self.subplots[1] = self.figure.add_subplot(3, 1, 1)
+        self.subplots[2] = self.figure.add_subplot(3, 1, 2, sharex=self.subplots[1])
+        self.subplots[3] = self.figure.add_subplot(3, 1, 3)
+        self.subplots[1].set_ylabel("Mean of datapoints")
+        self.subplots[2].set_ylabel("Jitter, s")
+        self.subplots[2].set_xlabel("Time, s")
+        self.subplots[3].set_ylabel("Last transaction")
+        self.subplots[3].set_xlabel("N, datapoint")
+
+        self.time_start = None
+        self.rows_plotted = {}  # sender -> number of rows of its store which are in caches
+        self.caches = {}  # sender -> {subplot number: MinMaxDecimator}
+        self.lines = {}  # sender -> {subplot number: Line2D}
+
+        self.background = None
+        self.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def sync(self, stores):
+        """Moves new rows of stores into caches
+
+        :param stores: dict sender -> Sample_store.SampleStore
+        """
+        for sender, store in list(stores.items()):
+            start = self.rows_plotted.get(sender, 0)
+            stop = len(store)
+            if stop == start:
+                continue
+            if sender not in self.caches:
+                self.caches[sender] = {1: Plot_decimation.MinMaxDecimator(), 2: Plot_decimation.MinMaxDecimator()}
+                self.lines[sender] = {number: self.subplots[number].plot([], [], animated=True, label=str(sender))[0]
+                                      for number in (1, 2, 3)}
+            if self.time_start is None:
+                self.time_start = store["Time best effort"][0]
+
+            time = store["Time best effort"][start:stop] - self.time_start
+            self.caches[sender][1].extend(time, store["Data"][start:stop].mean(axis=1))
+            self.caches[sender][2].extend(time, store["Jitter best effort"][start:stop])
+            last = store["Data"][stop - 1]
+            self.lines[sender][3].set_data(np.arange(len(last)), last)
+            self.rows_plotted[sender] = stop
+
+    def redraw(self, maximize_x=True, maximize_y=True):
+        """Updates lines, blits them if axis limits did not change, otherwise redraws the whole canvas
+
+        :param maximize_x: show the whole session, otherwise keep width of X axis and follow the newest data
+        :param maximize_y: fit Y axis to the visible data
+        """
+        if not self.caches:
+            return
+        limits_changed = self.update_x_limits(maximize_x)
+
+        x0, x1 = self.subplots[1].get_xlim()
+        pixels = max(int(self.subplots[1].bbox.width), 1)
+        for number in (1, 2):
+            low, high = float('inf'), float('-inf')
+            for sender, caches in self.caches.items():
+                x, y = caches[number].query(x0, x1, pixels)
+                self.lines[sender][number].set_data(x, y)
+                if len(y):
+                    low, high = min(low, np.nanmin(y)), max(high, np.nanmax(y))
+            if maximize_y and low <= high:
+                limits_changed |= self.fit_y_limits(self.subplots[number], low, high)
+
+        if maximize_y:
+            data = [line.get_ydata() for line in (lines[3] for lines in self.lines.values()) if len(line.get_ydata())]
+            if data:
+                limits_changed |= self.fit_y_limits(self.subplots[3],
+                                                       min(np.min(y) for y in data), max(np.max(y) for y in data))
+                x_limits = (0, max(len(y) for y in data) - 1 or 1)
+                if self.subplots[3].get_xlim() != x_limits:
+                    self.subplots[3].set_xlim(x_limits)
+                    limits_changed = True
+
+        if limits_changed or self.background is None:
+            self.canvas.draw()  # on_draw() captures new background and draws lines
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_lines()
+            self.canvas.blit(self.figure.bbox)
+
+    def update_x_limits(self, maximize_x):
+        """Moves X axis in steps of a quarter of its width, so limits change rarely and most redraws are blitted
+
+        :return: True if limits changed
+        """
+        x_last = max(caches[1].levels[0]['x'][-1] for caches in self.caches.values() if len(caches[1]))
+        x0, x1 = self.subplots[1].get_xlim()
+        if x_last <= x1 and (not maximize_x or x0 == 0):
+            return False
+        width = x1 - x0
+        if maximize_x:
+            self.subplots[1].set_xlim(0, max(x_last * 1.25, 1))
+        else:
+            shift = max(x_last - x1 + width / 4, 0)
+            self.subplots[1].set_xlim(x0 + shift, x1 + shift)
+        return True
+
+    def fit_y_limits(self, subplot, low, high):
+        """Fits Y axis to data with a margin, but only when data leaves the axis or uses less than half of it
+
+        :return: True if limits changed
+        """
+        y0, y1 = subplot.get_ylim()
+        if y0 <= low and high <= y1 and (high - low) >= (y1 - y0) / 2:
+            return False
+        margin = (high - low) * 0.1 or 1
+        subplot.set_ylim(low - margin, high + margin)
+        return True
+
+    def on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_lines()
+
+    def draw_lines(self):
+        for lines in self.lines.values():
+            for number, line in lines.items():
+                self.subplots[number].draw_artist(line)
@@ -0,0 +1,111 @@
+import asyncio
+import collections
+import threading
+import time
+
+import Instrumentation
+
+# Bounded queue between BLE callbacks and processing of notifications.
+#
+# A callback only appends (key, notification, time of delivery) and returns, so the BLE stack is never stalled by
+# decoding, reassembly or storage. A consumer task drains the queue in batches: notifications of one key are decoded
+# in one call and their transactions are appended to the store at once.
+# When the queue is full, new notifications are dropped and counted in `statistics`, so bursts longer than the
+# queue are visible as a number instead of a growing delay.
+
+
+class NotificationQueue:
+    """Queue of notifications of all devices, shared by their callbacks"""
+
+    def __init__(self, process, max_size=65536, batch_size=1024):
+        """
+
+        :param process: function(key, datas, times_delivered) called by the consumer, datas are in order of delivery
+        :param max_size: notifications held at most, newer ones are dropped when the queue is full
+        :param batch_size: notifications processed before other tasks are allowed to run
+        """
+        self.process = process
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.queue = collections.deque()
+        self.loop = None
+        self.loop_thread_id = None
+        self.event = None
+        self.statistics = {'Queued': 0,
+                           'Dropped': 0,
+                           'Processed': 0,
+                           'Batches': 0,
+                           'Longest queue': 0,
+                           }
+
+    def __len__(self):
+        return len(self.queue)
+
+    def put(self, key, data: bytearray, time_delivered):
+        """Called by callbacks, may be called from another thread
+
+        :param key: notifications with the same key are passed to `process` together, e.g. (address, handle)
+        :return: False if notification was dropped because the queue is full
+        """
+        if len(self.queue) >= self.max_size:
+            self.statistics['Dropped'] += 1
+            if Instrumentation.enabled:
+                Instrumentation.count('Notifications dropped')
+            return False
+        self.queue.append((key, data, time_delivered))
+        self.statistics['Queued'] += 1
+        if self.event is not None and not self.event.is_set():
+            if threading.get_ident() == self.loop_thread_id:
+                self.event.set()
+            else:
+                self.loop.call_soon_threadsafe(self.event.set)
+        return True
+
+    def process_batch(self):
+        """Processes at most `batch_size` oldest notifications
+
+        :return: number of processed notifications
+        """
+        if Instrumentation.enabled:
+            time_start = time.perf_counter()
+        groups = {}  # key -> (datas, times), order of delivery is kept within every key
+        count = min(len(self.queue), self.batch_size)
+        for _ in range(count):
+            key, data, time_delivered = self.queue.popleft()
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = ([], [])
+            group[0].append(data)
+            group[1].append(time_delivered)
+        for key, (datas, times_delivered) in groups.items():
+            try:
+                self.process(key, datas, times_delivered)
+            except Exception as e:
+                print(e)
+        self.statistics['Processed'] += count
+        self.statistics['Batches'] += 1
+        if Instrumentation.enabled:
+            Instrumentation.count('Notification batches')
+            Instrumentation.observe('Notification batch', time.perf_counter() - time_start)
+        return count
+
+    def drain(self):
+        """Processes all queued notifications, e.g. before the last save"""
+        while self.queue:
+            self.process_batch()
+
+    async def run(self):
+        """Consumer task, processes notifications as soon as they are queued"""
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.event = asyncio.Event()
+        while True:
+            if not self.queue:
+                self.event.clear()
+                if not self.queue:  # a callback in another thread might have queued meanwhile
+                    await self.event.wait()
+                continue
+            if len(self.queue) > self.statistics['Longest queue']:
+                self.statistics['Longest queue'] = len(self.queue)
+            self.process_batch()
+            await asyncio.sleep(0)  # lets UI and callbacks run between batches
@@ -0,0 +1,164 @@
+import datetime
+import math
+
+import numpy as np
+
+
+class Packet:
+    packet_number_bytes = 1
+    transaction_number_bytes = 1
+    time_bytes = 4
+    metadata_length_total_bytes = packet_number_bytes + transaction_number_bytes + time_bytes
+    datapoint_length_bytes = 2
+    # little-endian 16 bit datapoints, use np.dtype('<i2') if firmware sends signed values
+    datapoint_dtype = np.dtype('<u2')
+    __slots__ = ('data', 'time_delivered', 'transaction_number', 'packet_number', 'time_created', 'datapoints')
+
+    def __init__(self, data: bytearray, time_delivered, datapoint_dtype=None):
+        """
+
+        :param data: notification as received from Bluetooth API
+        :param time_delivered: timestamp when notification was received
+        :param datapoint_dtype: overrides Packet.datapoint_dtype
+        """
+        self.data = data
+        self.time_delivered = time_delivered
+
+        self.transaction_number = self.data[0]
+        self.packet_number = self.data[1]
+        self.time_created = decode_time_created(self.data[2:2 + self.time_bytes])
+
+        # view of the payload, datapoints are not copied
+        self.datapoints = decode_datapoints(self.data,
+                                            self.datapoint_dtype if datapoint_dtype is None else datapoint_dtype)
+
+    @classmethod
+    def from_decoded(cls, data, time_delivered, transaction_number, packet_number, time_created, datapoints):
+        """Creates packet from fields which are already decoded, see decode_packets()"""
+        packet = cls.__new__(cls)
+        packet.data = data
+        packet.time_delivered = time_delivered
+        packet.transaction_number = transaction_number
+        packet.packet_number = packet_number
+        packet.time_created = time_created
+        packet.datapoints = datapoints
+        return packet
+
+    def get_datapoints(self):
+        return self.datapoints
+
+
+seconds_per_day = 24 * 60 * 60
+# transmit only 24 hours of time, date is not transmitted since experiment lasts only 6 hours,
+# so time of day is counted from local midnight of 2000-01-01
+day_start_timestamp = int(datetime.datetime(year=2000, month=1, day=1).timestamp())
+# seconds represented by the fraction byte, precomputed for all 256 values
+fraction_seconds = [round(1000000 * (math.pow(2, 8) - fraction) / (math.pow(2, 8) - 1)) / 1e6
+                    for fraction in range(256)]
+fraction_seconds_array = np.array(fraction_seconds)
+
+
+def decode_time_created(time_packet_created_bytes):
+    """Converts 4 bytes of time of day (fraction, second, minute, hour) to timestamp.
+    Gives the same result as datetime.datetime(year=2000, month=1, day=1, ...).timestamp(),
+    but without creating datetime object and looking up time zone for every packet."""
+    fraction, second, minute, hour = time_packet_created_bytes[:Packet.time_bytes]
+    return (day_start_timestamp + hour * 3600 + minute * 60 + second) + fraction_seconds[fraction]
+
+
+def decode_times_created(times_packet_created_bytes):
+    """Vectorized decode_time_created()
+
+    :param times_packet_created_bytes: array of shape (number of packets, 4)
+    :return: array of timestamps
+    """
+    times = np.asarray(times_packet_created_bytes, dtype=np.int64)
+    seconds = day_start_timestamp + times[:, 3] * 3600 + times[:, 2] * 60 + times[:, 1]
+    return seconds + fraction_seconds_array[times[:, 0]]
+
+
+class TimeOfDayUnwrapper:
+    """Firmware transmits only time of day, so time of creation jumps back by 24 hours at midnight.
+    Tracks midnights and adds whole days, so time keeps incrementing in sessions longer than 24 hours.
+    Jump back is considered a midnight only if it goes from the last `window` seconds of a day into the
+    first `window` seconds of a day, other jumps (e.g. reboot of the chip) are not modified."""
+
+    def __init__(self, window=600):
+        """
+
+        :param window: seconds around midnight in which a jump back is considered a midnight
+        """
+        self.window = window
+        self.days = 0
+        self.last_time_of_day = None
+
+    def unwrap(self, time_created):
+        """
+        :param time_created: timestamp returned by decode_time_created()
+        :return: timestamp with added days
+        """
+        time_of_day = time_created - day_start_timestamp
+        if self.last_time_of_day is not None:
+            if self.last_time_of_day > seconds_per_day - self.window and time_of_day < self.window:
+                self.days += 1  # midnight
+            elif self.days > 0 and self.last_time_of_day < self.window and time_of_day > seconds_per_day - self.window:
+                # late packet from before midnight, belongs to previous day, state is not changed
+                return time_created + (self.days - 1) * seconds_per_day
+        self.last_time_of_day = time_of_day
+        return time_created + self.days * seconds_per_day
+
+
+def decode_datapoints(data, datapoint_dtype=Packet.datapoint_dtype):
+    """Interprets payload of one notification as array of datapoints without copying it
+
+    :param data: notification including metadata
+    :param datapoint_dtype: NumPy dtype of one datapoint, byte order has to be explicit
+    """
+    datapoint_dtype = np.dtype(datapoint_dtype)
+    payload = memoryview(data)[Packet.metadata_length_total_bytes:]
+    return np.frombuffer(payload, dtype=datapoint_dtype, count=len(payload) // datapoint_dtype.itemsize)
+
+
+def decode_packets(datas, times_delivered, datapoint_dtype=None):
+    """Decodes several notifications in one call.
+    Metadata of all notifications is extracted with NumPy from one joined buffer, and datapoints of every packet
+    are views of that buffer.
+
+    :param datas: list of notifications
+    :param times_delivered: timestamp of delivery for each notification
+    :param datapoint_dtype: overrides Packet.datapoint_dtype
+    :return: list of Packet in the same order as datas
+    """
+    if not datas:
+        return []
+    datapoint_dtype = np.dtype(Packet.datapoint_dtype if datapoint_dtype is None else datapoint_dtype)
+
+    lengths = np.fromiter(map(len, datas), dtype=np.intp, count=len(datas))
+    if lengths.min() < Packet.metadata_length_total_bytes:
+        raise ValueError("Notification is shorter than metadata of a packet")
+    buffer = b''.join(datas)
+    joined = np.frombuffer(buffer, dtype=np.uint8)
+    starts = np.cumsum(lengths) - lengths
+
+    transaction_numbers = joined[starts].tolist()
+    packet_numbers = joined[starts + 1].tolist()
+    times_created = decode_times_created(joined[starts[:, None] + np.arange(2, 2 + Packet.time_bytes)]).tolist()
+
+    if (lengths == lengths[0]).all():
+        # all packets have the same size, so the whole buffer is one structured array
+        number_of_datapoints = (lengths[0] - Packet.metadata_length_total_bytes) // datapoint_dtype.itemsize
+        record = np.dtype({'names': ['datapoints'],
+                           'formats': [(datapoint_dtype, (number_of_datapoints,))],
+                           'offsets': [Packet.metadata_length_total_bytes],
+                           'itemsize': int(lengths[0])})
+        datapoints = np.frombuffer(buffer, dtype=record)['datapoints']
+    else:
+        datapoints = [np.frombuffer(buffer, dtype=datapoint_dtype,
+                                    count=(length - Packet.metadata_length_total_bytes) // datapoint_dtype.itemsize,
+                                    offset=start + Packet.metadata_length_total_bytes)
+                      for start, length in zip(starts.tolist(), lengths.tolist())]
+
+    return [Packet.from_decoded(data, time_delivered, transaction_number, packet_number, time_created, points)
+            for data, time_delivered, transaction_number, packet_number, time_created, points
+            in zip(datas, times_delivered, transaction_numbers, packet_numbers, times_created, datapoints)]
+
@@ -0,0 +1,66 @@
+import numpy as np
+
+import Sample_store
+
+
+class MinMaxDecimator:
+    """Multi-resolution cache of min/max envelopes of an append-only series, x has to be non-decreasing.
+
+    Level 0 holds raw points, every next level holds min and max of `factor` consecutive bins of the previous level.
+    query() picks the coarsest level which still has at least one bin per pixel, so the cost of a redraw depends on
+    the width of the plot in pixels, not on the length of the session."""
+
+    def __init__(self, factor=4, levels=10):
+        """
+
+        :param factor: number of bins of the previous level joined into one bin of the next level
+        :param levels: number of levels including raw points, the coarsest bin holds factor ** (levels - 1) points
+        """
+        self.factor = factor
+        self.levels = [Sample_store.SampleStore(columns=[('x', 'f8'), ('min', 'f8'), ('max', 'f8')])
+                       for _ in range(levels)]
+        self.consumed = [0] * levels  # number of rows of the previous level which are joined into this level
+
+    def __len__(self):
+        return len(self.levels[0])
+
+    def extend(self, x, y):
+        """Appends new points, cost is proportional to the number of new points"""
+        self.levels[0].extend(x, y, y)
+        for k in range(1, len(self.levels)):
+            previous = self.levels[k - 1]
+            start = self.consumed[k]
+            stop = start + (len(previous) - start) // self.factor * self.factor
+            if stop == start:
+                break
+            self.levels[k].extend(previous['x'][start:stop:self.factor],
+                                  previous['min'][start:stop].reshape(-1, self.factor).min(axis=1),
+                                  previous['max'][start:stop].reshape(-1, self.factor).max(axis=1))
+            self.consumed[k] = stop
+
+    def query(self, x0, x1, pixels):
+        """Envelope of points with x0 <= x <= x1, plus one point on each side, so the line reaches the edges
+
+        :param pixels: width of the plot in pixels
+        :return: (x, y) vertices of a line, every bin gives 2 vertices: (x, min) and (x, max)
+        """
+        for k in reversed(range(len(self.levels))):
+            level = self.levels[k]
+            i, j = np.searchsorted(level['x'], [x0, x1], side='right')
+            if j - i >= pixels or k == 0:
+                break
+        i = max(i - 1, 0)
+        j = min(j + 1, len(level))
+        parts = [(level['x'][i:j], level['min'][i:j], level['max'][i:j])]
+
+        if j == len(level):
+            # newest points, which are not joined into bins of this level yet, are taken from finer levels
+            for m in reversed(range(k)):
+                start = self.consumed[m + 1]
+                finer = self.levels[m]
+                parts.append((finer['x'][start:], finer['min'][start:], finer['max'][start:]))
+
+        x = np.concatenate([part[0] for part in parts])
+        low = np.concatenate([part[1] for part in parts])
+        high = np.concatenate([part[2] for part in parts])
+        return np.repeat(x, 2), np.column_stack((low, high)).ravel()
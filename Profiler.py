@@ -0,0 +1,175 @@
+import cProfile
+import datetime
+import inspect
+import os
+import sys
+import threading
+import time
+
+# Profiles a running session, can be started and stopped at any moment, e.g. when ingestion falls behind in the field.
+#
+# A sampling thread looks at the stack of the event loop thread every `interval` seconds. Samples are written as
+# folded stacks ("outer;inner;innermost count" per line), which flamegraph.pl and speedscope read directly, and are
+# summed per coroutine of the outermost task, which gives busy time of every loop, e.g. update_ui_loop.
+# Optionally cProfile runs at the same time and its statistics are written to a .prof file (snakeviz, flameprof).
+
+idle_name = "(idle, waiting for events)"
+other_name = "(callbacks outside of coroutines)"
+# (file, function) where the event loop waits for events: selector loop on Linux and macOS, proactor loop on Windows
+idle_functions = {('selectors.py', 'select'),
+                  ('windows_events.py', 'select'),
+                  ('windows_events.py', '_poll'),
+                  }
+
+
+class SamplingProfiler:
+    """Samples stack of one thread from a background thread"""
+
+    def __init__(self, thread_id=None, interval=0.005):
+        """
+
+        :param thread_id: thread to sample, the calling thread if None
+        :param interval: seconds between samples
+        """
+        self.thread_id = threading.get_ident() if thread_id is None else thread_id
+        self.interval = interval
+        self.stacks = {}  # folded stack -> number of samples
+        self.busy = {}  # name of the outermost coroutine -> number of samples
+        self.samples = 0
+        self.stopped = threading.Event()
+        self.thread = None
+        self.time_started = None
+        self.time_stopped = None
+
+    def start(self):
+        self.stopped.clear()
+        self.time_started = time.perf_counter()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()  # wakes the sampling thread, so stop does not wait for the interval
+        self.thread.join()
+        self.time_stopped = time.perf_counter()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.add_sample(frame)
+            del frame
+
+    def add_sample(self, frame):
+        names = []
+        coroutine = None
+        idle = False
+        while frame is not None:
+            code = frame.f_code
+            names.append("{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            if code.co_flags & inspect.CO_COROUTINE:
+                coroutine = code.co_name  # the last one found is the outermost
+            if (os.path.basename(code.co_filename), code.co_name) in idle_functions:
+                idle = True
+            frame = frame.f_back
+        names.reverse()
+        folded = ";".join(names)
+        self.stacks[folded] = self.stacks.get(folded, 0) + 1
+        name = idle_name if idle else (other_name if coroutine is None else coroutine)
+        self.busy[name] = self.busy.get(name, 0) + 1
+        self.samples += 1
+
+    def write_folded(self, f):
+        for folded, count in sorted(self.stacks.items()):
+            f.write("{} {}\n".format(folded, count))
+
+    def get_busy_report(self):
+        """:return: list of (name, seconds, percent of samples), the busiest first"""
+        if not self.samples:  # stopped before the first sample
+            return []
+        elapsed = (self.time_stopped or time.perf_counter()) - self.time_started
+        report = []
+        for name, count in sorted(self.busy.items(), key=lambda item: -item[1]):
+            fraction = count / self.samples
+            report.append((name, round(fraction * elapsed, 3), round(100 * fraction, 1)))
+        return report
+
+
+class Profiler:
+    """Start/stop switch used by App and headless_recorder.py"""
+
+    def __init__(self, directory, use_cprofile=False, interval=0.005):
+        """
+
+        :param directory: profiles are written there
+        :param use_cprofile: also run cProfile, it slows down the profiled code several times
+        :param interval: seconds between samples
+        """
+        self.directory = directory
+        self.use_cprofile = use_cprofile
+        self.interval = interval
+        self.sampler = None
+        self.cprofile = None
+
+    @property
+    def running(self):
+        return self.sampler is not None
+
+    def start(self):
+        """Should be called from the thread running the event loop"""
+        if self.running:
+            return
+        self.sampler = SamplingProfiler(interval=self.interval)
+        self.sampler.start()
+        if self.use_cprofile:
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+        print('Profiler started')
+
+    def stop(self):
+        """Writes profiles
+
+        :return: list of written files
+        """
+        if not self.running:
+            return []
+        sampler, profile = self.sampler, self.cprofile
+        self.sampler = None  # profiler is stopped even if profiles can not be written
+        self.cprofile = None
+        try:
+            if profile is not None:
+                profile.disable()
+        finally:
+            sampler.stop()
+
+        os.makedirs(self.directory, exist_ok=True)
+        prefix = self.get_unique_prefix()
+        paths = [prefix + '.folded', prefix + '_busy.txt']
+        with open(paths[0], 'x') as f:
+            sampler.write_folded(f)
+        with open(paths[1], 'x') as f:
+            f.write("Samples: {}, interval: {} s\n".format(sampler.samples, self.interval))
+            for name, seconds, percent in sampler.get_busy_report():
+                f.write("{:>6}% {:>10} s  {}\n".format(percent, seconds, name))
+        if profile is not None:
+            paths.append(prefix + '.prof')
+            profile.dump_stats(paths[-1])
+        print('Profiler stopped:', *paths)
+        return paths
+
+    def get_unique_prefix(self):
+        """Path without extension, which is not used by any profile yet, profiles may be stopped several times per
+        second"""
+        name = datetime.datetime.now().strftime('profile_%Y-%m-%d_%H-%M-%S-%f')[:-3]  # milliseconds
+        prefix = os.path.join(self.directory, name)
+        counter = 1
+        while any(os.path.exists(prefix + suffix) for suffix in ('.folded', '_busy.txt', '.prof')):
+            prefix = os.path.join(self.directory, "{}_{}".format(name, counter))
+            counter += 1
+        return prefix
+
+    def toggle(self):
+        """:return: list of written files, empty if profiler was started"""
+        if self.running:
+            return self.stop()
+        self.start()
+        return []
@@ -0,0 +1,131 @@
+import asyncio
+import random
+
+
+class Backoff:
+    """Exponential backoff with jitter, so several devices which lost connection at the same time do not retry
+    in lockstep"""
+
+    def __init__(self, initial=0.05, maximum=10.0, factor=2.0, jitter=0.5):
+        """
+
+        :param initial: seconds before the second attempt, the first attempt after a disconnect is immediate
+        :param maximum: seconds, delay never grows above it
+        :param factor: delay is multiplied by it after every failed attempt
+        :param jitter: fraction of delay which is randomized, 0 means no randomization
+        """
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.jitter = jitter
+        self.attempt = 0
+
+    def reset(self):
+        self.attempt = 0
+
+    def next_delay(self):
+        """Seconds to wait before the next attempt"""
+        if self.attempt == 0:
+            delay = 0
+        else:
+            delay = min(self.initial * self.factor ** (self.attempt - 1), self.maximum)
+            delay *= 1 - self.jitter * random.random()
+        self.attempt += 1
+        return delay
+
+
+class ReconnectionMetrics:
+    """Counts disconnects and measures how long it takes to get notifications again"""
+
+    def __init__(self):
+        self.connects = 0
+        self.disconnects = 0
+        self.failed_attempts = 0
+        self.reconnect_latencies = []  # seconds from disconnect to notifications being enabled again
+        self.time_disconnected = None
+
+    def on_connected(self, time):
+        self.connects += 1
+        if self.time_disconnected is not None:
+            self.reconnect_latencies.append(time - self.time_disconnected)
+            self.time_disconnected = None
+
+    def on_disconnected(self, time):
+        self.disconnects += 1
+        self.time_disconnected = time
+
+    def on_failed_attempt(self):
+        self.failed_attempts += 1
+
+    def summary(self):
+        latencies = sorted(self.reconnect_latencies)
+        result = {'Connects': self.connects,
+                  'Disconnects': self.disconnects,
+                  'Failed attempts': self.failed_attempts,
+                  }
+        if latencies:
+            result['Reconnect latency median, s'] = latencies[len(latencies) // 2]
+            result['Reconnect latency max, s'] = latencies[-1]
+        return result
+
+
+async def keep_connection(client, uuids, callbacks, backoff=None, metrics=None, connect_timeout=32,
+                          watchdog_interval=10):
+    """Connects client, subscribes to notifications and reconnects as soon as the disconnected callback fires.
+
+    :param client: bleak.BleakClient or an object with the same interface
+    :param uuids: characteristics to subscribe to
+    :param callbacks: one per uuid
+    :param backoff: Backoff used between failed attempts
+    :param metrics: ReconnectionMetrics to update, optional
+    :param connect_timeout: seconds, should be the same as in firmware
+    :param watchdog_interval: seconds, is_connected is checked that often in case disconnected callback was missed
+    """
+    loop = asyncio.get_running_loop()
+    if backoff is None:
+        backoff = Backoff()
+    disconnected = asyncio.Event()
+
+    def on_disconnect(client):
+        print("Client with address {} got disconnected!".format(client.address))
+        # some backends call it from another thread
+        loop.call_soon_threadsafe(disconnected.set)
+
+    client.set_disconnected_callback(on_disconnect)
+    while True:
+        await asyncio.sleep(backoff.next_delay())
+        try:
+            disconnected.clear()
+            await client.connect(timeout=connect_timeout)
+            if not client.is_connected:
+                print(f"Not connected to Device, reconnecting...")
+                if metrics is not None:
+                    metrics.on_failed_attempt()
+                continue
+            print("Connected to Device")
+            for uuid, callback in zip(uuids, callbacks):
+                await client.start_notify(uuid, callback)
+            if metrics is not None:
+                metrics.on_connected(loop.time())
+            backoff.reset()
+
+            while client.is_connected:
+                try:
+                    await asyncio.wait_for(disconnected.wait(), timeout=watchdog_interval)
+                    break
+                except asyncio.TimeoutError:
+                    pass
+            if metrics is not None:
+                metrics.on_disconnected(loop.time())
+            print("Lost connection, reconnecting...")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(e)
+            print("Connection error, reconnecting...")
+            if metrics is not None:
+                metrics.on_failed_attempt()
+        try:
+            await client.disconnect()  # accelerates reconnection
+        except Exception as e:
+            print(e)
@@ -0,0 +1,79 @@
+import numpy as np
+
+
+class SampleStore:
+    """Growable column store for data received from one sender.
+
+    Every column is a NumPy array preallocated for `capacity` rows. When all rows are used, capacity is doubled,
+    so appending a row costs amortized O(1), while enlarging a DataFrame with `.loc` copies the whole frame.
+    A column can be a fixed-width block (rows x width), e.g. all datapoints of one transaction packed as uint16."""
+
+    def __init__(self, columns, index=None, capacity=1024):
+        """
+
+        :param columns: list of (name, dtype) or (name, dtype, width) tuples, defines order of values passed to append()
+        :param index: name of the column used as index of DataFrame returned by to_dataframe()
+        :param capacity: number of rows preallocated at start
+        """
+        self.columns = [column[0] for column in columns]
+        self.index = index
+        self.capacity = max(1, capacity)
+        self.length = 0
+        self.arrays = {}
+        for name, dtype, *width in columns:
+            self.arrays[name] = np.empty((self.capacity,) + tuple(width), dtype=dtype)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, name):
+        """Returns a view (not a copy) of filled rows of the column"""
+        return self.arrays[name][:self.length]
+
+    def append(self, *values):
+        """Appends one row, values are given in the same order as columns"""
+        if self.length == self.capacity:
+            self.reserve(2 * self.capacity)
+        for name, value in zip(self.columns, values):
+            self.arrays[name][self.length] = value
+        self.length += 1
+
+    def extend(self, *columns):
+        """Appends many rows at once, columns are given in the same order as in constructor"""
+        count = len(columns[0])
+        if self.length + count > self.capacity:
+            capacity = self.capacity
+            while capacity < self.length + count:
+                capacity *= 2
+            self.reserve(capacity)
+        for name, values in zip(self.columns, columns):
+            self.arrays[name][self.length:self.length + count] = values
+        self.length += count
+
+    def clear(self):
+        """Forgets all rows, keeps allocated memory for new ones"""
+        self.length = 0
+
+    def reserve(self, capacity):
+        """Makes sure that at least `capacity` rows fit without reallocation"""
+        if capacity <= self.capacity:
+            return
+        for name, array in self.arrays.items():
+            grown = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.length] = array[:self.length]
+            self.arrays[name] = grown
+        self.capacity = capacity
+
+    def to_dataframe(self):
+        """Returns filled rows as pandas DataFrame, numeric columns are not copied if pandas allows it.
+        Each cell of a block column holds a view of its row."""
+        import pandas as pd  # imported only when needed, so the store itself does not depend on pandas
+
+        data = {}
+        for name in self.columns:
+            column = self[name]
+            data[name] = column if column.ndim == 1 else list(column)
+        df = pd.DataFrame(data, columns=self.columns, copy=False)
+        if self.index is not None:
+            df = df.set_index(self.index)
+        return df
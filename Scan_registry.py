@@ -0,0 +1,81 @@
+import bisect
+import time
+
+
+class ScanRegistry:
+    """Devices found by scanning, kept sorted by signal strength while advertisements arrive.
+
+    Detection callback costs a dict lookup if RSSI did not change, and a binary search plus a short list move if it
+    did, so crowded places with hundreds of advertisers do not load the event loop. Devices not heard for `max_age`
+    seconds are forgotten."""
+
+    def __init__(self, max_age=30.0, clock=time.monotonic):
+        """
+
+        :param max_age: seconds after the last advertisement, after which device is removed
+        :param clock: returns current time in seconds
+        """
+        self.max_age = max_age
+        self.clock = clock
+        self.devices = {}  # address -> [rssi, time last seen, BLEDevice]
+        self.order = []  # (-rssi, address), sorted, strongest signal first
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __contains__(self, address):
+        return address in self.devices
+
+    def update(self, device, rssi):
+        """Called for every advertisement
+
+        :param device: bleak.backends.device.BLEDevice
+        :param rssi: signal strength, dBm
+        """
+        entry = self.devices.get(device.address)
+        if entry is None:
+            self.devices[device.address] = [rssi, self.clock(), device]
+            bisect.insort(self.order, (-rssi, device.address))
+            return
+        entry[1] = self.clock()
+        entry[2] = device
+        if entry[0] != rssi:
+            del self.order[bisect.bisect_left(self.order, (-entry[0], device.address))]
+            bisect.insort(self.order, (-rssi, device.address))
+            entry[0] = rssi
+
+    def remove(self, address):
+        entry = self.devices.pop(address, None)
+        if entry is not None:
+            del self.order[bisect.bisect_left(self.order, (-entry[0], address))]
+
+    def expire(self):
+        """Removes devices which were not heard for max_age seconds, cost is proportional to the number of devices"""
+        oldest = self.clock() - self.max_age
+        for address in [address for address, entry in self.devices.items() if entry[1] < oldest]:
+            self.remove(address)
+
+    def top(self, k):
+        """k devices with the strongest signal, stale devices are skipped, so cost is O(k) while nothing expired
+
+        :return: list of (BLEDevice, rssi)
+        """
+        oldest = self.clock() - self.max_age
+        result = []
+        stale = []
+        for _, address in self.order:
+            if len(result) == k:
+                break
+            rssi, last_seen, device = self.devices[address]
+            if last_seen < oldest:
+                stale.append(address)
+            else:
+                result.append((device, rssi))
+        for address in stale:
+            self.remove(address)
+        return result
+
+    def get_device(self, address):
+        """BLEDevice with this address or None"""
+        entry = self.devices.get(address)
+        return None if entry is None else entry[2]
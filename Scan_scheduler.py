@@ -0,0 +1,96 @@
+import asyncio
+
+
+class ScanScheduler:
+    """Starts and stops a scanner, so scanning does not compete with connected devices for radio time.
+
+    Scans continuously while no device is streaming, scans for `burst` seconds after request_burst() (e.g. when
+    device list is opened), and otherwise scans only `duty_cycle` part of every `period`."""
+
+    def __init__(self, scanner, is_streaming, burst=10.0, duty_cycle=0.0, period=60.0, check_interval=1.0):
+        """
+
+        :param scanner: object with coroutine methods start() and stop(), e.g. bleak.BleakScanner
+        :param is_streaming: function, returns True while at least one device is connected
+        :param burst: seconds of scanning after request_burst()
+        :param duty_cycle: fraction of time spent scanning in background while devices are streaming, 0 to 1
+        :param period: seconds, length of one background scanning cycle
+        :param check_interval: seconds, how often is_streaming() is checked
+        """
+        self.scanner = scanner
+        self.is_streaming = is_streaming
+        self.burst = burst
+        self.duty_cycle = duty_cycle
+        self.period = period
+        self.check_interval = check_interval
+
+        self.scanning = False
+        self.burst_until = float('-inf')
+        self.wakeup = asyncio.Event()
+        self.time_scanning = 0.0  # seconds, total
+        self.time_started = None
+        self.time_scan_started = None
+        self.task = None
+
+    def request_burst(self, duration=None):
+        """Scans for `duration` seconds (default `burst`) even if devices are streaming"""
+        loop = asyncio.get_running_loop()
+        self.burst_until = max(self.burst_until, loop.time() + (self.burst if duration is None else duration))
+        self.wakeup.set()
+
+    def should_scan(self, now):
+        """:return: (True if scanner should run now, seconds until the answer may change)"""
+        if not self.is_streaming():
+            return True, self.check_interval
+        if now < self.burst_until:
+            return True, self.burst_until - now
+        if self.duty_cycle <= 0:
+            return False, self.check_interval
+        phase = (now - self.time_started) % self.period
+        on_time = self.duty_cycle * self.period
+        if phase < on_time:
+            return True, on_time - phase
+        return False, min(self.period - phase, self.check_interval)
+
+    def get_scanning_fraction(self):
+        """Part of time since run() started during which scanner was running"""
+        loop = asyncio.get_running_loop()
+        total = self.time_scanning
+        if self.scanning:
+            total += loop.time() - self.time_scan_started
+        elapsed = loop.time() - self.time_started if self.time_started is not None else 0
+        return total / elapsed if elapsed > 0 else 0
+
+    async def run(self):
+        """Runs until close() is called or the task is cancelled, scanner is stopped at the end"""
+        loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.time_started = loop.time()
+        try:
+            while True:
+                wanted, timeout = self.should_scan(loop.time())
+                if wanted and not self.scanning:
+                    await self.scanner.start()
+                    self.scanning = True
+                    self.time_scan_started = loop.time()
+                elif not wanted and self.scanning:
+                    await self.stop_scanner()
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.stop_scanner()
+
+    async def stop_scanner(self):
+        if self.scanning:
+            self.scanning = False
+            self.time_scanning += asyncio.get_running_loop().time() - self.time_scan_started
+            await self.scanner.stop()
+
+    async def close(self):
+        """Stops scheduling and waits until scanner is stopped"""
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
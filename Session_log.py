@@ -0,0 +1,357 @@
+import bisect
+import csv
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# Session log is an append-only binary file, which is written while experiment is running,
+# so a crash loses only data received after the last flush.
+#
+# File starts with `file_magic`, then chunks follow one after another. Each chunk holds new rows of one sender:
+#   header      struct `chunk_header` = b'CHNK', descriptor length, payload length, crc32 of descriptor and payload
+#   descriptor  UTF-8 JSON {"sender": ..., "rows": ..., "columns": [[name, dtype, width], ...]}
+#   payload     columns one after another, each column is rows * width values of its dtype
+# Reading stops at the first incomplete or corrupted chunk, which is what a crash in the middle of writing leaves.
+#
+# While recording, every autosave adds one chunk per sender, so a long session has thousands of chunks. When the
+# writer is closed, chunks of every sender are compacted into one, so reading a closed log does not join chunks.
+
+file_magic = b'RKPLOG\x00\x01'
+chunk_magic = b'CHNK'
+chunk_header = struct.Struct('<4sIII')
+
+
+class SessionWriter:
+    """Appends rows of Sample_store.SampleStore objects to a session log"""
+
+    def __init__(self, path):
+        """
+
+        :param path: file to create, existing files are never overwritten
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, 'xb')
+        self.file.write(file_magic)
+        self.rows_written = {}  # sender -> number of rows of its store which are already in the log
+
+    def write_new_rows(self, stores, clear=False):
+        """Writes rows appended to stores since the previous call, one chunk per sender, and flushes file to disk
+
+        :param stores: dict sender -> Sample_store.SampleStore
+        :param clear: remove written rows from stores, so memory does not grow during long recordings
+        :return: number of rows written
+        """
+        total = 0
+        for sender, store in list(stores.items()):
+            start = self.rows_written.get(sender, 0)
+            stop = len(store)
+            if stop > start:
+                self.write_chunk(sender, {name: store[name][start:stop] for name in store.columns})
+                self.rows_written[sender] = stop
+                total += stop - start
+            if clear:
+                store.clear()
+                self.rows_written[sender] = 0
+        if total:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        return total
+
+    def write_chunk(self, sender, columns):
+        """
+        :param sender: handle of characteristic, has to be JSON serializable
+        :param columns: dict name -> array, all arrays have the same number of rows
+        """
+        arrays = [np.ascontiguousarray(array) for array in columns.values()]
+        descriptor = json.dumps({
+            'sender': sender,
+            'rows': len(arrays[0]),
+            'columns': [[name, array.dtype.str, int(np.prod(array.shape[1:]))]
+                        for name, array in zip(columns.keys(), arrays)],
+        }).encode()
+        payload = b''.join(array.tobytes() for array in arrays)
+        crc = zlib.crc32(payload, zlib.crc32(descriptor))
+        self.file.write(chunk_header.pack(chunk_magic, len(descriptor), len(payload), crc) + descriptor + payload)
+
+    def close(self, compact=True):
+        """
+        :param compact: rewrite the log with one chunk per sender, see compact()
+        """
+        if self.file.closed:
+            return
+        self.file.close()
+        if compact:
+            compact_log(self.path)
+
+
+def write_joined_chunk(f, sender, chunks):
+    """Writes rows of several chunks of one sender as one chunk, without joining them in memory
+
+    :param chunks: list of dicts name -> array with the same columns, e.g. SessionReader.chunks[sender]
+    """
+    names = list(chunks[0].keys())
+    descriptor = json.dumps({
+        'sender': sender,
+        'rows': sum(len(columns[names[0]]) for columns in chunks),
+        'columns': [[name, chunks[0][name].dtype.str, int(np.prod(chunks[0][name].shape[1:]))] for name in names],
+    }).encode()
+    parts = [np.ascontiguousarray(columns[name]) for name in names for columns in chunks]
+    crc = zlib.crc32(descriptor)
+    for part in parts:
+        crc = zlib.crc32(memoryview(part).cast('B'), crc)
+    payload_length = sum(part.nbytes for part in parts)
+    f.write(chunk_header.pack(chunk_magic, len(descriptor), payload_length, crc) + descriptor)
+    for part in parts:
+        f.write(memoryview(part).cast('B'))
+
+
+def get_layout(columns):
+    return [(name, array.dtype.str, array.shape[1:]) for name, array in columns.items()]
+
+
+def _write_compacted(reader, f):
+    for sender in reader.senders:
+        group = []
+        for columns in reader.chunks[sender]:
+            if group and get_layout(group[0]) != get_layout(columns):
+                write_joined_chunk(f, sender, group)  # layout changed, chunks are joined up to here
+                group = []
+            group.append(columns)
+        if group:
+            write_joined_chunk(f, sender, group)
+
+
+def compact_log(path):
+    """Rewrites session log with one chunk per sender, so SessionReader returns views of the mapped file.
+    Compacted log is written to a temporary file, which replaces the original only when it is complete,
+    so a crash during compaction keeps the original log. Incomplete or corrupted chunks at the end are dropped.
+
+    :return: path
+    """
+    temporary = path + '.compacting'
+    with SessionReader(path, verify=True) as reader:
+        with open(temporary, 'wb') as f:
+            f.write(file_magic)
+            _write_compacted(reader, f)  # in a function, so no view of the mapped file outlives the reader
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(temporary, path)
+    return path
+
+
+def parse_chunk(buffer, offset, verify=True):
+    """Parses chunk which starts at offset, columns are views of buffer
+
+    :param verify: check crc32, otherwise only the size of the chunk is checked
+    :return: (sender, columns, offset of the next chunk) or None if chunk is incomplete or corrupted
+    """
+    if len(buffer) - offset < chunk_header.size:
+        return None
+    magic, descriptor_length, payload_length, crc = chunk_header.unpack_from(buffer, offset)
+    start = offset + chunk_header.size
+    end = start + descriptor_length + payload_length
+    if magic != chunk_magic or end > len(buffer):
+        return None
+    if verify and zlib.crc32(memoryview(buffer)[start:end]) != crc:
+        return None
+    descriptor = json.loads(bytes(buffer[start:start + descriptor_length]))
+
+    columns = {}
+    position = start + descriptor_length
+    rows = descriptor['rows']
+    for name, dtype, width in descriptor['columns']:
+        dtype = np.dtype(dtype)
+        array = np.frombuffer(buffer, dtype=dtype, count=rows * width, offset=position)
+        columns[name] = array if width == 1 else array.reshape(rows, width)
+        position += rows * width * dtype.itemsize
+    return descriptor['sender'], columns, end
+
+
+class SessionReader:
+    """Memory-maps a session log. Opening reads only headers and descriptors of chunks, columns of every chunk
+    are NumPy views of the mapped file. Rows of several chunks are joined with a copy, which happens only for a log
+    which is still being written, closed logs have one chunk per sender, see compact_log()."""
+
+    def __init__(self, path, index="Time best effort", verify=False, limit=None):
+        """
+
+        :param path: session log, may still be written by SessionWriter, only complete chunks are read
+        :param index: column used for time-range slicing, it is expected to increase
+        :param verify: check crc32 of every chunk, reads the whole file
+        :param limit: only chunks within the first `limit` bytes are read
+        """
+        self.path = path
+        self.index = index
+        with open(path, 'rb') as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[:len(file_magic)] != file_magic:
+            self.buffer.close()
+            raise ValueError("Not a session log: " + str(path))
+
+        self.chunks = {}  # sender -> list of dicts name -> view
+        self.first_times = {}  # sender -> index value of the first row of every chunk
+        offset = len(file_magic)
+        while True:
+            parsed = parse_chunk(self.buffer, offset, verify=verify)
+            if parsed is None or (limit is not None and parsed[2] > limit):
+                break
+            sender, columns, offset = parsed
+            if not len(columns[index]):
+                continue
+            self.chunks.setdefault(sender, []).append(columns)
+            self.first_times.setdefault(sender, []).append(columns[index][0])
+
+    @property
+    def senders(self):
+        return list(self.chunks.keys())
+
+    def __len__(self):
+        return sum(len(columns[self.index]) for chunks in self.chunks.values() for columns in chunks)
+
+    def get_columns(self, sender, names=None):
+        """All rows of the sender, a view if the sender has one chunk (the log was closed), otherwise a joined copy
+
+        :return: dict name -> array
+        """
+        return self._join(self.chunks.get(sender, []), names)
+
+    def get_time_range(self, sender, start, stop, names=None):
+        """Rows of the sender with start <= index < stop, found with binary search in O(log n).
+        If all rows are in one chunk, arrays are views of the mapped file.
+
+        :return: dict name -> array
+        """
+        chunks = self.chunks.get(sender, [])
+        first_times = self.first_times.get(sender, [])
+        first = max(bisect.bisect_right(first_times, start) - 1, 0)
+        last = bisect.bisect_left(first_times, stop)
+        selected = []
+        for columns in chunks[first:last]:
+            times = columns[self.index]
+            i = np.searchsorted(times, start, side='left')
+            j = np.searchsorted(times, stop, side='left')
+            if j > i:
+                selected.append({name: array[i:j] for name, array in columns.items()})
+        if not selected and chunks:
+            selected.append({name: array[:0] for name, array in chunks[0].items()})  # empty, but keeps dtypes
+        return self._join(selected, names)
+
+    def to_dataframe(self, sender):
+        """Rows of the sender as pandas DataFrame, in the same layout as Sample_store.SampleStore.to_dataframe()"""
+        import pandas as pd  # imported only when needed, so the reader itself does not depend on pandas
+
+        columns = self.get_columns(sender)
+        df = pd.DataFrame({name: array if array.ndim == 1 else list(array) for name, array in columns.items()},
+                          copy=False)
+        return df.set_index(self.index)
+
+    def _join(self, chunks, names):
+        if not chunks:
+            return {}
+        if names is None:
+            names = list(chunks[0].keys())
+        if len(chunks) == 1:
+            return {name: chunks[0][name] for name in names}
+        return {name: np.concatenate([columns[name] for columns in chunks]) for name in names}
+
+    def close(self):
+        """Unmaps the file, views returned before must not be used after that"""
+        self.chunks = {}
+        self.first_times = {}
+        try:
+            self.buffer.close()
+        except BufferError:
+            pass  # some views are still referenced, file is unmapped when they are garbage collected
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def convert_to_json(log_path, f, index="Time best effort", limit=None, progress=None):
+    """Converts session log to JSON with the same layout as DataFrame.to_dict(orient='index') of every sender.
+    JSON is written row by row without indentation, so the whole session never has to be in memory
+    as Python objects.
+
+    :param log_path: session log
+    :param f: text file opened for writing
+    :param index: column used as key of rows
+    :param limit: only chunks within the first `limit` bytes are converted, makes a snapshot of a growing log
+    :param progress: optional callable, receives fraction of converted rows after every chunk
+    """
+    with SessionReader(log_path, index=index, limit=limit) as reader:
+        total = max(len(reader), 1)
+        done = 0
+        f.write('{')
+        for i, sender in enumerate(reader.senders):
+            f.write(', ' if i else '')
+            f.write(json.dumps(str(sender)) + ': {')
+            first_row = True
+            for columns in reader.chunks[sender]:
+                keys = columns[index].tolist()
+                names = [name for name in columns.keys() if name != index]
+                values = [columns[name].tolist() for name in names]
+                # repeated keys are kept, JSON readers keep the last one, same as DataFrame.loc used to overwrite rows
+                for key, row in zip(keys, zip(*values)):
+                    f.write('' if first_row else ', ')
+                    first_row = False
+                    f.write(json.dumps(str(key)) + ': ' + json.dumps(dict(zip(names, row))))
+                done += len(keys)
+                if progress is not None:
+                    progress(done / total)
+            f.write('}')
+        f.write('}')
+
+
+def convert_to_csv(log_path, f, index="Time best effort", limit=None, progress=None):
+    """Converts session log to CSV, one row per transaction with "Sender" as the first column.
+    Block columns are expanded, e.g. "Data 0", "Data 1", ..., header is taken from the first chunk.
+    Parameters are the same as in convert_to_json()"""
+    writer = csv.writer(f, lineterminator='\n')
+    with SessionReader(log_path, index=index, limit=limit) as reader:
+        total = max(len(reader), 1)
+        done = 0
+        header_written = False
+        for sender in reader.senders:
+            for columns in reader.chunks[sender]:
+                names = [index] + [name for name in columns.keys() if name != index]
+                if not header_written:
+                    header = ["Sender"]
+                    for name in names:
+                        if columns[name].ndim == 1:
+                            header.append(name)
+                        else:
+                            header.extend(name + " " + str(i) for i in range(columns[name].shape[1]))
+                    writer.writerow(header)
+                    header_written = True
+                values = [columns[name].tolist() for name in names]
+                for row in zip(*values):
+                    line = [sender]
+                    for value in row:
+                        if isinstance(value, list):
+                            line.extend(value)
+                        else:
+                            line.append(value)
+                    writer.writerow(line)
+                done += len(values[0])
+                if progress is not None:
+                    progress(done / total)
+
+
+if __name__ == "__main__":
+    # offline conversion: python Session_log.py experiment.rkplog experiment.json (or experiment.csv)
+    with open(sys.argv[2], 'x', newline='') as output:
+        if sys.argv[2].endswith('.csv'):
+            convert_to_csv(sys.argv[1], output)
+        else:
+            convert_to_json(sys.argv[1], output)
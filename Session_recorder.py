@@ -0,0 +1,174 @@
+import Instrumentation
+import Packet_decoder
+import Sample_store
+import Transaction_reassembly
+
+
+class SessionRecorder:
+    """Turns notifications of one device into rows of Sample_store.SampleStore, one store per sender.
+    Does not depend on UI, so it is shared by App and headless_recorder.py"""
+
+    def __init__(self, packets_per_transaction=9, max_open_transactions=4, reassembly_timeout=2.0, stores=None,
+                 device=None):
+        """
+
+        :param packets_per_transaction: number of packets in transaction
+        :param max_open_transactions: transactions reassembled at the same time
+        :param reassembly_timeout: seconds, incomplete transaction is reported as lost after that
+        :param stores: dict shared by recorders of several devices, new one is created if None
+        :param device: address of the device, stores are keyed "address/sender" if given, otherwise by sender
+        """
+        self.stores = {} if stores is None else stores  # one Sample_store.SampleStore per sender
+        self.device = device
+        self.transaction_counters = {}
+
+        self.time_unwrapper = Packet_decoder.TimeOfDayUnwrapper()  # sessions may last longer than 24 hours
+        self.reassembly_buffer = Transaction_reassembly.ReassemblyBuffer(size=packets_per_transaction,
+                                                                        max_open=max_open_transactions,
+                                                                        timeout=reassembly_timeout,
+                                                                        time_unwrapper=self.time_unwrapper)
+        self.last_transaction_time = float('inf')
+        self.offest_time = 0
+        self.last_time_best_effort = float('-inf')
+        self.time_changed_threshold = 0
+        # width of "Data" is set by the first transaction of a sender, transactions of another length can not be stored
+        self.statistics = {'Transactions of different length': 0}
+
+    def add_packet(self, sender, data: bytearray, time_delivered):
+        """Reassembles notification into transactions and stores completed ones
+
+        :param sender: handle, should be unique for each uuid
+        :param data: notification
+        :param time_delivered: timestamp when notification was received
+        :return: number of stored transactions
+        """
+        completed, lost = self.reassembly_buffer.add_packet(data=data, time_delivered=time_delivered)
+        # lost transactions are counted by Instrumentation and in self.reassembly_buffer.statistics
+        # for transaction in lost:
+        #     print("Transaction lost", transaction.transaction_number,
+        #           "missing packets:", transaction.get_missing_packet_numbers())
+        stored = 0
+        for transaction in completed:
+            stored += self.add_transaction(sender, transaction)
+        return stored
+
+    def add_packets(self, sender, datas, times_delivered):
+        """Same as add_packet(), for several notifications of one sender. They are decoded in one call and completed
+        transactions are appended to the store at once.
+
+        :param sender: handle, should be unique for each uuid
+        :param datas: list of notifications, in order of delivery
+        :param times_delivered: timestamp for each notification
+        :return: number of stored transactions
+        """
+        completed, lost = self.reassembly_buffer.add_packets(datas, times_delivered)
+        return self.add_transactions(sender, completed)
+
+    def add_transaction(self, sender, transaction):
+        """Corrects time of completed transaction and appends it to the store of the sender
+
+        :param sender: handle, should be unique for each uuid of the device
+        :param transaction: finalized Transaction_reassembly.Transaction or DecodedTransaction
+        :return: True if transaction was stored, False if it was discarded
+        """
+        return self.add_transactions(sender, [transaction]) == 1
+
+    def add_transactions(self, sender, transactions):
+        """Corrects time of completed transactions, in order, and appends them to the store of the sender in one call
+
+        :param sender: handle, should be unique for each uuid of the device
+        :param transactions: list of finalized Transaction_reassembly.Transaction or DecodedTransaction
+        :return: number of stored transactions, the rest was discarded
+        """
+        if self.device is not None:
+            sender = "{}/{}".format(self.device, sender)
+        rows = []
+        store = self.stores.get(sender)
+        width = None if store is None else store.arrays["Data"].shape[1]
+        for transaction in transactions:
+            length = len(transaction.get_joined_data())
+            if width is None:
+                width = length
+            elif length != width:
+                # rejected before time correction, so counters and offset are not affected
+                self.statistics['Transactions of different length'] += 1
+                if Instrumentation.enabled:
+                    Instrumentation.count('Transactions of different length')
+                continue
+            row = self.correct_time(sender, transaction)
+            if row is not None:
+                rows.append(row)
+        if not rows:
+            return 0
+
+        if sender not in self.stores.keys():  # if data recieved from this sender very first time, create new store
+            data_joined = rows[0][-1]
+            # all datapoints of a transaction are packed into one row of fixed width
+            self.stores[sender] = Sample_store.SampleStore(
+                columns=[("Time best effort", 'f8'), ("N", 'i8'), ("Time of creation without offset", 'f8'),
+                         ("Time of delivery", 'f8'), ("Offset time", 'f8'), ("Jitter best effort", 'f8'),
+                         ("Transaction number", 'i8'), ("Data", data_joined.dtype, len(data_joined))],
+                index="Time best effort"
+            )
+
+        #  May be not stable in case of multi threading (so have to use async)
+        if len(rows) == 1:
+            self.stores[sender].append(*rows[0])
+        else:
+            self.stores[sender].extend(*zip(*rows))
+        if Instrumentation.enabled:
+            Instrumentation.count('Transactions stored', len(rows))
+        return len(rows)
+
+    def correct_time(self, sender, transaction):
+        """Time of creation of the device is shifted to the clock of the host, offset is reset when device rebooted
+
+        :param sender: key of the store
+        :param transaction: finalized Transaction_reassembly.Transaction or DecodedTransaction
+        :return: row of the store, None if transaction has to be discarded
+        """
+        data_joined = transaction.get_joined_data()
+        time_created = transaction.get_min_time_of_transaction_creation()
+        time_delivered = transaction.get_min_time_of_transaction_delivery()
+
+        # Time can only increment. If it decremented, it likely means BlueNRG chip rebooted.
+        if self.last_transaction_time <= time_created:
+            # print('Time incremented')
+            pass
+        else:
+            #  This self.offest_time might be stale,
+            #  set offset after receiving and discarding 1 full Transaction to flush TX buffer
+            self.time_changed_threshold += 1
+            if self.time_changed_threshold > 1:
+                self.time_changed_threshold = 0
+
+                self.offest_time = time_delivered - time_created
+                print('Time decremented, offset fixed', self.offest_time)
+                if Instrumentation.enabled:
+                    Instrumentation.count('Time offset resets')
+            else:
+                # print("Likely stale data, discarding Transaction")
+                if Instrumentation.enabled:
+                    Instrumentation.count('Transactions discarded')
+                return None
+        self.last_transaction_time = time_created
+
+        time_best_effort = time_created + self.offest_time
+        jitter_best_effort = time_best_effort - self.last_time_best_effort
+        self.last_time_best_effort = time_best_effort
+
+        if sender in self.transaction_counters:
+            self.transaction_counters[sender] += 1
+        else:
+            self.transaction_counters[sender] = 0
+
+        return (time_best_effort,  # used as an index
+                self.transaction_counters[sender],
+                time_created,
+                time_delivered,
+                self.offest_time,
+                # avoid infinity, it looks bad on plot
+                0 if jitter_best_effort == float('inf') else jitter_best_effort,
+                transaction.transaction_number,
+                data_joined,
+                )
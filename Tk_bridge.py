@@ -0,0 +1,54 @@
+import asyncio
+import _tkinter  # imported by tkinter anyway, gives access to Tcl event loop flags
+
+
+class TkEventPump:
+    """Runs Tk event processing from asyncio loop only when it is needed.
+
+    While Tk has events to process (user input, redraws), pump runs every `interval`. When Tk is idle, the delay
+    doubles up to `idle_interval`, so an idle app wakes the CPU only a few times per second.
+    request_update() wakes the pump immediately, e.g. when new data has to be shown."""
+
+    def __init__(self, root, interval=1 / 60, idle_interval=0.1):
+        """
+
+        :param root: Tk instance
+        :param interval: delay between updates while there are events to process
+        :param idle_interval: maximum delay between updates while Tk is idle, defines worst input latency
+        """
+        self.root = root
+        self.interval = interval
+        self.idle_interval = idle_interval
+        self.delay = interval
+        self.update_requested = asyncio.Event()
+        self.wakeups = 0
+        self.events_processed = 0
+
+    def request_update(self):
+        """Has to be called from the thread of the event loop"""
+        self.update_requested.set()
+
+    async def wait(self):
+        """Waits for the current delay or until update is requested"""
+        try:
+            await asyncio.wait_for(self.update_requested.wait(), self.delay)
+        except asyncio.TimeoutError:
+            pass
+        self.update_requested.clear()
+        self.wakeups += 1
+
+    def process_pending(self):
+        """Processes all pending Tk events and idle tasks without blocking, same as Tk.update(),
+        and adjusts delay of the next wait()
+
+        :return: number of processed events
+        """
+        count = 0
+        while self.root.tk.dooneevent(_tkinter.ALL_EVENTS | _tkinter.DONT_WAIT):
+            count += 1
+        self.events_processed += count
+        if count:
+            self.delay = self.interval
+        else:
+            self.delay = min(self.delay * 2, self.idle_interval)
+        return count
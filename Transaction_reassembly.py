@@ -0,0 +1,306 @@
+import collections
+
+import numpy as np
+
+import Instrumentation
+import Packet_decoder
+
+
+class Transaction:
+    """Packets of one transaction, stored in a list indexed by packet number.
+    Minimal times are updated as packets arrive, and datapoints of every packet are copied into an array preallocated
+    for the whole transaction, at the offset given by packet number. So getters of finalized transaction cost O(1).
+    If packets of the transaction differ in length, datapoints are joined when the last packet arrives instead."""
+    __slots__ = ('size', 'time_unwrapper', 'packets', 'number_of_packets', 'transaction_number', 'finalized',
+                 'time_first_delivered', 'min_time_delivered', 'min_time_created', 'joined_data',
+                 'datapoints_per_packet')
+
+    def __init__(self, size, time_unwrapper: Packet_decoder.TimeOfDayUnwrapper = None):
+        """
+
+        :param size: number of packets in transaction
+        :param time_unwrapper: shared between transactions of one device to handle midnight, optional
+        """
+        self.size = size
+        self.time_unwrapper = time_unwrapper
+        self.packets: [Packet_decoder.Packet] = [None] * size
+        self.number_of_packets = 0
+        self.transaction_number = -1
+        self.finalized = False
+        self.time_first_delivered = None
+        self.min_time_delivered = float('inf')
+        self.min_time_created = float('inf')
+        self.joined_data = None
+        self.datapoints_per_packet = None  # set by the first packet, -1 if packets differ in length
+
+    def add_packet(self, data: bytearray, time_delivered):
+        return self.add_decoded_packet(Packet_decoder.Packet(data=data, time_delivered=time_delivered))
+
+    def add_decoded_packet(self, packet: Packet_decoder.Packet):
+        """
+
+        :return: -1 if packet was rejected, 0 if transaction got finalized, 1 if more packets are expected
+        """
+        if self.finalized:
+            # print("Error, this transaction is already finalized")
+            return -1
+
+        if packet.packet_number >= self.size:
+            # print("Error, packet number is out of range")
+            if Instrumentation.enabled:
+                Instrumentation.count('Packets out of range')
+            return -1
+
+        if self.time_unwrapper is not None:
+            packet.time_created = self.time_unwrapper.unwrap(packet.time_created)
+
+        if self.transaction_number == -1:
+            # print("First packet of new transaction received")
+            self.transaction_number = packet.transaction_number
+            self.time_first_delivered = packet.time_delivered
+
+        if self.transaction_number == packet.transaction_number:
+            # print("Adding new packet")
+            if self.packets[packet.packet_number] is None:
+                self.packets[packet.packet_number] = packet
+                self.number_of_packets += 1
+                if packet.time_delivered < self.min_time_delivered:
+                    self.min_time_delivered = packet.time_delivered
+                if packet.time_created < self.min_time_created:
+                    self.min_time_created = packet.time_created
+                self._fill_datapoints(packet)
+            else:
+                # print("Error, this packet was already received")
+                if Instrumentation.enabled:
+                    Instrumentation.count('Packets already received')
+                return -1
+        else:
+            # print("Error, count is different, this should never happen")
+            if Instrumentation.enabled:
+                Instrumentation.count('Packets of another transaction')
+            return -1
+
+        if self.number_of_packets == self.size:
+            # print("Transaction finished successfully")
+            self.finalized = True
+            if self.datapoints_per_packet == -1:
+                self.joined_data = np.concatenate([packet.get_datapoints() for packet in self.packets])
+            return 0
+        else:
+            return 1
+
+    def _fill_datapoints(self, packet: Packet_decoder.Packet):
+        datapoints = packet.get_datapoints()
+        if self.datapoints_per_packet is None:
+            self.datapoints_per_packet = len(datapoints)
+            self.joined_data = np.empty(self.size * len(datapoints), dtype=datapoints.dtype)
+        elif self.datapoints_per_packet != len(datapoints):  # also when it is already -1
+            self.datapoints_per_packet = -1  # joined when finalized
+            return
+        start = packet.packet_number * self.datapoints_per_packet
+        self.joined_data[start:start + self.datapoints_per_packet] = datapoints
+
+    def get_joined_data(self):
+        if self.finalized:
+            return self.joined_data
+        else:
+            # print("Error, not finalized yet")
+            return -1
+
+    def get_missing_packet_numbers(self):
+        return [i for i, packet in enumerate(self.packets) if packet is None]
+
+    def get_times_of_delivery(self):  # for debugging
+        # should be in ascending order, but no checks are done
+        if self.finalized:
+            return {i: packet.time_delivered for i, packet in enumerate(self.packets)}
+        else:
+            # print("Error, not finalized yet")
+            return -1
+
+    def get_min_time_of_transaction_delivery(self):
+        if self.finalized:
+            return self.min_time_delivered
+        else:
+            return -1
+
+    def get_times_of_packet_creation(self):  # for debugging
+        # should be in ascending order, but no checks are done
+        if self.finalized:
+            return {i: packet.time_created for i, packet in enumerate(self.packets)}
+        else:
+            # print("Error, not finalized yet")
+            return -1
+
+    def get_min_time_of_transaction_creation(self):
+        if self.finalized:
+            return self.min_time_created
+        else:
+            return
+
+
+class DecodedTransaction:
+    """Finalized transaction which is already reduced to its times and joined datapoints,
+    e.g. read from Ingestion_process.SharedRingBuffer. Has the same getters as finalized Transaction."""
+    __slots__ = ('transaction_number', 'min_time_created', 'min_time_delivered', 'joined_data')
+    finalized = True
+
+    def __init__(self, transaction_number, min_time_created, min_time_delivered, joined_data):
+        self.transaction_number = transaction_number
+        self.min_time_created = min_time_created
+        self.min_time_delivered = min_time_delivered
+        self.joined_data = joined_data
+
+    def get_joined_data(self):
+        return self.joined_data
+
+    def get_min_time_of_transaction_delivery(self):
+        return self.min_time_delivered
+
+    def get_min_time_of_transaction_creation(self):
+        return self.min_time_created
+
+
+class ReassemblyBuffer:
+    """Reassembles transactions of one device from packets which may arrive out of order or interleaved
+    with packets of neighbouring transactions.
+
+    Several transactions are kept open at the same time, keyed by transaction number. Completed transactions are
+    released in the order their first packets arrived, so time of creation keeps incrementing. An open transaction
+    is evicted as lost when it is older than `timeout`, or when more than `max_open` transactions are open."""
+
+    def __init__(self, size, max_open=4, timeout=2.0, time_unwrapper: Packet_decoder.TimeOfDayUnwrapper = None):
+        """
+
+        :param size: number of packets in transaction
+        :param max_open: maximum number of transactions which are reassembled at the same time
+        :param timeout: seconds after delivery of the first packet, after which incomplete transaction is lost
+        :param time_unwrapper: shared between transactions of one device to handle midnight, optional
+        """
+        self.size = size
+        self.max_open = max_open
+        self.timeout = timeout
+        self.time_unwrapper = time_unwrapper
+        self.transactions = collections.OrderedDict()  # transaction number -> Transaction, oldest first
+        # recently released transaction numbers, late duplicates of their packets are dropped
+        self.released_numbers = collections.deque(maxlen=max_open * 2)
+        self.lost_numbers = collections.deque(maxlen=max_open * 2)  # subset of released_numbers
+        self.statistics = {'Packets': 0,
+                           'Duplicate packets': 0,  # packet of a transaction was already received
+                           'Late packets': 0,  # packet of a transaction which was already evicted as lost
+                           'Invalid packets': 0,  # packet number is out of range, data is likely corrupt
+                           'Completed transactions': 0,
+                           'Lost transactions': 0,
+                           'Lost packets': 0,
+                           }
+
+    def add_packet(self, data: bytearray, time_delivered):
+        """Decodes notification and adds it to its transaction
+
+        :return: (completed, lost) lists of Transaction, both are in order of arrival
+        """
+        if len(data) < Packet_decoder.Packet.metadata_length_total_bytes:
+            self._count_too_short(1)
+            return [], []
+        return self.add_decoded_packets([Packet_decoder.Packet(data=data, time_delivered=time_delivered)])
+
+    def add_packets(self, datas, times_delivered):
+        """Decodes several notifications in one call, see Packet_decoder.decode_packets().
+        Notifications shorter than metadata are skipped and counted, the rest of them is still added.
+
+        :return: (completed, lost) lists of Transaction, both are in order of arrival
+        """
+        try:
+            packets = Packet_decoder.decode_packets(datas, times_delivered)
+        except ValueError:  # some notification is shorter than metadata, checked only when decoding fails
+            minimum = Packet_decoder.Packet.metadata_length_total_bytes
+            valid = [(data, time_delivered) for data, time_delivered in zip(datas, times_delivered)
+                     if len(data) >= minimum]
+            self._count_too_short(len(datas) - len(valid))
+            packets = Packet_decoder.decode_packets([data for data, _ in valid], [time for _, time in valid])
+        return self.add_decoded_packets(packets)
+
+    def _count_too_short(self, count):
+        self.statistics['Packets'] += count
+        self.statistics['Invalid packets'] += count
+        if Instrumentation.enabled:
+            Instrumentation.count('Packets too short', count)
+
+    def add_decoded_packets(self, packets):
+        completed = []
+        lost = []
+        if Instrumentation.enabled:
+            Instrumentation.count('Packets decoded', len(packets))
+        for packet in packets:
+            self.statistics['Packets'] += 1
+            if packet.packet_number >= self.size:
+                # does not open a transaction, so it can not evict valid ones
+                self.statistics['Invalid packets'] += 1
+                if Instrumentation.enabled:
+                    Instrumentation.count('Packets out of range')
+                continue
+            transaction = self.transactions.get(packet.transaction_number)
+            if transaction is None:
+                if packet.transaction_number in self.lost_numbers:
+                    self.statistics['Late packets'] += 1
+                    continue
+                if packet.transaction_number in self.released_numbers:
+                    self.statistics['Duplicate packets'] += 1
+                    continue
+                self._expire(packet.time_delivered, lost)
+                while len(self.transactions) >= self.max_open:
+                    self._evict_oldest(lost)
+                transaction = Transaction(self.size, self.time_unwrapper)
+                self.transactions[packet.transaction_number] = transaction
+
+            if transaction.add_decoded_packet(packet) == -1:
+                self.statistics['Duplicate packets'] += 1
+            self._release_completed(completed)
+        if packets:
+            self._expire(packets[-1].time_delivered, lost)
+            self._release_completed(completed)
+        if Instrumentation.enabled:
+            Instrumentation.count('Transactions completed', len(completed))
+            Instrumentation.count('Transactions lost', len(lost))
+        return completed, lost
+
+    def flush(self, now):
+        """Evicts transactions which are older than timeout, should be called when packets stop arriving
+
+        :param now: current time, in the same clock as time of delivery
+        :return: (completed, lost) lists of Transaction
+        """
+        completed = []
+        lost = []
+        self._expire(now, lost)
+        self._release_completed(completed)
+        return completed, lost
+
+    def _release_completed(self, completed):
+        while self.transactions:
+            transaction_number, transaction = next(iter(self.transactions.items()))
+            if not transaction.finalized:
+                break
+            del self.transactions[transaction_number]
+            self.released_numbers.append(transaction_number)
+            self.statistics['Completed transactions'] += 1
+            completed.append(transaction)
+
+    def _expire(self, now, lost):
+        while self.transactions:
+            transaction = next(iter(self.transactions.values()))
+            if transaction.finalized or now - transaction.time_first_delivered <= self.timeout:
+                break
+            self._evict_oldest(lost)
+
+    def _evict_oldest(self, lost):
+        transaction_number, transaction = self.transactions.popitem(last=False)
+        if transaction.finalized:
+            self.released_numbers.append(transaction_number)
+            self.statistics['Completed transactions'] += 1
+            return  # should not happen, completed transactions are released before
+        self.released_numbers.append(transaction_number)
+        self.lost_numbers.append(transaction_number)
+        self.statistics['Lost transactions'] += 1
+        self.statistics['Lost packets'] += len(transaction.get_missing_packet_numbers())
+        lost.append(transaction)
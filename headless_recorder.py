@@ -0,0 +1,172 @@
+"""Records a device straight to a session log, without Tk, matplotlib or pandas, for unattended runs.
+
+Example:
+> $ python headless_recorder.py --address FE:B7:22:CC:BA:8D --duration 28800
+
+Several devices are recorded at the same time if --address is repeated.
+
+Session logs can be converted to JSON or CSV later with Session_log.py, or read with Session_log.SessionReader.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import signal
+import sys
+import time
+
+import BLE_connector_Bleak
+import Capture
+import Dummy_connector
+import Instrumentation
+import Notification_queue
+import Profiler
+import Session_log
+import Session_recorder
+
+address_default = 'FE:B7:22:CC:BA:8D'  # same as in release1.py
+uuids_default = ['340a1b80-cf4b-11e1-ac36-0002a5d5c51b', ]  # same as in release1.py
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Records notifications of a device to a session log, without UI")
+    parser.add_argument('--address', action='append', dest='addresses',
+                        help="address of the device, may be repeated (default: %s)" % address_default)
+    parser.add_argument('--uuid', action='append', dest='uuids',
+                        help="characteristic to subscribe to, may be repeated (default: %s)" % uuids_default[0])
+    parser.add_argument('--output', default='recordings', help="directory for session logs")
+    parser.add_argument('--autosave', type=float, default=1.0,
+                        help="seconds between writes to disk, data received during the last interval is lost on crash")
+    parser.add_argument('--duration', type=float, default=None, help="seconds to record, forever if not given")
+    parser.add_argument('--simulate', type=int, default=0,
+                        help="record this many simulated devices instead of Bluetooth ones, for stress tests")
+    parser.add_argument('--simulate-rate', type=float, default=5.0,
+                        help="transactions per second of every simulated device")
+    parser.add_argument('--capture', action='store_true',
+                        help="also write raw notifications of every device to the output directory")
+    parser.add_argument('--replay', action='append', dest='replays', default=[],
+                        help="capture file to replay instead of a Bluetooth device, may be repeated")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="1 for real time, N for N times faster, 0 for as fast as possible")
+    parser.add_argument('--stats', action='store_true',
+                        help="collect counters and duration histograms, they are printed after every autosave")
+    parser.add_argument('--profile', action='store_true',
+                        help="profile the whole recording, profiler can also be toggled with `kill -USR1 <pid>`")
+    parser.add_argument('--profile-cprofile', action='store_true', help="run cProfile together with the profiler")
+    parser.add_argument('--queue-size', type=int, default=65536,
+                        help="notifications waiting for processing, newer ones are dropped and counted when it is full")
+    parser.add_argument('--packets-per-transaction', type=int, default=9)
+    parser.add_argument('--max-open-transactions', type=int, default=4)
+    parser.add_argument('--reassembly-timeout', type=float, default=2.0)
+    arguments = parser.parse_args(argv)
+    if arguments.simulate:
+        arguments.addresses = ["SIMULATED-{}".format(i) for i in range(arguments.simulate)]
+    elif arguments.replays:
+        arguments.addresses = arguments.replays
+    elif not arguments.addresses:
+        arguments.addresses = [address_default]
+    if not arguments.uuids:
+        arguments.uuids = uuids_default
+    return arguments
+
+
+async def record(arguments):
+    loop = asyncio.get_running_loop()
+    stores = {}
+    # one recorder per device, because every device has its own clock
+    recorders = {address: Session_recorder.SessionRecorder(packets_per_transaction=arguments.packets_per_transaction,
+                                                           max_open_transactions=arguments.max_open_transactions,
+                                                           reassembly_timeout=arguments.reassembly_timeout,
+                                                           stores=stores,
+                                                           device=address if len(arguments.addresses) > 1 else None)
+                 for address in arguments.addresses}
+    writer = Session_log.SessionWriter(os.path.join(
+        arguments.output, datetime.datetime.now().strftime('experiment_%Y-%m-%d_%H-%M-%S.rkplog')))
+    print('Recording to:', writer.path)
+
+    def process(key, datas, times_delivered):
+        address, sender = key
+        recorders[address].add_packets(sender, datas, times_delivered)
+
+    # callbacks only queue notifications, they are decoded and stored in batches by notification_queue.run()
+    notification_queue = Notification_queue.NotificationQueue(process, max_size=arguments.queue_size)
+    consumer_task = loop.create_task(notification_queue.run())
+
+    def on_new_data(address, sender, data: bytearray):
+        try:
+            time_delivered = datetime.datetime.utcnow().timestamp()
+            if Instrumentation.enabled:
+                Instrumentation.count('Notifications received')
+                time_start = time.perf_counter()
+            notification_queue.put((address, getattr(sender, 'handle', sender)), data, time_delivered)
+            if Instrumentation.enabled:
+                Instrumentation.observe('Callback', time.perf_counter() - time_start)
+        except Exception as e:
+            print(e)
+
+    Instrumentation.enable(arguments.stats)
+    profiler = Profiler.Profiler(os.path.join(arguments.output, 'profiles'), use_cprofile=arguments.profile_cprofile)
+    try:
+        loop.add_signal_handler(signal.SIGUSR1, profiler.toggle)
+    except (AttributeError, NotImplementedError):
+        pass  # no SIGUSR1 on Windows
+    if arguments.profile:
+        profiler.start()
+
+    capture_directory = arguments.output if arguments.capture else None
+    if arguments.simulate:
+        manager = BLE_connector_Bleak.BLE_connection_manager(max_devices=len(arguments.addresses),
+                                                             connector_class=Dummy_connector.Simulated_connector,
+                                                             capture_directory=capture_directory,
+                                                             packets_per_transaction=arguments.packets_per_transaction,
+                                                             transaction_rate=arguments.simulate_rate)
+    elif arguments.replays:
+        # address of a replayed device is the path of its capture file
+        manager = BLE_connector_Bleak.BLE_connection_manager(
+            max_devices=len(arguments.addresses),
+            connector_class=lambda path: Capture.Replay_connector(path, path, speed=arguments.replay_speed or None))
+    else:
+        manager = BLE_connector_Bleak.BLE_connection_manager(max_devices=len(arguments.addresses),
+                                                             capture_directory=capture_directory)
+    for address in arguments.addresses:
+        manager.connect(address, uuids=arguments.uuids, callbacks=[on_new_data] * len(arguments.uuids))
+    time_start = loop.time()
+    rows_total = 0
+    try:
+        while arguments.duration is None or loop.time() - time_start < arguments.duration:
+            await asyncio.sleep(arguments.autosave)
+            # written rows are dropped from memory, so it does not grow during long recordings
+            rows_total += writer.write_new_rows(stores, clear=True)
+            print('Transactions saved:', rows_total)
+            if Instrumentation.enabled:
+                Instrumentation.dump()
+            else:
+                for address, recorder in recorders.items():
+                    print(address, recorder.reassembly_buffer.statistics, recorder.statistics)
+                print('Queue:', notification_queue.statistics)
+            if arguments.replays and all(task.done() for task in manager.tasks.values()) \
+                    and not notification_queue:
+                break  # all captures are replayed
+    finally:
+        await manager.disconnect_all()
+        consumer_task.cancel()
+        notification_queue.drain()
+        rows_total += writer.write_new_rows(stores, clear=True)
+        writer.close()
+        print('Recording finished:', writer.path, 'transactions saved:', rows_total)
+        try:  # recording is already saved, a profile which can not be written does not affect it
+            profiler.stop()
+        except Exception as e:
+            print(e)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    try:
+        asyncio.run(record(arguments))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,23 +1,32 @@
 import asyncio
 import datetime
-import json
-import math
+import os
+import signal
 import struct
+import time
 
 import matplotlib
-import pandas as pd
+import matplotlib.backend_bases
+import matplotlib.figure
 
 # import bitstring  # TODO use in the future for easier manipulation of bits
 
 matplotlib.use('TkAgg')  # Makes sure that all windows are rendered using tkinter
+import matplotlib.backends.backend_tkagg
 
 import BLE_connector_Bleak
+import Dummy_connector
 # import BLE_connector_BleuIO
-
-# hotfix to run nested asyncio to correctly close Bleak without having to wait for timeout to reconnect to device again
-import nest_asyncio
-
-nest_asyncio.apply()
+import Ingestion_process
+import Instrumentation
+import Live_plot
+import Notification_queue
+import Profiler
+import Session_log
+import Scan_registry
+import Scan_scheduler
+import Session_recorder
+import Tk_bridge
 
 import tkinter as tk
 from tkinter import filedialog
@@ -27,6 +36,35 @@ from tkinter import ttk
 address_default = 'FE:B7:22:CC:BA:8D'
 uuids_default = ['340a1b80-cf4b-11e1-ac36-0002a5d5c51b', ]
 write_uuid = '330a1b80-cf4b-11e1-ac36-0002a5d5c51b'
+packets_per_transaction = 9
+max_devices = 8  # devices recorded at the same time
+scan_list_length = 20  # devices with the strongest signal shown in the device combobox
+# scanning competes with connected devices for radio time, so it is paused while they are streaming
+scan_burst = 10.0  # seconds of scanning after device list is opened
+background_scan_duty_cycle = 0.0  # fraction of time scanning in background while streaming, e.g. 0.1
+background_scan_period = 60.0  # seconds, length of one background scanning cycle
+max_open_transactions = 4  # transactions reassembled at the same time, packets of neighbours may interleave
+reassembly_timeout = 2.0  # seconds, incomplete transaction is reported as lost after that
+recordings_directory = 'recordings'  # session logs are written there while experiment is running
+autosave_interval = 1.0  # seconds, data received during the last interval is lost if app crashes
+ui_idle_interval = 0.1  # seconds, UI is updated at least that often, even when nothing changes
+plot_interval = 0.25  # seconds between redraws of plots while data is arriving
+# receive and decode notifications in a separate process, so UI can not delay them
+ingestion_in_separate_process = False
+ingestion_poll_interval = 0.05  # seconds between reads of decoded transactions from the ingestion process
+# notifications waiting for decoding, a burst longer than that is dropped (and counted) instead of stalling BLE stack
+notification_queue_size = 65536
+# stress test without hardware: number of Dummy_connector.Simulated_connector devices connected at start, 0 to disable
+simulated_devices = 0
+simulated_transaction_rate = 5.0  # transactions per second of every simulated device
+# raw notifications are written to recordings_directory too, they can be replayed with Capture.py
+capture_notifications = False
+# counters and duration histograms of the hot path, shown in the Info panel, can be switched on in the UI too
+instrumentation_enabled = False
+stats_interval = 1.0  # seconds between updates of the Info panel
+# profiler is switched on and off in the Info panel, or with `kill -USR1 <pid>` where signals are supported
+profiles_directory = 'profiles'
+profile_with_cprofile = False  # cProfile gives exact call counts, but slows everything down several times
 
 
 class App(tk.Tk):
@@ -42,30 +80,25 @@ class App(tk.Tk):
         self.loop = loop
 
         def on_button_close():
-            try:
-                print('Exiting...')
-                self.loop.run_until_complete(self.stop_scanning_handle())
-                self.loop.run_until_complete(self.BLE_connector_instance.disconnect())
-                for task in self.tasks:
-                    task.cancel()
-                self.loop.stop()
-                self.destroy()
-                print('Exiting finished!')
-            except Exception as e:
-                print(e)
-                tk.messagebox.showerror('Error', e.__str__())
+            if self.close_task is None:  # window may be closed several times while devices are disconnecting
+                self.close_task = self.run_device_task(self.close())
+
+        self.close_task = None
+        self.device_tasks = set()  # connect, disconnect and switch run as tasks, so UI is never blocked by them
+
+        self.tk_event_pump = Tk_bridge.TkEventPump(self)
 
         self.protocol("WM_DELETE_WINDOW", on_button_close)
         self.wm_title("SwiftLogger")
         self.iconbitmap('ico/favicon.ico')
 
-        self.geometry("400x115")
+        self.geometry("1200x600")
 
-        # frameGraph = tk.Frame(master=self,
-        #                      highlightbackground="black",
-        #                      highlightthickness=1
-        #                      )  # div
-        # self.plots_init(master=frameGraph)
+        frameGraph = tk.Frame(master=self,
+                              highlightbackground="black",
+                              highlightthickness=1
+                              )  # div
+        self.plots_init(master=frameGraph)
 
         frameControls = tk.Frame(master=self,
                                  highlightbackground="black",
@@ -77,9 +110,12 @@ class App(tk.Tk):
         # is no space left, because the window is too small, they are not displayed.
         # The canvas is rather flexible in its size, so we pack it last which makes
         # sure the UI controls are displayed as long as possible.
-        frameControls.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        # frameGraph.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
+        frameControls.pack(side=tk.LEFT, fill=tk.BOTH, expand=False)
+        frameGraph.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
+        # callbacks only queue notifications, they are decoded and stored in batches by its consumer task
+        self.notification_queue = Notification_queue.NotificationQueue(self.process_notifications,
+                                                                       max_size=notification_queue_size)
         self.init_dataframe()
 
         # TODO https://www.delftstack.com/howto/python-pandas/pandas-dataframe-to-json/
@@ -90,76 +126,61 @@ class App(tk.Tk):
         # self.tasks.append(
         #    loop.create_task(self.get_data_loop_bleuio(interval=0))
         # )
+        self.tasks.append(
+            loop.create_task(self.notification_queue.run())
+        )
         self.tasks.append(
             loop.create_task(self.register_data_callback_bleak())
         )
-        # self.tasks.append(
-        #    loop.create_task(self.update_plot_loop(interval=1.0))
-        # )  # matplotlib is slow with large amounts of data, so update every second
         self.tasks.append(
-            loop.create_task(self.update_ui_loop(interval=1 / 60))
+            loop.create_task(self.update_plot_loop(interval=plot_interval))
+        )  # cost of a redraw depends on the width of the plot, not on amount of data
+        self.tasks.append(
+            loop.create_task(self.update_ui_loop(interval=1 / 60, idle_interval=ui_idle_interval))
         )
 
         self.tasks.append(
             loop.create_task(self.start_scanning_process())
         )
 
-    # def plots_init(self, master):
-    #    """Initializes plots
-    #
-    #    :param master: reference to parent object
-    #    """
-    #    plt.rcParams['axes.grid'] = True  # enables all grid lines globally
-    #
-    #    self.fig = plt.figure(figsize=(5, 4), dpi=100)
-    #
-    #    self.subplots = {}
-    #
-    #    self.subplots[1] = self.fig.add_subplot(2, 2, 1)
-    #    self.subplots[2] = self.fig.add_subplot(2, 2, 2)
-    #    self.subplots[3] = self.fig.add_subplot(2, 2, 3, projection='3d')
-    #    # self.subplots[4] = fig.add_subplot(2, 2, 4)
-    #
-    #    self.subplots[1].set_xlabel("N, samples")
-    #    self.subplots[1].set_ylabel("f(N)")
-    #    self.subplots[2].set_xlabel("N, samples")
-    #    self.subplots[2].set_ylabel("Jitter(s)")
-    #    self.subplots[3].set_xlabel("Z")
-    #    self.subplots[3].set_ylabel("Y")
-    #    self.subplots[3].set_zlabel("X")
-    #
-    #    self.lines = {}
-    #
-    #    self.lines[0] = self.subplots[1].plot([], [])[0]
-    #    self.lines[1] = self.subplots[1].plot([], [])[0]
-    #    self.lines[2] = self.subplots[1].plot([], [])[0]
-    #    self.lines[3] = self.subplots[2].plot([], [])[0]
-    #    self.lines[4] = self.subplots[3].scatter3D([], [], [], cmap='Greens')
-    #
-    #    self.canvas = matplotlib.backends.backend_tkagg.FigureCanvasTkAgg(self.fig,
-    #                                                                      master=master
-    #                                                                      )  # A tk.DrawingArea.
-    #
-    #    # pack_toolbar=False will make it easier to use a layout manager later on.
-    #    self.toolbar = matplotlib.backends.backend_tkagg.NavigationToolbar2Tk(canvas=self.canvas,
-    #                                                                          window=master,
-    #                                                                          pack_toolbar=False
-    #                                                                          )
-    #
-    #    self.canvas.mpl_connect("key_press_event",
-    #                            lambda event: print(f"you pressed {event.key}")
-    #                            )
-    #
-    #    self.canvas.mpl_connect("key_press_event",
-    #                            matplotlib.backend_bases.key_press_handler
-    #                            )
-    #
-    #    self.bind("<Configure>", self.apply_tight_layout, )  # resize plots when window size changes
-    #
-    #    self.received_new_data = False
-    #
-    #    self.toolbar.pack(side=tk.BOTTOM, fill=tk.BOTH)
-    #    self.canvas.get_tk_widget().pack(side=tk.BOTTOM, fill=tk.BOTH, expand=1)
+        self.tasks.append(
+            loop.create_task(self.autosave_loop(interval=autosave_interval))
+        )
+
+        self.tasks.append(
+            loop.create_task(self.stats_loop(interval=stats_interval))
+        )
+
+    def plots_init(self, master):
+        """Initializes plots
+
+        :param master: reference to parent object
+        """
+        matplotlib.rcParams['axes.grid'] = True  # enables all grid lines globally
+
+        self.fig = matplotlib.figure.Figure(figsize=(5, 4), dpi=100)
+
+        self.canvas = matplotlib.backends.backend_tkagg.FigureCanvasTkAgg(self.fig,
+                                                                          master=master
+                                                                          )  # A tk.DrawingArea.
+        self.live_plot = Live_plot.LivePlot(self.fig, self.canvas)
+
+        # pack_toolbar=False will make it easier to use a layout manager later on.
+        self.toolbar = matplotlib.backends.backend_tkagg.NavigationToolbar2Tk(canvas=self.canvas,
+                                                                              window=master,
+                                                                              pack_toolbar=False
+                                                                              )
+
+        self.canvas.mpl_connect("key_press_event",
+                                matplotlib.backend_bases.key_press_handler
+                                )
+
+        self.bind("<Configure>", self.apply_tight_layout, )  # resize plots when window size changes
+
+        self.received_new_data = False
+
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.BOTH)
+        self.canvas.get_tk_widget().pack(side=tk.BOTTOM, fill=tk.BOTH, expand=1)
 
     def controls_init(self, master):
         """Initializes controls
@@ -208,16 +229,21 @@ class App(tk.Tk):
 
         def on_button_save():
             try:
-                print('Saving to .json ...')
+                if self.export_task is not None and not self.export_task.done():
+                    tk.messagebox.showerror('Error', 'Previous export is not finished yet')
+                    return
+                print('Saving to file ...')
                 # self.dfs.dump()
 
                 mask = [('Json File', '*.json'),
+                        ('CSV File', '*.csv'),
                         ('All Files', '*.*'),
                         ]
 
-                save_temp = {}
-                for key in self.dfs.keys():
-                    save_temp[key] = self.dfs[key].to_dict(orient='index')
+                # everything received so far goes to the session log, which is then converted in background,
+                # the size of the log at this moment is a consistent snapshot, data received later is not exported
+                self.session_writer.write_new_rows(self.stores)
+                limit = self.session_writer.file.tell()
 
                 # with open(name, 'x') as f:  # 'x' to create file if it doesn't exist, never overwrites
 
@@ -225,17 +251,23 @@ class App(tk.Tk):
                 extension_name = tk.StringVar()
                 f = tk.filedialog.asksaveasfile(filetypes=mask, initialfile=name, defaultextension=".json", mode='x',
                                                 typevariable=extension_name)
+                if f is None:
+                    print('Saving cancelled')
+                    return
                 print(extension_name.get())
                 if extension_name.get() == 'Json File':
-                    json.dump(save_temp, f, indent=4)
+                    convert = Session_log.convert_to_json
+                elif extension_name.get() == 'CSV File':
+                    convert = Session_log.convert_to_csv
                 elif extension_name.get() == 'All Files':
-                    json.dump(save_temp, f, indent=4)
+                    convert = Session_log.convert_to_json
                 else:
                     print('Unknown file extension')
                     tk.messagebox.showerror('Error', 'Unknown file extension')
-                f.close()
+                    f.close()
+                    return
 
-                print('Saving finished!')
+                self.export_task = self.loop.create_task(self.export_session(convert, f, limit))
             except Exception as e:
                 print(e)
                 tk.messagebox.showerror('Error', e.__str__())
@@ -244,6 +276,11 @@ class App(tk.Tk):
         #          text="Load from *.json",
         #          command=on_button_load_json
         #          ).pack(side=tk.BOTTOM, fill=tk.X)
+        self.export_task = None
+        self.current_values['Export'] = tk.StringVar()
+        tk.Label(master=frameControlsInputOutput,
+                 textvariable=self.current_values['Export'],
+                 ).pack(side=tk.BOTTOM, fill=tk.X)
         tk.Button(master=frameControlsInputOutput,
                   text="Save to file",
                   command=on_button_save
@@ -258,11 +295,12 @@ class App(tk.Tk):
         def refresh_BLE_devices():
             try:
                 # print('Click1')
+                self.scan_scheduler.request_burst()  # refreshes RSSI of devices around
 
                 devices_list = []
-                for device in self.dict_of_devices_global.values():  # dictionary of devices is updated asynchronously
-                    devices_list.append(str(device.address) + "/" + str(device.name) + "/" + str(device.rssi))
-                devices_list.sort(key=lambda x: -float(x.split("/")[-1]))  # sort by rssi (last element)
+                # registry is updated asynchronously and is already sorted by rssi
+                for device, rssi in self.scan_registry.top(scan_list_length):
+                    devices_list.append(str(device.address) + "/" + str(device.name) + "/" + str(rssi))
                 self.device_cbox['values'] = devices_list
             except Exception as e:
                 print(e)
@@ -273,11 +311,32 @@ class App(tk.Tk):
 
             conected_device_address = self.device_cbox_value.get().split("/")[0]
             print("Connecting to address:", conected_device_address)
-            self.loop.run_until_complete(self.BLE_connector_instance.disconnect())
-            # replace address inside old instance
-            # either use address or BLEDevice instance as parameter
+            if ingestion_in_separate_process:
+                self.ingestion_process.connect(conected_device_address)
+                return
+            # other devices stay connected, selected one is added to them
             # self.BLE_connector_instance.__init__(self.dict_of_devices_global[conected_device_address])
-            self.BLE_connector_instance.__init__(conected_device_address)
+            try:
+                self.BLE_connection_manager.connect(conected_device_address, uuids=uuids_default,
+                                                    callbacks=[self.on_new_data_callback1])
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
+            show_connected_devices()
+
+        def show_connected_devices():
+            self.current_values['Devices'].set("Connected: {}".format(len(self.BLE_connection_manager)))
+            self.tk_event_pump.request_update()
+
+        def on_button_disconnect():
+            try:
+                disconnected_device_address = self.device_cbox_value.get().split("/")[0]
+                print("Disconnecting address:", disconnected_device_address)
+                task = self.run_device_task(self.BLE_connection_manager.disconnect(disconnected_device_address))
+                task.add_done_callback(lambda task: show_connected_devices())
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
 
         self.device_cbox_value = tk.StringVar()
         self.device_cbox = tk.ttk.Combobox(master=frameControlsConnection,
@@ -288,6 +347,14 @@ class App(tk.Tk):
         self.device_cbox.bind('<<ComboboxSelected>>', apply_selected_BLE_device)
 
         self.device_cbox.pack(side=tk.TOP, fill=tk.X)
+        tk.Button(master=frameControlsConnection,
+                  text="Disconnect selected device",
+                  command=on_button_disconnect
+                  ).pack(side=tk.TOP, fill=tk.X)
+        self.current_values['Devices'] = tk.StringVar(value="Connected: 0")
+        tk.Label(master=frameControlsConnection,
+                 textvariable=self.current_values['Devices'],
+                 ).pack(side=tk.TOP, fill=tk.X)
 
         # frameControlsFeedback = tk.Frame(master=master,
         #                                 highlightbackground="black",
@@ -377,29 +444,30 @@ class App(tk.Tk):
         #    command=on_button_apply
         # ).pack(side=tk.BOTTOM, fill=tk.X)
         #
-        # frameControlsPlotSettings = tk.Frame(master=master,
-        #                                     highlightbackground="black",
-        #                                     highlightthickness=1,
-        #                                     )  # div
-        # tk.Label(master=frameControlsPlotSettings, text="Plot settings", font=font).pack(side=tk.TOP)
-        #
-        # self.button_autoresize_X_var = tk.IntVar(value=1)
-        # tk.Checkbutton(master=frameControlsPlotSettings,
-        #               text="Maximize X",
-        #               variable=self.button_autoresize_X_var
-        #               ).pack(side=tk.TOP, fill=tk.X)
-        #
-        # self.button_autoresize_Y_var = tk.IntVar(value=1)
-        # tk.Checkbutton(master=frameControlsPlotSettings,
-        #               text="Maximize Y",
-        #               variable=self.button_autoresize_Y_var
-        #               ).pack(side=tk.TOP, fill=tk.X)
-        #
-        # self.button_pause_plotting_var = tk.IntVar(value=0)
-        # tk.Checkbutton(master=frameControlsPlotSettings,
-        #               text="Pause plotting",
-        #               variable=self.button_pause_plotting_var
-        #               ).pack(side=tk.TOP, fill=tk.X)
+        frameControlsPlotSettings = tk.Frame(master=master,
+                                             highlightbackground="black",
+                                             highlightthickness=1,
+                                             )  # div
+        tk.Label(master=frameControlsPlotSettings, text="Plot settings", font=font).pack(side=tk.TOP)
+
+        self.button_autoresize_X_var = tk.IntVar(value=1)
+        tk.Checkbutton(master=frameControlsPlotSettings,
+                       text="Maximize X",
+                       variable=self.button_autoresize_X_var
+                       ).pack(side=tk.TOP, fill=tk.X)
+
+        self.button_autoresize_Y_var = tk.IntVar(value=1)
+        tk.Checkbutton(master=frameControlsPlotSettings,
+                       text="Maximize Y",
+                       variable=self.button_autoresize_Y_var
+                       ).pack(side=tk.TOP, fill=tk.X)
+
+        self.button_pause_plotting_var = tk.IntVar(value=0)
+        tk.Checkbutton(master=frameControlsPlotSettings,
+                       text="Pause plotting",
+                       variable=self.button_pause_plotting_var
+                       ).pack(side=tk.TOP, fill=tk.X)
+
         #
         # frameControlsPID = tk.Frame(master=master,
         #                            highlightbackground="black",
@@ -420,12 +488,60 @@ class App(tk.Tk):
         # tk.Label(master=frameControlsFeedbackGrid, text="-127", textvariable=self.current_values['RSSI']).grid(row=0,
         #                                                                                                       column=1,
         #                                                                                                       sticky='W')
+        Instrumentation.enable(instrumentation_enabled)
+        self.button_statistics_var = tk.IntVar(value=int(instrumentation_enabled))
+
+        def on_button_statistics():
+            Instrumentation.enable(bool(self.button_statistics_var.get()))
+            if not Instrumentation.enabled:
+                self.current_values['Stats'].set("")
+
+        tk.Checkbutton(master=frameControlsInfo,
+                       text="Collect statistics",
+                       variable=self.button_statistics_var,
+                       command=on_button_statistics
+                       ).pack(side=tk.TOP, fill=tk.X)
+
+        self.profiler = Profiler.Profiler(profiles_directory, use_cprofile=profile_with_cprofile)
+        self.button_profile_var = tk.IntVar(value=0)
+
+        def on_button_profile():
+            try:
+                paths = self.profiler.toggle()
+                self.button_profile_var.set(int(self.profiler.running))
+                if paths:
+                    self.current_values['Profile'].set('Saved ' + os.path.basename(paths[0]))
+                else:
+                    self.current_values['Profile'].set('Profiling...')
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
+
+        tk.Checkbutton(master=frameControlsInfo,
+                       text="Profile",
+                       variable=self.button_profile_var,
+                       command=on_button_profile
+                       ).pack(side=tk.TOP, fill=tk.X)
+        self.current_values['Profile'] = tk.StringVar()
+        tk.Label(master=frameControlsInfo,
+                 textvariable=self.current_values['Profile'],
+                 ).pack(side=tk.TOP, fill=tk.X)
+        try:
+            self.loop.add_signal_handler(signal.SIGUSR1, on_button_profile)
+        except (AttributeError, NotImplementedError):
+            pass  # no SIGUSR1 on Windows, checkbox only
+        self.current_values['Stats'] = tk.StringVar()
+        tk.Label(master=frameControlsInfo,
+                 textvariable=self.current_values['Stats'],
+                 justify=tk.LEFT,
+                 anchor='nw',
+                 ).pack(side=tk.TOP, fill=tk.BOTH, expand=True)
 
         frameControlsInputOutput.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
         frameControlsConnection.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
         # frameControlsFeedback.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
         # frameControlsFeedbackGrid.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
-        # frameControlsPlotSettings.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
+        frameControlsPlotSettings.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
         # frameControlsPID.pack(side=tk.TOP, fill=tk.BOTH, expand=False)
         frameControlsInfo.pack(side=tk.TOP, fill=tk.BOTH,
                                expand=True)  # this element is pushing everything else from the bottom
@@ -449,31 +565,141 @@ class App(tk.Tk):
         try:
             print('Init dataframes ...')
             # self.dfs = klepto.archives.file_archive(name='output/out', dict={}, cached=True)
-            self.dfs = {}
-            self.transaction_counters = {}
+            if hasattr(self, 'session_writer'):  # finish previous session
+                self.notification_queue.drain()
+                self.session_writer.write_new_rows(self.stores)
+                self.session_writer.close()
+            self.stores = {}  # one Sample_store.SampleStore per sender of every device
+            self.recorders = {}  # address -> Session_recorder.SessionRecorder, created by get_recorder()
+            self.session_writer = Session_log.SessionWriter(os.path.join(
+                recordings_directory, datetime.datetime.now().strftime('experiment_%Y-%m-%d_%H-%M-%S.rkplog')))
             print('Init dataframes finished!')
         except Exception as e:
             print(e)
 
-    # def apply_tight_layout(self, event: tk.Event):
-    #    try:
-    #        if event.widget.widgetName == "canvas":
-    #            self.fig.tight_layout()
-    #    except Exception as e:
-    #        pass
+    def run_device_task(self, coroutine):
+        """Schedules connect, disconnect or switch of a device, errors are shown when the task finishes
+
+        :param coroutine: coroutine of BLE_connector_Bleak
+        :return: task, it can be cancelled
+        """
+
+        def on_done(task):
+            self.device_tasks.discard(task)
+            if not task.cancelled() and task.exception() is not None:
+                print(task.exception())
+                tk.messagebox.showerror('Error', task.exception().__str__())
+
+        task = self.loop.create_task(coroutine)
+        self.device_tasks.add(task)
+        task.add_done_callback(on_done)
+        return task
+
+    async def close(self):
+        try:
+            print('Exiting...')
+            await self.stop_scanning_handle()
+            await self.BLE_connection_manager.disconnect_all()
+            if ingestion_in_separate_process:
+                await self.loop.run_in_executor(None, self.ingestion_process.stop)
+            self.notification_queue.drain()
+            self.session_writer.write_new_rows(self.stores)
+            self.session_writer.close()
+            try:  # session is already saved, a profile which can not be written does not prevent exit
+                self.profiler.stop()
+            except Exception as e:
+                print(e)
+            for task in self.tasks:
+                task.cancel()
+            for task in list(self.device_tasks):
+                if task is not asyncio.current_task():
+                    task.cancel()
+            self.loop.stop()
+            self.destroy()
+            print('Exiting finished!')
+        except Exception as e:
+            print(e)
+            tk.messagebox.showerror('Error', e.__str__())
+            self.close_task = None  # lets the window be closed again after the error is reported
+
+    def get_recorder(self, address):
+        """Reassembly and time correction are kept per device, because every device has its own clock
+
+        :param address: address of the device, None if only one device is recorded
+        :return: Session_recorder.SessionRecorder writing into self.stores
+        """
+        if address not in self.recorders:
+            self.recorders[address] = Session_recorder.SessionRecorder(
+                packets_per_transaction=packets_per_transaction,
+                max_open_transactions=max_open_transactions,
+                reassembly_timeout=reassembly_timeout,
+                stores=self.stores,
+                device=address)
+        return self.recorders[address]
+
+    def apply_tight_layout(self, event: tk.Event):
+        try:
+            if event.widget.widgetName == "canvas":
+                self.fig.tight_layout()
+        except Exception as e:
+            pass
 
     async def register_data_callback_bleak(self):
         """Sets up notifications using Bleak, and attaches callbacks"""
-        self.BLE_connector_instance = BLE_connector_Bleak.BLE_connector(to_connect=False)
+        self.BLE_connector_instance = BLE_connector_Bleak.BLE_connector(to_connect=False)  # used for scanning
+        if simulated_devices:
+            self.BLE_connection_manager = BLE_connector_Bleak.BLE_connection_manager(
+                max_devices=max(max_devices, simulated_devices),
+                connector_class=Dummy_connector.Simulated_connector,
+                capture_directory=recordings_directory if capture_notifications else None,
+                packets_per_transaction=packets_per_transaction,
+                transaction_rate=simulated_transaction_rate)
+            for i in range(simulated_devices):
+                self.BLE_connection_manager.connect("SIMULATED-{}".format(i), uuids=uuids_default,
+                                                    callbacks=[self.on_new_data_callback1])
+        else:
+            self.BLE_connection_manager = BLE_connector_Bleak.BLE_connection_manager(
+                max_devices=max_devices,
+                capture_directory=recordings_directory if capture_notifications else None)
         # self.is_time_at_start_recorded = False
-        self.transaction = Transaction(9)
-        self.last_transaction_time = float('inf')
-        self.offest_time = 0
-        self.last_time_best_effort = float('-inf')
-        self.time_changed_threshold = 0
 
-        await self.BLE_connector_instance.keep_connections_to_device(uuids=uuids_default,
-                                                                     callbacks=[self.on_new_data_callback1])
+        if ingestion_in_separate_process:
+            self.ingestion_process = Ingestion_process.IngestionProcess(uuids=uuids_default,
+                                                                        size=packets_per_transaction,
+                                                                        max_open=max_open_transactions,
+                                                                        timeout=reassembly_timeout)
+            await self.read_ingestion_process_loop(interval=ingestion_poll_interval)
+            return
+
+        # devices are connected by apply_selected_BLE_device(), each one gets its own task in the manager
+
+    async def read_ingestion_process_loop(self, interval):
+        """Stores transactions decoded by the ingestion process, at regular intervals
+
+        :param interval: maximum time between 2 updates, time of execution is taken in account
+        """
+        ring = self.ingestion_process.ring
+        dropped = 0
+        waiter = StableWaiter(interval)
+        while True:
+            try:
+                await waiter.wait_async()
+                count = 0
+                for records in ring.peek():
+                    for sender, transaction in Ingestion_process.to_transactions(records):
+                        # copies datapoints out of shared memory
+                        if self.get_recorder(None).add_transaction(sender, transaction):
+                            self.received_new_data = True
+                    count += len(records)
+                if count:
+                    self.tk_event_pump.request_update()
+                ring.release(count)
+                if ring.header['dropped'] != dropped:
+                    dropped = int(ring.header['dropped'])
+                    print("Ring buffer is full, transactions dropped:", dropped)
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
 
     # rx_packets_recieved = [False] * 4
     # rx_buffer = {}
@@ -481,15 +707,20 @@ class App(tk.Tk):
     # transaction_completed = False
     # rx_variable_counter = 0
 
-    async def on_new_data_callback1(self, sender, data: bytearray):
-        """Called whenever Bluetooth API receives a notification or indication
+    def on_new_data_callback1(self, address, sender, data: bytearray):
+        """Called whenever Bluetooth API receives a notification or indication.
+        Plain function, Bleak would create a task for every notification if it was a coroutine function.
 
+        :param address: address of the device, added by BLE_connector_Bleak.BLE_connection_manager
         :param sender: handle, should be unique for each uuid
         :param data: data received, several messages might be received together if data rate is high
         """
 
         try:
             time_delivered = datetime.datetime.utcnow().timestamp()
+            if Instrumentation.enabled:
+                Instrumentation.count('Notifications received')
+                time_start = time.perf_counter()
 
             # if not self.is_time_at_start_recorded:
             #    self.time_at_start = time_delivered
@@ -503,248 +734,109 @@ class App(tk.Tk):
             # data_copy = data.copy()
 
             # data.reverse()  # fix small endian notation
-            datahex = data.hex()
-            print(datahex)  # TODO
-
-            if self.transaction.add_packet(data=data, time_delivered=time_delivered) == -1:
-                # if error, maybe it is beginning of a new transaction? Try to add packet second time
-                self.transaction = Transaction(9)
-                if self.transaction.add_packet(data=data, time_delivered=time_delivered) == -1:
-                    # print("Error of starting new transaction, datahex: ", datahex)
-                    return
-
-            data_joined = self.transaction.get_joined_data()
-            if data_joined == -1:
-                # print("Transaction is not complete")
-                return
-            print(data_joined)  # TODO
-
-            # print(self.transaction.get_times_of_packet_creation())
-            # print(min(self.transaction.get_times_of_packet_creation().values()))
-            # print(self.transaction.get_times_of_delivery())
-            # print(min(self.transaction.get_times_of_delivery().values()))
-
-            # Time can only increment. If it decremented, it likely means BlueNRG chip rebooted.
-            if self.last_transaction_time <= self.transaction.get_min_time_of_transaction_creation():
-                # print('Time incremented')
-                pass
-            else:
-                #  This self.offest_time might be stale,
-                #  set offset after receiving and discarding 1 full Transaction to flush TX buffer
-                self.time_changed_threshold += 1
-                if self.time_changed_threshold > 1:
-                    self.time_changed_threshold = 0
-
-                    self.offest_time = self.transaction.get_min_time_of_transaction_delivery() - self.transaction.get_min_time_of_transaction_creation()
-                    print('Time decremented, offset fixed', self.offest_time)
-                else:
-                    print("Likely stale data, discarding Transaction")
-                    return
-            self.last_transaction_time = self.transaction.get_min_time_of_transaction_creation()
-
-            self.time_best_effort = self.transaction.get_min_time_of_transaction_creation() + self.offest_time
-            self.jitter_best_effort = self.time_best_effort - self.last_time_best_effort
-            self.last_time_best_effort = self.time_best_effort
-
-            # float_length = 8  # (8 hex characters * 4 bit per character = 32 bits = 4 bytes)
-            # offset = 4
-
-            # self.rx_packets_recieved[int(datahex[0:2], 16)] = True  # False -> True, but True -> True would be error
-            #
-            # print(int(datahex[0:2], 16))
-            # print(self.rx_packets_recieved)
-            #
-            # packet_counter = int(datahex[2:4], 16)
-            #
-            # if self.rx_transaction_counter == packet_counter:
-            #    if self.transaction_completed:
-            #        print('Error, transaction already received', self.rx_transaction_counter, self.rx_packets_recieved)
-            #        return
-            #    else:
-            #        if self.rx_packets_recieved == [True] * 4:
-            #            print('Transaction is completed', self.rx_transaction_counter, self.rx_packets_recieved)
-            #            self.transaction_completed = True
-            #            print(self.rx_buffer)
-            #        else:
-            #            print("Transaction in progress...", self.rx_transaction_counter, self.rx_packets_recieved)
-            #            while True:
-            #                try:
-            #                    float_value = hex_to_float(datahex[offset:offset + float_length])
-            #                    offset += float_length
-            #
-            #                    self.rx_buffer[self.rx_variable_counter] = float_value
-            #                    self.rx_variable_counter += 1
-            #
-            #                    # print(N)
-            #                    # print(float_value)
-            #                except Exception as e:
-            #                    # print(e)
-            #                    # print("End of data")
-            #                    # print(N)
-            #                    break
-            #
-            #
-            # else:  # starting new transaction
-            #    self.rx_transaction_counter = packet_counter
-            #    if self.rx_packets_recieved != [True] * 4:  # if all packets are not received yet
-            #        print("Packet loss", self.rx_transaction_counter, self.rx_packets_recieved)
-            #
-            #    self.rx_packets_recieved = [False] * 4
-            #    self.rx_buffer = {}
-            #    # self.rx_transaction_counter = 0
-            #    self.transaction_completed = False
-            #
-            #    self.rx_variable_counter = 0
-            #    print("Reset rx_buffer")
-            #
-            ## print(struct.unpack('f', binascii.unhexlify(datahex[2:float_length + 2]))[0])
-
-            if sender not in self.dfs.keys():  # if data recieved from this sender very first time, create new Dataframe
-                self.dfs[sender] = pd.DataFrame(
-                    columns=["N", "Time of creation without offset", "Time of delivery", "Offset time",
-                             "Jitter best effort", "Transaction number", "Data", "Time best effort"]
-                )
-                self.dfs[sender] = self.dfs[sender].set_index("Time best effort")
-
-            if sender in self.transaction_counters:
-                self.transaction_counters[sender] += 1
-            else:
-                self.transaction_counters[sender] = 0
-
-            #  May be not stable in case of multi threading (so have to use async)
-            self.dfs[sender].loc[self.time_best_effort] = [  # time_delivered,
-                self.transaction_counters[sender],
-                self.transaction.get_min_time_of_transaction_creation(),
-                self.transaction.get_min_time_of_transaction_delivery(),
-                self.offest_time,
-                # avoid infinity, it looks bad on plot
-                0 if self.jitter_best_effort == float('inf') else self.jitter_best_effort,
-                self.transaction.transaction_number,
-                str(data_joined),
-            ]  # use either time or N as an index
-
-            self.received_new_data = True
+            # datahex = data.hex()
+            # print(datahex)  # TODO
+
+            # if self.get_recorder(address).add_packet(getattr(sender, 'handle', sender), data, time_delivered):
+            #     self.received_new_data = True
+            #     self.tk_event_pump.request_update()
+            self.notification_queue.put((address, getattr(sender, 'handle', sender)), data, time_delivered)
+            if Instrumentation.enabled:
+                Instrumentation.observe('Callback', time.perf_counter() - time_start)
         except Exception as e:
             print(e)
             tk.messagebox.showerror('Error', e.__str__())
 
-    # async def update_plot_loop(self, interval):
-    #    """Updates plots inside UI, at regular intervals
-    #
-    #    :param interval: maximum time between 2 updates, time of execution is taken in account
-    #    """
-    #
-    #    handle = 20
-    #    print('Plot started')
-    #
-    #    waiter = StableWaiter(interval)
-    #    while True:
-    #        try:
-    #            await waiter.wait_async()
-    #
-    #            if self.received_new_data == False or self.button_pause_plotting_var.get() == True:
-    #                # optimization to prevent re-drawing when there is no new data or when plotting is paused
-    #                continue
-    #            self.received_new_data = False
-    #
-    #            limits = self.subplots[1].axis()
-    #            plot_width_last_frame = limits[1] - limits[0]
-    #            right_side_limit_now = self.dfs[handle].index[-1]
-    #
-    #            # Don't plot invisible data-points, works well when there is no scaling between frames,
-    #            # but may cause not rendering first several data-points properly if scale changes between steps.
-    #            df_visible = self.dfs[handle].loc[
-    #                         max(0, math.floor(right_side_limit_now - plot_width_last_frame) -
-    #                             math.ceil(1 / sample_delay)):
-    #                         right_side_limit_now + 1
-    #                         ]
-    #            self.lines[0].set_data(df_visible.index, df_visible['X'])
-    #            self.lines[1].set_data(df_visible.index, df_visible['Y'])
-    #            self.lines[2].set_data(df_visible.index, df_visible['Z'])
-    #            self.lines[3].set_data(df_visible.index, df_visible['Jitter'])
-    #            self.lines[4]._offsets3d = (df_visible['Z'], df_visible['Y'], df_visible['X'])
-    #
-    #            if self.button_autoresize_X_var.get():
-    #                # Maximizes X axis
-    #                self.subplots[1].set_xlim(min(self.dfs[handle].index),
-    #                                          max(self.dfs[handle].index)
-    #                                          )
-    #                self.subplots[2].set_xlim(min(self.dfs[handle].index),
-    #                                          max(self.dfs[handle].index)
-    #                                          )
-    #            else:
-    #                # Synchronizes X-zoom across plots(uses only subplot1 as reference) and moves to right most position
-    #
-    #                self.subplots[1].set_xlim(right_side_limit_now - plot_width_last_frame,
-    #                                          right_side_limit_now
-    #                                          )
-    #                self.subplots[2].set_xlim(right_side_limit_now - plot_width_last_frame,
-    #                                          right_side_limit_now
-    #                                          )
-    #
-    #            if self.button_autoresize_Y_var.get():
-    #                self.subplots[1].set_ylim(min(min(df_visible['X']),
-    #                                              min(df_visible['Y']),
-    #                                              min(df_visible['Z'])
-    #                                              ),
-    #                                          max(max(df_visible['X']),
-    #                                              max(df_visible['Y']),
-    #                                              max(df_visible['Z'])
-    #                                              )
-    #                                          )
-    #
-    #                self.subplots[2].set_ylim(min(df_visible['Jitter']),
-    #                                          max(df_visible['Jitter'])
-    #                                          )
-    #
-    #            self.subplots[3].set_xlim(min(df_visible['Z']),
-    #                                      max(df_visible['Z'])
-    #                                      )
-    #            self.subplots[3].set_ylim(min(df_visible['Y']),
-    #                                      max(df_visible['Y'])
-    #                                      )
-    #            self.subplots[3].set_zlim(min(df_visible['X']),
-    #                                      max(df_visible['X'])
-    #                                      )
-    #
-    #            # if self.button_autoresize_axis_var.get():
-    #            #    self.fig.tight_layout()
-    #
-    #            self.canvas.draw()
-    #
-    #        except Exception as e:
-    #            print(e)
-    #            tk.messagebox.showerror('Error', e.__str__())
+    def process_notifications(self, key, datas, times_delivered):
+        """Called by self.notification_queue with notifications of one sender, in order of delivery
 
-    async def update_ui_loop(self, interval):
-        """Updates UI, at regular intervals
+        :param key: (address of the device, handle of the sender)
+        :param datas: notifications
+        :param times_delivered: timestamp of delivery of each notification
+        """
+        address, sender = key
+        if self.get_recorder(address).add_packets(sender, datas, times_delivered):
+            self.received_new_data = True
+            self.tk_event_pump.request_update()
+
+    async def update_plot_loop(self, interval):
+        """Updates plots inside UI, at regular intervals
 
         :param interval: maximum time between 2 updates, time of execution is taken in account
         """
-        print('UI started')
+
+        print('Plot started')
 
         waiter = StableWaiter(interval)
         while True:
             try:
                 await waiter.wait_async()
-                self.update()
+
+                if self.received_new_data == False or self.button_pause_plotting_var.get() == True:
+                    # optimization to prevent re-drawing when there is no new data or when plotting is paused
+                    continue
+                self.received_new_data = False
+
+                if Instrumentation.enabled:
+                    time_start = time.perf_counter()
+                self.live_plot.sync(self.stores)
+                self.live_plot.redraw(maximize_x=self.button_autoresize_X_var.get(),
+                                      maximize_y=self.button_autoresize_Y_var.get())
+                self.tk_event_pump.request_update()
+                if Instrumentation.enabled:
+                    Instrumentation.observe('Plot redraw', time.perf_counter() - time_start)
+
             except Exception as e:
                 print(e)
                 tk.messagebox.showerror('Error', e.__str__())
 
-    async def start_scanning_process(self):
-        """Updates RSSI, at regular intervals
+    async def update_ui_loop(self, interval, idle_interval):
+        """Updates UI, at regular intervals while there is something to update, and less often while UI is idle
 
-        :param interval: maximum time between 2 updates, time of execution is taken in account
+        :param interval: time between 2 updates while Tk has events to process
+        :param idle_interval: maximum time between 2 updates while Tk is idle
         """
+        print('UI started')
+
+        self.tk_event_pump.interval = interval
+        self.tk_event_pump.idle_interval = idle_interval
+        while True:
+            try:
+                await self.tk_event_pump.wait()
+                if Instrumentation.enabled:
+                    time_start = time.perf_counter()
+                    self.tk_event_pump.process_pending()
+                    Instrumentation.observe('UI frame', time.perf_counter() - time_start)
+                else:
+                    self.tk_event_pump.process_pending()
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
+
+    def is_streaming(self):
+        """True while at least one device is connected, background scanning is paused meanwhile"""
+        if ingestion_in_separate_process:
+            return self.ingestion_process.is_streaming()  # devices are connected by the ingestion process
+        return self.BLE_connection_manager.is_streaming()
+
+    async def start_scanning_process(self):
+        """Updates list of devices and RSSI. Scans continuously while no device is connected,
+        otherwise only after device list was opened and during background duty cycle"""
         print('Scanning started')
 
         # async def stop_handle():
         #    print("Stop callback not defined")
 
         try:
-            self.stop_scanning_handle, self.dict_of_devices_global = await self.BLE_connector_instance.start_scanning()
-            await asyncio.sleep(0.1)
+            self.scan_registry = Scan_registry.ScanRegistry()
+            self.scan_scheduler = Scan_scheduler.ScanScheduler(
+                self.BLE_connector_instance.create_scanner(self.scan_registry),
+                is_streaming=self.is_streaming,
+                burst=scan_burst,
+                duty_cycle=background_scan_duty_cycle,
+                period=background_scan_period)
+            self.stop_scanning_handle = self.scan_scheduler.close
+            await self.scan_scheduler.run()
             print('Scanning stopped')
         except Exception as e:
             print(e)
@@ -756,6 +848,75 @@ class App(tk.Tk):
                 tk.messagebox.showerror('Error', e2.__str__())
             tk.messagebox.showerror('Error', e.__str__())
 
+    async def export_session(self, convert, f, limit):
+        """Converts the session log to file in a background thread, ingestion and UI keep running meanwhile
+
+        :param convert: Session_log.convert_to_json or Session_log.convert_to_csv
+        :param f: text file opened for writing, it is closed when export is finished
+        :param limit: size of the session log when export was requested
+        """
+
+        def show_progress(text):
+            self.current_values['Export'].set(text)
+            self.tk_event_pump.request_update()
+
+        def progress(fraction):  # called from the background thread
+            self.loop.call_soon_threadsafe(show_progress, 'Saving... {:.0%}'.format(fraction))
+
+        try:
+            self.current_values['Export'].set('Saving...')
+            await self.loop.run_in_executor(None, convert, self.session_writer.path, f, "Time best effort", limit,
+                                            progress)
+            self.current_values['Export'].set('Saved ' + os.path.basename(f.name))
+            print('Saving finished!')
+        except Exception as e:
+            print(e)
+            self.current_values['Export'].set('Saving failed')
+            tk.messagebox.showerror('Error', e.__str__())
+        finally:
+            f.close()
+
+    async def autosave_loop(self, interval):
+        """Appends new data to the session log on disk, at regular intervals
+
+        :param interval: maximum time between 2 updates, time of execution is taken in account
+        """
+        print('Autosave started:', self.session_writer.path)
+
+        waiter = StableWaiter(interval)
+        while True:
+            try:
+                await waiter.wait_async()
+                if Instrumentation.enabled:
+                    time_start = time.perf_counter()
+                    self.session_writer.write_new_rows(self.stores)
+                    Instrumentation.observe('Autosave', time.perf_counter() - time_start)
+                else:
+                    self.session_writer.write_new_rows(self.stores)
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
+
+    async def stats_loop(self, interval):
+        """Shows counters and histograms of Instrumentation in the Info panel, at regular intervals
+
+        :param interval: maximum time between 2 updates, time of execution is taken in account
+        """
+        waiter = StableWaiter(interval)
+        dropped = 0
+        while True:
+            try:
+                await waiter.wait_async()
+                if self.notification_queue.statistics['Dropped'] != dropped:
+                    dropped = self.notification_queue.statistics['Dropped']
+                    print("Notification queue is full, notifications dropped:", dropped)
+                if Instrumentation.enabled:
+                    self.current_values['Stats'].set(Instrumentation.format_report())
+                    self.tk_event_pump.request_update()
+            except Exception as e:
+                print(e)
+                tk.messagebox.showerror('Error', e.__str__())
+
     async def battery_loop(self, interval):
         """Updates battery voltage, at regular intervals
 
@@ -796,145 +957,6 @@ class StableWaiter:
         await asyncio.sleep(min((self.interval * 2) - previous_frame_time, self.interval))
 
 
-class Packet:
-    packet_number_bytes = 1
-    transaction_number_bytes = 1
-    time_bytes = 4
-    metadata_length_total_bytes = packet_number_bytes + transaction_number_bytes + time_bytes
-    datapoint_length_bytes = 2
-
-    def __init__(self, data: bytearray, time_delivered):
-        self.data = data
-        self.time_delivered = time_delivered
-        # self.datahex=data.hex()
-
-        # print(data.hex())
-
-        self.transaction_number = self.data[0]
-        self.packet_number = self.data[1]
-        time_packet_created_bytes = self.data[2:2 + self.time_bytes]
-        time_packet_created_bytes.reverse()
-        # print(time_transmitted)
-
-        # transmit only 24 hours of time, date is not transmitted since experiment lasts only 6 hours,
-        # modify if longer interval is needed
-        self.time_created = datetime.datetime(year=2000, month=1, day=1,
-                                              hour=time_packet_created_bytes[0],
-                                              minute=time_packet_created_bytes[1],
-                                              second=time_packet_created_bytes[2],
-                                              microsecond=round(
-                                                  1000000 * (math.pow(2, 8) - time_packet_created_bytes[3]) /
-                                                  (math.pow(2, 8) - 1)
-                                              )
-                                              ).timestamp()
-        # cprint(self.time_transmitted_datetime)
-
-        lenght = len(data) - self.metadata_length_total_bytes  # 2 bytes are metadata
-        number_of_datapoints = math.floor(lenght / self.datapoint_length_bytes)  # 2 bytes per datapoint
-
-        self.datapoints = [-1] * number_of_datapoints
-
-        for i in range(number_of_datapoints):
-            # if self.packet_number == 3:  # last packet may have less data-points
-            #     pass
-            self.datapoints[i] = int(self.data[
-                                     self.metadata_length_total_bytes + self.datapoint_length_bytes * i:
-                                     self.metadata_length_total_bytes + self.datapoint_length_bytes * (i + 1)
-                                     ][::-1].hex(),
-                                     16
-                                     )
-        # print(self.datapoints)
-
-    def get_datapoints(self):
-        return self.datapoints
-
-
-class Transaction:
-    def __init__(self, size):
-        self.size = size
-        self.packets: {Packet} = {}
-        self.transaction_number = -1
-        self.finalized = False
-
-    def add_packet(self, data: bytearray, time_delivered):
-        if self.finalized:
-            # print("Error, this transaction is already finalized")
-            return -1
-
-        packet = Packet(data=data, time_delivered=time_delivered)
-
-        if self.transaction_number == -1:
-            # print("First packet of new transaction received")
-            self.transaction_number = packet.transaction_number
-
-        if self.transaction_number == packet.transaction_number:
-            # print("Adding new packet")
-            if packet.packet_number not in self.packets:
-                self.packets[packet.packet_number] = packet
-            else:
-                print("Error, this packet was already received")
-                return -1
-        else:
-            print("Error, count is different, this should never happen")
-            return -1
-
-        if len(self.packets) == self.size:
-            print("Transaction finished successfully")
-            self.finalized = True
-            return 0
-        else:
-            return 1
-
-            # self.packets.append(datahex)
-            # self.count=int(datahex[2:4], 16)
-        # self.packets.append(datahex)
-        # self.rx_packets_recieved[int(datahex[0:2], 16)] = True
-
-    def get_joined_data(self):
-        if self.finalized:
-            all_datapoints = []
-            for i in range(self.size):
-                all_datapoints.extend(self.packets[i].get_datapoints())
-            return all_datapoints
-        else:
-            # print("Error, not finalized yet")
-            return -1
-
-    def get_times_of_delivery(self):  # for debugging
-        # should be in ascending order, but no checks are done
-        if self.finalized:
-            all_times_of_delivery = {}
-            for i in range(self.size):
-                all_times_of_delivery[i] = self.packets[i].time_delivered
-            return all_times_of_delivery
-        else:
-            # print("Error, not finalized yet")
-            return -1
-
-    def get_min_time_of_transaction_delivery(self):
-        if self.finalized:
-            return min(self.get_times_of_delivery().values())
-        else:
-            return -1
-
-    def get_times_of_packet_creation(self):  # for debugging
-        # should be in ascending order, but no checks are done
-        if self.finalized:
-            all_times_of_transmitting = {}
-            for i in range(self.size):
-                all_times_of_transmitting[i] = self.packets[i].time_created
-            return all_times_of_transmitting
-        else:
-            # print("Error, not finalized yet")
-            return -1
-
-    def get_min_time_of_transaction_creation(self):
-        if self.finalized:
-            return min(self.get_times_of_packet_creation().values())
-        else:
-            return
-
-
 def twos_comp(val, bits):
     """Computes the 2's complement of int value val
     https://stackoverflow.com/questions/1604464/twos-complement-in-python"""
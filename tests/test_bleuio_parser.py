@@ -0,0 +1,46 @@
+import pytest
+
+serial = pytest.importorskip('serial')  # pyserial is needed to import the connector
+hjson = pytest.importorskip('hjson')
+
+import BLE_connector_BleuIO
+
+
+def test_notification_of_data_handle():
+    line = '{"777":"Notification", "0015":{"hex":"0x01020304", "size":4}}'
+    assert BLE_connector_BleuIO.parse_notification(line) == '01020304'
+
+
+def test_notification_of_another_handle_is_ignored():
+    line = '{"777":"Notification", "0019":{"hex":"0x0A0B", "size":2}}'
+    assert BLE_connector_BleuIO.parse_notification(line) is None
+
+
+def test_other_responses_are_not_notifications():
+    assert BLE_connector_BleuIO.parse_notification('{"C":1,"cmd":"AT+CENTRAL"}') is None
+    assert BLE_connector_BleuIO.parse_notification('{"777":"Notification", "0015":{"size":0}}') is None
+
+
+def test_replies_to_commands_are_taken_and_notifications_are_kept(monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(BLE_connector_BleuIO.serial, 'Serial',
+                        lambda port, baudrate, timeout: serial.serial_for_url('loop://', timeout=timeout))
+    notification = '{"777":"Notification", "0015":{"hex":"0x0102", "size":2}}'
+
+    async def main():
+        transport = BLE_connector_BleuIO.SerialTransport()
+        transport.start()
+        try:
+            transport.serial.write(b'{"C":1,"cmd":"AT+GAPCONNECT"}\r\n' + notification.encode() + b'\r\n'
+                                   + b'{"783":"Connected"}\r\n')
+            for _ in range(100):
+                if len(transport.lines) == 3:
+                    break
+                await asyncio.sleep(0.01)
+            assert transport.take_responses() == ['{"C":1,"cmd":"AT+GAPCONNECT"}', '{"783":"Connected"}']
+            assert [line for _, line in await transport.get_lines()] == [notification]
+        finally:
+            transport.stop()
+
+    asyncio.run(main())
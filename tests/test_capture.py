@@ -0,0 +1,119 @@
+import asyncio
+import functools
+import inspect
+
+import Capture
+import Dummy_connector
+
+
+class BleakLikeConnector:
+    """Calls callbacks the way Bleak 0.14 does: coroutine functions are scheduled, other functions are called"""
+
+    def __init__(self, notifications):
+        self.notifications = notifications
+
+    async def keep_connections_to_device(self, uuids, callbacks):
+        loop = asyncio.get_running_loop()
+        for sender, data in self.notifications:
+            for callback in callbacks:
+                if inspect.iscoroutinefunction(callback):
+                    loop.create_task(callback(sender, data))
+                else:
+                    callback(sender, data)
+        await asyncio.sleep(0.01)  # lets scheduled callbacks run
+
+    async def disconnect(self):
+        pass
+
+
+def make_notifications(count):
+    simulator = Dummy_connector.Device_simulator(seed=0)
+    datas = []
+    while len(datas) < count:
+        datas.extend(simulator.make_transaction())
+    return [(0x10, data) for data in datas[:count]]
+
+
+def run_capturing(tmp_path, callback):
+    notifications = make_notifications(20)
+    path = tmp_path / 'capture.rkpcap'
+    connector = Capture.Capturing_connector(BleakLikeConnector(notifications), str(path))
+
+    async def main():
+        await connector.keep_connections_to_device(['uuid'], [callback])
+        await connector.disconnect()
+
+    asyncio.run(main())
+    return notifications, Capture.read_capture(str(path))
+
+
+def test_async_callback_is_awaited(tmp_path):
+    received = []
+
+    async def on_new_data(address, sender, data):
+        received.append((sender, data))
+
+    # BLE_connection_manager passes callbacks bound to the address of the device
+    notifications, records = run_capturing(tmp_path, functools.partial(on_new_data, 'address'))
+    assert received == notifications
+    assert [(sender, data) for _, sender, data in records] == notifications
+
+
+def test_plain_callback_is_called(tmp_path):
+    received = []
+    notifications, records = run_capturing(tmp_path, lambda sender, data: received.append((sender, data)))
+    assert received == notifications
+    assert len(records) == len(notifications)
+
+
+def test_replay_to_recorder_is_deterministic(tmp_path):
+    import Session_recorder
+
+    notifications = make_notifications(9 * 30)
+    path = str(tmp_path / 'capture.rkpcap')
+    writer = Capture.CaptureWriter(path)
+    for i, (sender, data) in enumerate(notifications):
+        writer.write(sender, data, 1000.0 + i * 0.01)
+    writer.close()
+
+    results = []
+    for _ in range(2):
+        recorder = Session_recorder.SessionRecorder()
+        assert Capture.replay_to_recorder(path, recorder) == len(notifications)
+        results.append(recorder.stores[0x10]["Transaction number"].tolist())
+    assert results[0] == results[1]
+    assert len(results[0]) > 0
+
+
+def test_read_capture_in_chunks(tmp_path):
+    notifications = make_notifications(100)
+    path = str(tmp_path / 'capture.rkpcap')
+    writer = Capture.CaptureWriter(path)
+    for i, (sender, data) in enumerate(notifications):
+        writer.write(sender, data, float(i))
+    writer.close()
+    with open(path, 'ab') as f:
+        f.write(Capture.record_header.pack(1.0, 0x10, 20) + b'\x00' * 5)  # crash in the middle of a record
+
+    # chunks smaller than one record, and chunks which split records at every possible place
+    for chunk_size in (7, 64, 1 << 20):
+        records = list(Capture.iterate_capture(path, chunk_size=chunk_size))
+        assert [(sender, data) for _, sender, data in records] == notifications
+        assert [time_delivered for time_delivered, _, _ in records] == [float(i) for i in range(100)]
+
+
+def test_capture_is_closed_when_disconnect_times_out(tmp_path):
+    class HangingConnector(BleakLikeConnector):
+        async def disconnect(self):
+            await asyncio.sleep(10)
+
+    connector = Capture.Capturing_connector(HangingConnector([]), str(tmp_path / 'capture.rkpcap'))
+
+    async def main():
+        try:
+            await asyncio.wait_for(connector.disconnect(), timeout=0.01)
+        except asyncio.TimeoutError:
+            pass
+
+    asyncio.run(main())
+    assert connector.capture.file.closed
@@ -0,0 +1,67 @@
+import numpy as np
+
+import Ingestion_process
+import Transaction_reassembly
+
+
+def make_transaction(number, count=5):
+    return Transaction_reassembly.DecodedTransaction(number, 100.0 + number, 200.0 + number,
+                                                     np.arange(count, dtype='<u2') + number)
+
+
+def test_push_peek_release_with_wrap_around():
+    ring = Ingestion_process.SharedRingBuffer(capacity=4, max_datapoints=8)
+    try:
+        received = []
+        for number in range(10):
+            assert ring.push(0x10, make_transaction(number))
+            if number % 3 == 2:
+                count = 0
+                for records in ring.peek():
+                    received += Ingestion_process.to_transactions(records)
+                    count += len(records)
+                ring.release(count)
+        for records in ring.peek():
+            received += Ingestion_process.to_transactions(records)
+        assert [transaction.transaction_number for _, transaction in received] == list(range(10))
+        sender, transaction = received[7]
+        assert sender == 0x10
+        assert transaction.get_min_time_of_transaction_creation() == 107.0
+        assert transaction.get_min_time_of_transaction_delivery() == 207.0
+        assert transaction.get_joined_data().tolist() == [7, 8, 9, 10, 11]
+    finally:
+        ring.close()
+
+
+def test_full_buffer_drops_new_transactions():
+    ring = Ingestion_process.SharedRingBuffer(capacity=2, max_datapoints=8)
+    try:
+        assert ring.push(1, make_transaction(0))
+        assert ring.push(1, make_transaction(1))
+        assert not ring.push(1, make_transaction(2))
+        assert int(ring.header['dropped']) == 1
+        records = ring.peek()
+        assert sum(len(part) for part in records) == 2
+
+        reader = Ingestion_process.SharedRingBuffer(name=ring.name, capacity=2, max_datapoints=8)
+        try:
+            assert int(reader.header['write']) == 2  # the other process sees the same positions
+        finally:
+            reader.close()
+    finally:
+        del records
+        ring.close()
+
+
+def test_connection_state_is_shared():
+    ring = Ingestion_process.SharedRingBuffer(capacity=2, max_datapoints=8)
+    try:
+        assert int(ring.header['connected']) == 0
+        other = Ingestion_process.SharedRingBuffer(name=ring.name, capacity=2, max_datapoints=8)
+        try:
+            other.header['connected'] = 1  # set by the ingestion process
+            assert bool(ring.header['connected'])
+        finally:
+            other.close()
+    finally:
+        ring.close()
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+
+import Notification_queue
+
+
+def test_batches_keep_order_within_every_key():
+    processed = []
+    queue = Notification_queue.NotificationQueue(lambda key, datas, times: processed.append((key, datas, times)),
+                                                 batch_size=4)
+    for i in range(6):
+        queue.put('A' if i % 2 else 'B', i, float(i))
+    assert queue.process_batch() == 4
+    assert processed == [('B', [0, 2], [0.0, 2.0]), ('A', [1, 3], [1.0, 3.0])]
+    queue.drain()
+    assert processed[2:] == [('B', [4], [4.0]), ('A', [5], [5.0])]
+    assert len(queue) == 0
+
+
+def test_overflow_is_counted():
+    queue = Notification_queue.NotificationQueue(lambda key, datas, times: None, max_size=3)
+    assert [queue.put('A', i, 0.0) for i in range(5)] == [True, True, True, False, False]
+    assert queue.statistics['Queued'] == 3
+    assert queue.statistics['Dropped'] == 2
+
+
+def test_consumer_processes_notifications_from_other_threads():
+    received = []
+    queue = Notification_queue.NotificationQueue(lambda key, datas, times: received.extend(datas))
+
+    async def main():
+        task = asyncio.get_running_loop().create_task(queue.run())
+        await asyncio.sleep(0.01)
+        thread = threading.Thread(target=lambda: [queue.put('A', i, 0.0) for i in range(100)])
+        thread.start()
+        thread.join()
+        for _ in range(100):
+            if len(received) == 100:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+
+    asyncio.run(main())
+    assert received == list(range(100))
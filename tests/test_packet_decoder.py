@@ -0,0 +1,66 @@
+import datetime
+
+import numpy as np
+
+import Dummy_connector
+import Packet_decoder
+
+
+def make_datas(count, datapoints_per_packet=7):
+    simulator = Dummy_connector.Device_simulator(datapoints_per_packet=datapoints_per_packet, seed=0)
+    datas = []
+    while len(datas) < count:
+        datas.extend(simulator.make_transaction())
+    return datas[:count]
+
+
+def assert_same_packets(scalar, vectorized):
+    for a, b in zip(scalar, vectorized):
+        assert a.transaction_number == b.transaction_number
+        assert a.packet_number == b.packet_number
+        assert a.time_created == b.time_created
+        assert a.time_delivered == b.time_delivered
+        assert np.array_equal(a.get_datapoints(), b.get_datapoints())
+        assert b.get_datapoints().dtype == Packet_decoder.Packet.datapoint_dtype
+
+
+def test_vectorized_decode_equals_scalar_decode():
+    datas = make_datas(100)
+    times = [float(i) for i in range(len(datas))]
+    scalar = [Packet_decoder.Packet(data, time_delivered) for data, time_delivered in zip(datas, times)]
+    vectorized = Packet_decoder.decode_packets(datas, times)
+    assert len(vectorized) == len(datas)
+    assert_same_packets(scalar, vectorized)
+
+
+def test_vectorized_decode_of_packets_of_different_length():
+    datas = make_datas(10) + make_datas(10, datapoints_per_packet=3)
+    times = [0.0] * len(datas)
+    scalar = [Packet_decoder.Packet(data, time_delivered) for data, time_delivered in zip(datas, times)]
+    assert_same_packets(scalar, Packet_decoder.decode_packets(datas, times))
+
+
+def test_time_of_day_matches_datetime():
+    for hour, minute, second, fraction in [(0, 0, 0, 255), (13, 37, 59, 1), (23, 59, 59, 128)]:
+        expected = datetime.datetime(year=2000, month=1, day=1, hour=hour, minute=minute,
+                                     second=second).timestamp() + Packet_decoder.fraction_seconds[fraction]
+        time_bytes = bytes((fraction, second, minute, hour))
+        assert Packet_decoder.decode_time_created(time_bytes) == expected
+        assert Packet_decoder.decode_times_created(np.array([list(time_bytes)]))[0] == expected
+
+
+def test_encoded_time_of_day_is_decoded():
+    seconds_of_day = 12 * 3600 + 34 * 60 + 56.5
+    time_created = Packet_decoder.decode_time_created(Dummy_connector.encode_time_of_day(seconds_of_day))
+    assert abs(time_created - Packet_decoder.day_start_timestamp - seconds_of_day) < 1 / 255
+
+
+def test_unwrapper_adds_a_day_at_midnight_only():
+    start = Packet_decoder.day_start_timestamp
+    unwrapper = Packet_decoder.TimeOfDayUnwrapper(window=600)
+    day = Packet_decoder.seconds_per_day
+    assert unwrapper.unwrap(start + day - 10) == start + day - 10
+    assert unwrapper.unwrap(start + 5) == start + day + 5  # midnight
+    assert unwrapper.unwrap(start + day - 5) == start + day - 5  # late packet from before midnight
+    assert unwrapper.unwrap(start + 100) == start + day + 100
+    assert unwrapper.unwrap(start + 50) == start + day + 50  # jump back within a day, e.g. reboot, is kept
@@ -0,0 +1,40 @@
+import numpy as np
+
+import Plot_decimation
+
+
+def test_envelope_keeps_extremes_of_every_range():
+    random = np.random.default_rng(0)
+    x = np.arange(10000, dtype=float)
+    y = random.normal(size=len(x))
+    decimator = Plot_decimation.MinMaxDecimator(factor=4, levels=6)
+    for start in range(0, len(x), 333):  # appended in pieces, as data arrives
+        decimator.extend(x[start:start + 333], y[start:start + 333])
+    assert len(decimator) == len(x)
+
+    for x0, x1 in [(0, 9999), (1234, 5678), (9000, 9999)]:
+        vertices_x, vertices_y = decimator.query(x0, x1, pixels=100)
+        assert len(vertices_x) <= 2 * (len(x) // 4 ** 2 + 100)  # a coarse level was used
+        inside = (x >= x0) & (x <= x1)
+        assert vertices_y.max() >= y[inside].max()
+        assert vertices_y.min() <= y[inside].min()
+        assert vertices_x[0] <= x0
+        # x of a bin is x of its first point, so the last vertex is within one coarsest bin from the edge
+        assert vertices_x[-1] > x1 - 4 ** 5
+
+
+def test_newest_points_are_included():
+    decimator = Plot_decimation.MinMaxDecimator(factor=4, levels=4)
+    decimator.extend(np.arange(70, dtype=float), np.zeros(70))
+    decimator.extend(np.array([70.0]), np.array([5.0]))  # not joined into any coarse bin yet
+    vertices_x, vertices_y = decimator.query(0, 70, pixels=2)
+    assert vertices_x[-1] == 70.0
+    assert vertices_y.max() == 5.0
+
+
+def test_small_series_returns_raw_points():
+    decimator = Plot_decimation.MinMaxDecimator()
+    decimator.extend(np.array([0.0, 1.0, 2.0]), np.array([3.0, 1.0, 2.0]))
+    vertices_x, vertices_y = decimator.query(0, 2, pixels=1000)
+    assert vertices_x.tolist() == [0.0, 0.0, 1.0, 1.0, 2.0, 2.0]
+    assert vertices_y.tolist() == [3.0, 3.0, 1.0, 1.0, 2.0, 2.0]
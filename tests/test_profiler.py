@@ -0,0 +1,50 @@
+import time
+
+import Profiler
+
+
+def test_stop_right_after_start(tmp_path):
+    profiler = Profiler.Profiler(str(tmp_path), interval=10)  # no sample is taken before stop
+    profiler.start()
+    paths = profiler.stop()
+    assert not profiler.running
+    assert len(paths) == 2
+
+
+def test_several_profiles_per_second(tmp_path):
+    profiler = Profiler.Profiler(str(tmp_path), use_cprofile=True, interval=0.001)
+    paths = []
+    for _ in range(3):
+        assert profiler.toggle() == []
+        time.sleep(0.01)
+        paths += profiler.toggle()
+        assert not profiler.running
+    assert len(set(paths)) == 9
+    busy = [path for path in paths if path.endswith('_busy.txt')]
+    with open(busy[-1]) as f:
+        assert f.readline().startswith('Samples:')
+
+
+class Code:
+    co_flags = 0
+    co_firstlineno = 1
+
+    def __init__(self, filename, name):
+        self.co_filename = filename
+        self.co_name = name
+
+
+class Frame:
+    def __init__(self, filename, name, back=None):
+        self.f_code = Code(filename, name)
+        self.f_back = back
+
+
+def test_idle_is_detected_in_selector_and_proactor_loops():
+    sampler = Profiler.SamplingProfiler(interval=1)
+    run_forever = Frame('/usr/lib/python3/asyncio/base_events.py', 'run_forever')
+    sampler.add_sample(Frame('/usr/lib/python3/selectors.py', 'select', run_forever))
+    sampler.add_sample(Frame('C:/Python39/lib/asyncio/windows_events.py', '_poll',
+                             Frame('C:/Python39/lib/asyncio/windows_events.py', 'select', run_forever)))
+    sampler.add_sample(Frame('/usr/lib/python3/asyncio/events.py', '_run', run_forever))
+    assert sampler.busy == {Profiler.idle_name: 2, Profiler.other_name: 1}
@@ -0,0 +1,30 @@
+import numpy as np
+
+import Sample_store
+
+
+def make_store(capacity=2):
+    return Sample_store.SampleStore(columns=[("Time", 'f8'), ("N", 'i8'), ("Data", '<u2', 3)], index="Time",
+                                    capacity=capacity)
+
+
+def test_append_and_extend_grow_capacity():
+    store = make_store()
+    for i in range(5):
+        store.append(float(i), i, [i, i, i])
+    store.extend([5.0, 6.0], [5, 6], np.array([[5, 5, 5], [6, 6, 6]]))
+    assert len(store) == 7
+    assert store.capacity >= 7
+    assert store["N"].tolist() == list(range(7))
+    assert store["Data"][6].tolist() == [6, 6, 6]
+
+
+def test_clear_keeps_capacity():
+    store = make_store()
+    store.extend([0.0, 1.0, 2.0], [0, 1, 2], np.zeros((3, 3)))
+    capacity = store.capacity
+    store.clear()
+    assert len(store) == 0
+    assert store.capacity == capacity
+    store.append(3.0, 3, [1, 2, 3])
+    assert store["Time"].tolist() == [3.0]
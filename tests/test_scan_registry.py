@@ -0,0 +1,54 @@
+import Scan_registry
+
+
+class Device:
+    def __init__(self, address):
+        self.address = address
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def addresses(top):
+    return [device.address for device, rssi in top]
+
+
+def test_devices_are_sorted_by_rssi_while_it_changes():
+    registry = Scan_registry.ScanRegistry(clock=Clock())
+    for address, rssi in [('A', -80), ('B', -60), ('C', -70)]:
+        registry.update(Device(address), rssi)
+    assert addresses(registry.top(3)) == ['B', 'C', 'A']
+    registry.update(Device('A'), -50)
+    assert registry.top(2) == [(registry.get_device('A'), -50), (registry.get_device('B'), -60)]
+    assert len(registry) == 3
+    assert len(registry.order) == 3
+
+
+def test_stale_devices_are_forgotten():
+    clock = Clock()
+    registry = Scan_registry.ScanRegistry(max_age=30, clock=clock)
+    registry.update(Device('A'), -40)
+    clock.now = 20
+    registry.update(Device('B'), -90)
+    clock.now = 40
+    assert addresses(registry.top(5)) == ['B']
+    assert 'A' not in registry
+    clock.now = 60
+    registry.expire()
+    assert len(registry) == 0
+    assert registry.order == []
+    assert registry.get_device('B') is None
+
+
+def test_remove():
+    registry = Scan_registry.ScanRegistry(clock=Clock())
+    registry.update(Device('A'), -40)
+    registry.update(Device('B'), -40)
+    registry.remove('A')
+    registry.remove('missing')
+    assert addresses(registry.top(5)) == ['B']
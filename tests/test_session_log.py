@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import Sample_store
+import Session_log
+
+
+def make_store(first, count):
+    store = Sample_store.SampleStore(columns=[("Time best effort", 'f8'), ("N", 'i8'), ("Data", '<u2', 4)],
+                                     index="Time best effort")
+    n = np.arange(first, first + count)
+    store.extend(n * 0.5, n, np.repeat(n[:, None], 4, axis=1))
+    return store
+
+
+def write_session(path, chunks=3, rows=10, compact=False):
+    writer = Session_log.SessionWriter(str(path))
+    stores = {0x10: make_store(0, 0), 'device/0x11': make_store(0, 0)}
+    written = 0
+    for i in range(chunks):
+        for store in stores.values():
+            new = make_store(i * rows, rows)
+            store.extend(*[new[name] for name in new.columns])
+        written += writer.write_new_rows(stores, clear=True)
+    writer.close(compact=compact)
+    return written
+
+
+def test_write_and_read_back(tmp_path):
+    path = tmp_path / 'session.rkplog'
+    assert write_session(path) == 2 * 3 * 10
+    with Session_log.SessionReader(str(path), verify=True) as reader:
+        assert sorted(map(str, reader.senders)) == ['16', 'device/0x11']
+        assert len(reader) == 60
+        columns = reader.get_columns(0x10)
+        assert columns["N"].tolist() == list(range(30))
+        assert columns["Data"].shape == (30, 4)
+        assert np.array_equal(columns["Data"][:, 0], np.arange(30))
+
+        selected = reader.get_time_range(0x10, 4.0, 11.0)  # rows 8..21, across chunk borders
+        assert selected["N"].tolist() == list(range(8, 22))
+
+
+def test_reading_stops_at_corrupted_chunk(tmp_path):
+    path = tmp_path / 'session.rkplog'
+    write_session(path, chunks=3)
+    data = bytearray(path.read_bytes())
+    data[-3] ^= 0xFF  # a byte in the payload of the last chunk
+    path.write_bytes(bytes(data))
+    with Session_log.SessionReader(str(path), verify=True) as reader:
+        assert len(reader) == 50
+    with Session_log.SessionReader(str(path), verify=False) as reader:
+        assert len(reader) == 60  # without crc only the size of chunks is checked
+
+
+def test_reading_stops_at_incomplete_chunk(tmp_path):
+    path = tmp_path / 'session.rkplog'
+    write_session(path, chunks=2)
+    data = path.read_bytes()
+    path.write_bytes(data[:-7])  # crash in the middle of writing
+    with Session_log.SessionReader(str(path)) as reader:
+        assert len(reader) == 30
+
+
+def test_not_a_session_log(tmp_path):
+    path = tmp_path / 'other.bin'
+    path.write_bytes(b'something else')
+    with pytest.raises(ValueError):
+        Session_log.SessionReader(str(path))
+
+
+def test_closed_log_is_compacted_into_views(tmp_path):
+    path = tmp_path / 'session.rkplog'
+    write_session(path, chunks=30, compact=True)
+    with Session_log.SessionReader(str(path), verify=True) as reader:
+        assert [len(reader.chunks[sender]) for sender in reader.senders] == [1, 1]
+        columns = reader.get_columns(0x10)
+        assert columns["N"].tolist() == list(range(300))
+        assert not columns["N"].flags.owndata and not columns["Data"].flags.owndata  # views, not copies
+        selected = reader.get_time_range(0x10, 4.0, 111.0)
+        assert selected["N"].tolist() == list(range(8, 222))
+        assert not selected["Data"].flags.owndata
+        del columns, selected
+    assert not (tmp_path / 'session.rkplog.compacting').exists()
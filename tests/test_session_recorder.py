@@ -0,0 +1,88 @@
+import numpy as np
+
+import Dummy_connector
+import Session_recorder
+
+
+def make_stream(transactions=300, **simulator_parameters):
+    simulator = Dummy_connector.Device_simulator(seed=2, **simulator_parameters)
+    datas = []
+    for _ in range(transactions):
+        datas.extend(simulator.make_transaction())
+    times = [1000.0 + i * 0.02 for i in range(len(datas))]
+    return datas, times
+
+
+def assert_same_stores(a, b):
+    assert a.keys() == b.keys()
+    for sender in a:
+        assert a[sender].columns == b[sender].columns
+        for name in a[sender].columns:
+            assert np.array_equal(a[sender][name], b[sender][name]), name
+
+
+def test_add_packets_equals_add_packet():
+    datas, times = make_stream(loss=0.02, reorder=0.05, duplicates=0.02, clock_reset_interval=5.0)
+    single = Session_recorder.SessionRecorder()
+    stored_single = sum(single.add_packet(0x10, data, time_delivered) for data, time_delivered in zip(datas, times))
+    batched = Session_recorder.SessionRecorder()
+    stored_batched = 0
+    for i in range(0, len(datas), 100):
+        stored_batched += batched.add_packets(0x10, datas[i:i + 100], times[i:i + 100])
+
+    assert stored_single == stored_batched > 0
+    assert_same_stores(single.stores, batched.stores)
+    assert single.reassembly_buffer.statistics == batched.reassembly_buffer.statistics
+
+
+def test_stores_of_several_devices_are_keyed_by_address():
+    stores = {}
+    recorders = [Session_recorder.SessionRecorder(stores=stores, device=address) for address in ('A', 'B')]
+    datas, times = make_stream(transactions=20)
+    for recorder in recorders:
+        for data, time_delivered in zip(datas, times):
+            recorder.add_packet(0x10, data, time_delivered)
+    assert sorted(stores) == ['A/16', 'B/16']
+    assert np.array_equal(stores['A/16']["Data"], stores['B/16']["Data"])
+
+
+def test_time_keeps_incrementing_over_clock_resets():
+    datas, times = make_stream(transactions=200, clock_reset_interval=10.0)
+    recorder = Session_recorder.SessionRecorder()
+    for data, time_delivered in zip(datas, times):
+        recorder.add_packet(0x10, data, time_delivered)
+    store = recorder.stores[0x10]
+    assert len(store) > 0
+    assert store["N"].tolist() == list(range(len(store)))
+    offsets = np.unique(store["Offset time"])
+    assert len(offsets) > 1  # offset was reset after the device clock jumped back
+
+
+def test_short_notification_does_not_drop_its_batch():
+    datas, times = make_stream(transactions=50)
+    datas.insert(100, bytearray(b'\x01\x02\x03\x04'))
+    times.insert(100, times[100])
+    single = Session_recorder.SessionRecorder()
+    for data, time_delivered in zip(datas, times):
+        single.add_packet(0x10, data, time_delivered)
+    batched = Session_recorder.SessionRecorder()
+    assert batched.add_packets(0x10, datas, times) == len(single.stores[0x10]) > 40
+    assert batched.reassembly_buffer.statistics['Invalid packets'] == 1
+    assert_same_stores(single.stores, batched.stores)
+
+
+def test_transaction_of_different_length_is_rejected_alone():
+    datas, times = make_stream(transactions=30)
+    short = Dummy_connector.Device_simulator(datapoints_per_packet=3, seed=3)
+    short.transaction_number = 200
+    short_datas = short.make_transaction()
+    datas[135:135] = short_datas  # between two complete transactions
+    times[135:135] = [times[135]] * len(short_datas)
+
+    recorder = Session_recorder.SessionRecorder()
+    stored = recorder.add_packets(0x10, datas, times)
+    reference = Session_recorder.SessionRecorder()
+    expected = reference.add_packets(0x10, *make_stream(transactions=30))
+    assert stored == expected
+    assert recorder.statistics['Transactions of different length'] == 1
+    assert recorder.stores[0x10]["N"].tolist() == list(range(stored))
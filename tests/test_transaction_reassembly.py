@@ -0,0 +1,114 @@
+import numpy as np
+
+import Dummy_connector
+import Transaction_reassembly
+
+size = 4
+datapoints_per_packet = 7
+
+
+def make_packets(transaction_number, seconds_of_day=3600.0):
+    datapoints = (np.arange(size * datapoints_per_packet) + 100 * transaction_number).reshape(size, -1)
+    return [Dummy_connector.encode_packet(transaction_number, packet_number, seconds_of_day, datapoints[packet_number])
+            for packet_number in range(size)]
+
+
+def add_all(buffer, packets, time_delivered=0.0):
+    completed, lost = [], []
+    for packet in packets:
+        c, l = buffer.add_packet(packet, time_delivered)
+        completed += c
+        lost += l
+    return completed, lost
+
+
+def test_reordered_and_interleaved_transactions():
+    buffer = Transaction_reassembly.ReassemblyBuffer(size=size)
+    first, second = make_packets(1), make_packets(2)
+    completed, lost = add_all(buffer, [first[1], second[0], first[0], second[3], first[3], second[1], first[2],
+                                       second[2]])
+    assert [transaction.transaction_number for transaction in completed] == [1, 2]
+    assert lost == []
+    expected = np.arange(size * datapoints_per_packet) + 100
+    assert np.array_equal(completed[0].get_joined_data(), expected)
+
+
+def test_lost_packet_is_reported_after_timeout():
+    buffer = Transaction_reassembly.ReassemblyBuffer(size=size, timeout=1.0)
+    completed, lost = add_all(buffer, make_packets(1)[:-1], time_delivered=0.0)
+    assert completed == [] and lost == []
+    completed, lost = buffer.flush(now=2.0)
+    assert [transaction.transaction_number for transaction in lost] == [1]
+    assert lost[0].get_missing_packet_numbers() == [size - 1]
+    assert buffer.statistics['Lost transactions'] == 1
+    assert buffer.statistics['Lost packets'] == 1
+
+
+def test_oldest_transaction_is_evicted_when_too_many_are_open():
+    buffer = Transaction_reassembly.ReassemblyBuffer(size=size, max_open=2)
+    completed, lost = add_all(buffer, [make_packets(number)[0] for number in (1, 2, 3)])
+    assert [transaction.transaction_number for transaction in lost] == [1]
+
+
+def test_duplicate_late_and_invalid_packets_are_counted_separately():
+    buffer = Transaction_reassembly.ReassemblyBuffer(size=size, timeout=1.0)
+    first = make_packets(1)
+    add_all(buffer, first + [first[0]], time_delivered=0.0)  # duplicate of a completed transaction
+    assert buffer.statistics['Duplicate packets'] == 1
+
+    second = make_packets(2)
+    add_all(buffer, second[:2] + [second[1]], time_delivered=0.0)  # duplicate inside an open transaction
+    assert buffer.statistics['Duplicate packets'] == 2
+    buffer.flush(now=2.0)
+    add_all(buffer, second[2:], time_delivered=2.0)  # late packets of an evicted transaction
+    assert buffer.statistics['Late packets'] == 2
+
+    invalid = bytearray(make_packets(3)[0])
+    invalid[1] = size  # packet number out of range
+    completed, lost = add_all(buffer, [invalid], time_delivered=2.0)
+    assert buffer.statistics['Invalid packets'] == 1
+    assert buffer.transactions == {}  # invalid packet did not open a transaction
+    assert buffer.statistics['Duplicate packets'] == 2
+    assert buffer.statistics['Completed transactions'] == 1
+    assert buffer.statistics['Lost transactions'] == 1
+
+
+def test_batched_and_single_packets_give_same_transactions():
+    simulator = Dummy_connector.Device_simulator(packets_per_transaction=size, loss=0.05, reorder=0.1,
+                                                 duplicates=0.05, seed=1)
+    datas = []
+    for _ in range(200):
+        datas.extend(simulator.make_transaction())
+    times = [i * 0.01 for i in range(len(datas))]
+
+    single = Transaction_reassembly.ReassemblyBuffer(size=size)
+    batched = Transaction_reassembly.ReassemblyBuffer(size=size)
+    completed_single, lost_single = [], []
+    for data, time_delivered in zip(datas, times):
+        c, l = single.add_packet(data, time_delivered)
+        completed_single += c
+        lost_single += l
+    completed_batched, lost_batched = [], []
+    for i in range(0, len(datas), 64):
+        c, l = batched.add_packets(datas[i:i + 64], times[i:i + 64])
+        completed_batched += c
+        lost_batched += l
+
+    assert single.statistics == batched.statistics
+    assert [t.transaction_number for t in completed_single] == [t.transaction_number for t in completed_batched]
+    assert [t.transaction_number for t in lost_single] == [t.transaction_number for t in lost_batched]
+    for a, b in zip(completed_single, completed_batched):
+        assert np.array_equal(a.get_joined_data(), b.get_joined_data())
+        assert a.get_min_time_of_transaction_creation() == b.get_min_time_of_transaction_creation()
+
+
+def test_packets_of_different_length_are_joined_in_order():
+    transaction = Transaction_reassembly.Transaction(size=3)
+    datapoints = np.arange(10)
+    packets = [Dummy_connector.encode_packet(5, 0, 60.0, datapoints[:4]),
+               Dummy_connector.encode_packet(5, 1, 60.0, datapoints[4:8]),
+               Dummy_connector.encode_packet(5, 2, 60.0, datapoints[8:])]  # last packet is shorter
+    assert transaction.add_packet(packets[2], 0.0) == 1
+    assert transaction.add_packet(packets[0], 0.0) == 1
+    assert transaction.add_packet(packets[1], 0.0) == 0
+    assert np.array_equal(transaction.get_joined_data(), datapoints)